@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import atexit
+import asyncio
+import threading
+
+from semantic_kernel import Kernel
+
+from agents.http_session_pool import SessionLoopPool, close_http_sessions
+from agents.context_packer import CONTEXT_TOKEN_BUDGETS
+from agents.reply_agent import get_reply_agent
+from agents.router_agent import get_router_agent
+from agents.mm_rag_agent import get_mm_rag_agent, get_mm_search_plugin
+from agents.txt_rag_agent import get_txt_rag_agent, get_txt_search_plugin
+from agents.orchestrator_agent import get_orchestrator_agent
+from agents.keyword_extractor_agent import get_keyword_extractor_agent
+from agents.fundfact_coder_rag_agent import get_fundfact_coder_rag_agent
+from agents.fundfact_query_engine import get_fundfact_query_agent, FUNDFACT_QUERY_ENGINE
+
+# === Agent Pool Configuration ===
+# "process": one set of agents shared by every browser session (default)
+# "session": build a private set per session, as before (for comparing the metrics)
+AGENT_POOL_SCOPE = os.environ.get("AGENT_POOL_SCOPE", "process")
+# Event loops shared by every session's turns (turns beyond this many wait for a free loop)
+TURN_LOOP_POOL_SIZE = int(os.environ.get("TURN_LOOP_POOL_SIZE", "8"))
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource  # not available on Windows
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# === Agent construction (stateless: threads and history stay in the session) ===
+async def build_agents(kernel: Kernel = None) -> dict:
+    kernel = kernel or Kernel()
+    return {
+        "main_router_agent": get_router_agent(kernel, "main_router_agent"),
+        "news_router_agent": get_router_agent(kernel, "news_router_agent"),
+        "fundfact_linguistic_search": get_txt_search_plugin(
+            text_index_name="mutualfunds",
+            token_budget=CONTEXT_TOKEN_BUDGETS["fundfact_linguistic_rag_agent"],
+        ),
+        "callcenter_search": get_txt_search_plugin(
+            text_index_name="callcenterinfo",
+            token_budget=CONTEXT_TOKEN_BUDGETS["callcenter_rag_agent"],
+        ),
+        "pdf_search": get_mm_search_plugin(
+            text_index_name="pdf-economic-summary",
+            table_index_name="pdf-economic-summary-tables",
+            image_index_name="pdf-economic-summary-images",
+            text_token_budget=CONTEXT_TOKEN_BUDGETS["pdf_rag_agent"],
+            table_token_budget=CONTEXT_TOKEN_BUDGETS["pdf_rag_agent_tables"],
+        ),
+        "pdf_rag_agent": get_mm_rag_agent(kernel),
+        "callcenter_rag_agent": get_txt_rag_agent(kernel, "callcenter_rag_agent"),
+        "reply_agent": get_reply_agent(kernel),
+        "keyword_extractor_agent": get_keyword_extractor_agent(kernel),
+        "news_orchestrator_agent": get_orchestrator_agent(kernel, "news_orchestrator"),
+        "fundfact_orchestrator_agent": get_orchestrator_agent(kernel, "fundfact_orchestrator"),
+        "fundfact_linguistic_rag_agent": get_txt_rag_agent(kernel, "fundfact_linguistic_rag_agent"),
+        "fundfact_coder_rag_agent": (
+            get_fundfact_query_agent(kernel) if FUNDFACT_QUERY_ENGINE == "local"
+            else await get_fundfact_coder_rag_agent()
+        ),
+    }
+
+
+async def _build_and_close():
+    try:
+        return await build_agents()
+    finally:
+        # The build runs in its own short-lived loop
+        await close_http_sessions()
+
+
+# === Cold-start and per-session memory metrics ===
+class AgentPoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.build_seconds = []
+        self.build_rss_mb = []
+        self.sessions = 0
+        self.session_seconds = []
+        self.session_rss_mb = []
+
+    def record_build(self, seconds: float, rss_mb: float):
+        with self._lock:
+            self.builds += 1
+            self.build_seconds.append(seconds)
+            self.build_rss_mb.append(rss_mb)
+
+    def record_session(self, seconds: float, rss_mb: float):
+        with self._lock:
+            self.sessions += 1
+            self.session_seconds.append(seconds)
+            self.session_rss_mb.append(rss_mb)
+
+    def as_dict(self) -> dict:
+        def mean(values):
+            return round(sum(values) / len(values), 3) if values else None
+
+        with self._lock:
+            return {
+                "scope": AGENT_POOL_SCOPE,
+                "builds": self.builds,
+                "cold_start_seconds": round(self.build_seconds[0], 3) if self.build_seconds else None,
+                "mean_build_seconds": mean(self.build_seconds),
+                "mean_build_rss_mb": mean(self.build_rss_mb),
+                "sessions": self.sessions,
+                "mean_session_init_seconds": mean(self.session_seconds),
+                "mean_session_rss_mb": mean(self.session_rss_mb),
+                "rss_mb": round(current_rss_mb(), 1),
+            }
+
+
+agent_pool_metrics = AgentPoolMetrics()
+
+
+def build_agent_pool() -> dict:
+    """Build one set of agents in a fresh event loop, recording its time and RSS growth."""
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    agents = asyncio.run(_build_and_close())
+    seconds = time.perf_counter() - start
+    agent_pool_metrics.record_build(seconds, current_rss_mb() - rss_before)
+    print(f"🧩 Agents built in {seconds:.2f}s ({AGENT_POOL_SCOPE} scope)")
+    return agents
+
+
+# === Process-wide shared pool ===
+_shared_agents = None
+_shared_agents_lock = threading.Lock()
+
+
+def get_shared_agents() -> dict:
+    """Agents shared by every session of this process; built on first use."""
+    global _shared_agents
+    if _shared_agents is None:
+        with _shared_agents_lock:
+            if _shared_agents is None:
+                _shared_agents = build_agent_pool()
+    return _shared_agents
+
+
+def get_session_agents() -> dict:
+    """Agents for a new browser session according to AGENT_POOL_SCOPE, recording its init cost."""
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    agents = get_shared_agents() if AGENT_POOL_SCOPE == "process" else build_agent_pool()
+    agent_pool_metrics.record_session(time.perf_counter() - start, current_rss_mb() - rss_before)
+    return agents
+
+
+# === Process-wide turn loops, next to the agents they run ===
+_turn_loops = None
+_turn_loops_lock = threading.Lock()
+
+
+def get_turn_loops() -> SessionLoopPool:
+    """Loops every session's turns run on; their sessions and threads are closed at exit."""
+    global _turn_loops
+    if _turn_loops is None:
+        with _turn_loops_lock:
+            if _turn_loops is None:
+                _turn_loops = SessionLoopPool(TURN_LOOP_POOL_SIZE)
+                atexit.register(_turn_loops.close)
+    return _turn_loops
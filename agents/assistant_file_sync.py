@@ -0,0 +1,108 @@
+import os
+import asyncio
+import hashlib
+from pathlib import Path
+
+from agents.save_and_load_azure_assistant_agent import JsonRegistry, load_file_ids, save_file_ids
+
+# === Assistant File Sync Configuration ===
+MANIFEST_PATH = Path(__file__).resolve().parent / "azure_assistant_file_manifest.json"
+FILE_SYNC_CONCURRENCY = int(os.environ.get("FILE_SYNC_CONCURRENCY", "4"))
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# filename -> {"sha256", "file_id"} of the files currently attached to the assistant
+manifest_registry = JsonRegistry(MANIFEST_PATH)
+
+
+# === Content-hash-aware sync of a data directory to Azure Assistants files ===
+async def sync_assistant_files(client, data_dir, suffix=".csv", force=False, concurrency=FILE_SYNC_CONCURRENCY) -> dict:
+    """
+    Upload only files whose content hash differs from the manifest, concurrently. Returns
+    {"file_ids", "uploaded", "unchanged", "stale_file_ids", "changed", "manifest"}. Neither the
+    new manifest is saved nor are stale remote files deleted here: the caller first points the
+    assistant at the new files, then calls save_manifest(result["manifest"]) and
+    delete_remote_files(client, result["stale_file_ids"]).
+    """
+    data_dir = Path(data_dir)
+    paths = sorted(p for p in data_dir.iterdir() if p.name.endswith(suffix))
+    hashes = await asyncio.gather(*(asyncio.to_thread(file_sha256, p) for p in paths))
+    local = dict(zip((p.name for p in paths), hashes))
+
+    manifest = manifest_registry.all()
+    if not manifest:
+        # Files uploaded before the manifest existed have no known hash and are re-uploaded once
+        manifest = {name: {"sha256": None, "file_id": fid} for name, fid in load_file_ids().items()}
+
+    to_upload = [
+        name for name, sha in local.items()
+        if force or manifest.get(name, {}).get("sha256") != sha or not manifest.get(name, {}).get("file_id")
+    ]
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def upload(name):
+        async with semaphore:
+            with open(data_dir / name, "rb") as file:
+                uploaded = await client.files.create(file=file, purpose="assistants")
+            return name, uploaded.id
+
+    uploads = {}
+    for name, result in zip(to_upload, await asyncio.gather(*(upload(n) for n in to_upload), return_exceptions=True)):
+        if isinstance(result, BaseException):
+            # Keep the previous upload (if any); the hash mismatch retries it on the next sync
+            print(f"⚠️ Failed to upload {name}: {result}")
+        else:
+            uploads[name] = result[1]
+
+    # Replaced versions of re-uploaded files and files that no longer exist locally
+    stale_file_ids = [
+        entry["file_id"] for name, entry in manifest.items()
+        if entry.get("file_id") and (name in uploads or name not in local)
+    ]
+
+    new_manifest = {}
+    for name, sha in local.items():
+        if name in uploads:
+            new_manifest[name] = {"sha256": sha, "file_id": uploads[name]}
+        elif manifest.get(name, {}).get("file_id"):
+            new_manifest[name] = manifest[name]
+
+    return {
+        "file_ids": [entry["file_id"] for entry in new_manifest.values()],
+        "uploaded": sorted(uploads),
+        "unchanged": sorted(set(local) - set(to_upload)),
+        "stale_file_ids": stale_file_ids,
+        "changed": bool(uploads or stale_file_ids),
+        "manifest": new_manifest,
+    }
+
+
+def save_manifest(manifest: dict):
+    """Record the files the assistant now points at (call only once the assistant was updated)."""
+    manifest_registry.update(manifest, replace=True)
+    save_file_ids({name: entry["file_id"] for name, entry in manifest.items()})
+
+
+async def delete_remote_files(client, file_ids, concurrency=FILE_SYNC_CONCURRENCY) -> int:
+    """Delete superseded uploads concurrently; files already gone are ignored. Returns the number deleted."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def delete(file_id):
+        async with semaphore:
+            try:
+                await client.files.delete(file_id)
+                return True
+            except Exception as e:
+                print(f"⚠️ Failed to delete stale assistant file {file_id}: {e}")
+                return False
+
+    results = await asyncio.gather(*(delete(fid) for fid in file_ids))
+    return sum(results)
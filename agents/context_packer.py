@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import threading
+
+from agents.resource_registry import count_tokens
+
+# === Context Packing Configuration ===
+# Prompt-token budget of the search context handed to each RAG agent (per call, i.e. per route for NEWS)
+CONTEXT_TOKEN_BUDGETS = {
+    "pdf_rag_agent": int(os.environ.get("PDF_RAG_CONTEXT_TOKENS", "6000")),
+    "pdf_rag_agent_tables": int(os.environ.get("PDF_RAG_TABLE_CONTEXT_TOKENS", "2000")),
+    "callcenter_rag_agent": int(os.environ.get("CALLCENTER_RAG_CONTEXT_TOKENS", "3000")),
+    "fundfact_linguistic_rag_agent": int(os.environ.get("FUNDFACT_RAG_CONTEXT_TOKENS", "8000")),
+}
+# Chunks whose word-trigram sets overlap at least this much (Jaccard) are treated as duplicates
+CONTEXT_DUPLICATE_THRESHOLD = float(os.environ.get("CONTEXT_DUPLICATE_THRESHOLD", "0.9"))
+
+# Also tokenize the previous indented serialization of every hit, to log what packing saved.
+# Off by default: it re-serializes and re-tokenizes all hits on every call.
+CONTEXT_PACK_MEASURE = os.environ.get("CONTEXT_PACK_MEASURE", "0") == "1"
+
+# Tokenizer the budgets are counted with (the RAG agents run on gpt-4o-mini)
+CONTEXT_TOKEN_MODEL = "gpt-4o-mini"
+
+# Placeholder values left out of the packed context
+EMPTY_VALUES = (None, "", "N/A", [], {})
+
+
+# === Process-wide counters of what packing saved ===
+class ContextPackStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.docs_in = 0
+        self.docs_kept = 0
+        self.duplicates = 0
+        self.over_budget = 0
+        self.tokens_after = 0
+        self.measured_calls = 0  # calls with CONTEXT_PACK_MEASURE on
+        self.tokens_before = 0   # the previous indented serialization of every hit (measured calls)
+        self.tokens_saved = 0    # (measured calls)
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "docs_in": self.docs_in,
+                "docs_kept": self.docs_kept,
+                "duplicates": self.duplicates,
+                "over_budget": self.over_budget,
+                "tokens_after": self.tokens_after,
+                "measured_calls": self.measured_calls,
+                "tokens_before": self.tokens_before,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+context_pack_stats = ContextPackStats()
+
+
+# === Near-duplicate detection ===
+def _shingles(text: str) -> frozenset:
+    words = re.sub(r"\s+", " ", text or "").strip().lower().split(" ")
+    if len(words) < 3:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+
+
+def _is_duplicate(shingles: frozenset, kept: list, threshold: float) -> bool:
+    for other in kept:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= threshold:
+            return True
+    return False
+
+
+# === Packing ===
+def _compact(record: dict) -> str:
+    return json.dumps({k: v for k, v in record.items() if v not in EMPTY_VALUES}, ensure_ascii=False, separators=(",", ":"))
+
+
+def pack_context(docs, fields: dict, budget: int = None, model: str = CONTEXT_TOKEN_MODEL,
+                 ordered: bool = False) -> str:
+    """
+    Serialize search hits for a prompt: fields maps output names to document keys; hits are
+    taken best score first (or as given when ordered, e.g. after reranking), empty fields
+    dropped, near-duplicates skipped and the rest added while they fit in budget tokens
+    (None: no limit). The best hit is always kept. Returns a JSON array with one compact
+    object per line, in that order.
+    """
+    if not ordered:
+        docs = sorted(docs, key=lambda doc: doc.get("@search.score") or 0.0, reverse=True)
+    records = [{name: doc.get(key) for name, key in fields.items()} for doc in docs]
+
+    lines, kept_shingles = [], []
+    duplicates = over_budget = 0
+    used = 2  # the enclosing brackets
+    for record in records:
+        shingles = _shingles(record.get("content") or "")
+        if _is_duplicate(shingles, kept_shingles, CONTEXT_DUPLICATE_THRESHOLD):
+            duplicates += 1
+            continue
+
+        line = _compact(record)
+        tokens = count_tokens(line, model) + 1  # + the separating comma/newline
+        if budget is not None and lines and used + tokens > budget:
+            over_budget += 1  # a smaller hit further down may still fit
+            continue
+
+        lines.append(line)
+        kept_shingles.append(shingles)
+        used += tokens
+
+    packed = "[\n" + ",\n".join(lines) + "\n]"
+
+    # The per-line counts above already add up to the packed size; no second pass over it
+    tokens_after = used
+    increments = dict(
+        calls=1, docs_in=len(records), docs_kept=len(lines), duplicates=duplicates, over_budget=over_budget,
+        tokens_after=tokens_after,
+    )
+    if CONTEXT_PACK_MEASURE:
+        tokens_before = count_tokens(json.dumps(records, ensure_ascii=False, indent=2), model)
+        increments.update(measured_calls=1, tokens_before=tokens_before, tokens_saved=tokens_before - tokens_after)
+    context_pack_stats.record(**increments)
+    return packed
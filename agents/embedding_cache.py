@@ -0,0 +1,217 @@
+import os
+import time
+import array
+import sqlite3
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# === Embedding Cache Configuration ===
+# Tier 1 is an in-process LRU, tier 2 is a SQLite file shared by every process on the host.
+default_cache_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    ".cache", "embeddings.sqlite3"
+)
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", default_cache_path)
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", "2048"))
+EMBEDDING_CACHE_DISK_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_DISK_ENTRIES", "100000"))
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different strings share one cache entry."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split()).casefold()
+
+
+# === Two-tier Embedding Cache ===
+class EmbeddingCache:
+    def __init__(
+        self,
+        path=EMBEDDING_CACHE_PATH,
+        max_memory_entries=EMBEDDING_CACHE_MEMORY_ENTRIES,
+        max_disk_entries=EMBEDDING_CACHE_DISK_ENTRIES,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+        if path and max_disk_entries > 0:
+            self._open_disk()
+
+    def _open_disk(self):
+        """Open (or create) the SQLite store; the cache degrades to memory-only on failure."""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, text)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            conn.commit()
+            self._disk_count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding disk cache unavailable ({e}), using memory only.")
+            self._conn = None
+
+    # --- Tier 1: in-process LRU ---
+    def get_memory(self, model: str, text: str):
+        key = (model, normalize_text(text))
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+
+    def _put_memory(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                self.memory_evictions += 1
+
+    # --- Tier 2: SQLite store ---
+    def get_disk(self, model: str, text: str):
+        key = (model, normalize_text(text))
+        if self._conn is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text = ?", key
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text = ?",
+                        (time.time(), *key),
+                    )
+                    self._conn.commit()
+            except sqlite3.Error:
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+
+        vector = array.array("f", row[0]).tolist()
+        self._put_memory(key, vector)
+        return vector
+
+    def get(self, model: str, text: str):
+        """Look up a vector in memory first, then on disk (promoting disk hits to memory)."""
+        vector = self.get_memory(model, text)
+        if vector is not None:
+            return vector
+        return self.get_disk(model, text)
+
+    def put(self, model: str, text: str, vector):
+        key = (model, normalize_text(text))
+        vector = list(vector)
+        self._put_memory(key, vector)
+
+        if self._conn is None:
+            return
+        with self._lock:
+            try:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM embeddings WHERE model = ? AND text = ?", key
+                ).fetchone() is not None
+                self._conn.execute(
+                    "INSERT INTO embeddings (model, text, vector, last_used) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (model, text) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used",
+                    (*key, array.array("f", vector).tobytes(), time.time()),
+                )
+                if not exists:  # an upsert reports one changed row either way
+                    self._disk_count += 1
+                # Evict least recently used rows in batches to keep writes cheap
+                overflow = self._disk_count - self.max_disk_entries
+                if overflow > 0:
+                    batch = max(overflow, self.max_disk_entries // 20)
+                    cursor = self._conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                        (batch,),
+                    )
+                    self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                    self.disk_evictions += cursor.rowcount
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Failed to write embedding cache: {e}")
+
+    # --- Async helpers: memory tier inline, disk tier off the event loop ---
+    async def aget(self, model: str, text: str):
+        vector = self.get_memory(model, text)
+        if vector is not None or self._conn is None:
+            if vector is None:
+                with self._lock:
+                    self.misses += 1
+            return vector
+        return await asyncio.to_thread(self.get_disk, model, text)
+
+    async def aput(self, model: str, text: str, vector):
+        if self._conn is None:
+            self._put_memory((model, normalize_text(text)), list(vector))
+            return
+        await asyncio.to_thread(self.put, model, text, vector)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+                self._disk_count = 0
+
+
+# === Shared cache instance (one per process, used by every search plugin) ===
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = EmbeddingCache()
+    return _shared_cache
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import weakref
+from contextvars import ContextVar
+
+from agents.embedding_cache import get_embedding_cache, normalize_text
+from agents.http_session_pool import get_http_session
+
+# === Request-scoped in-flight embeddings ===
+# Maps (endpoint, normalized text) -> asyncio.Task for the current turn. Tasks spawned by
+# asyncio.gather inherit the context, so every search in one turn sees the same dict.
+_turn_embeddings: ContextVar = ContextVar("turn_embeddings", default=None)
+
+
+def start_embedding_scope() -> dict:
+    """Start a new per-turn scope; identical embedding requests inside it share one call."""
+    scope = {}
+    _turn_embeddings.set(scope)
+    return scope
+
+
+# === Shared Embedding Client ===
+class EmbeddingClient:
+    def __init__(self, endpoint: str, headers: dict, cache=None):
+        self.endpoint = endpoint
+        self.headers = headers
+        self.cache = cache or get_embedding_cache()
+
+        # Fallback single-flight map used outside a turn scope (one per event loop)
+        self._loop_inflight = weakref.WeakKeyDictionary()
+
+        self.requests = 0
+        self.deduplicated = 0
+        self.fetches = 0
+
+    async def _post(self, text: str):
+        # Native async call over the pooled keep-alive session (no worker thread per call)
+        session = get_http_session()
+        async with session.post(self.endpoint, headers=self.headers, json={"input": text}) as response:
+            response.raise_for_status()
+            payload = await response.json()
+        return payload["data"][0]["embedding"]
+
+    async def _fetch(self, text: str):
+        cached = await self.cache.aget(self.endpoint, text)
+        if cached is not None:
+            return cached
+
+        self.fetches += 1
+        vector = await self._post(text)
+        await self.cache.aput(self.endpoint, text, vector)
+        return vector
+
+    async def embed(self, text: str):
+        """Return the embedding for text, sharing in-flight calls for the same string."""
+        self.requests += 1
+        key = (self.endpoint, normalize_text(text))
+
+        scope = _turn_embeddings.get()
+        keep_result = scope is not None
+        if scope is None:
+            loop = asyncio.get_running_loop()
+            scope = self._loop_inflight.setdefault(loop, {})
+
+        task = scope.get(key)
+        if task is not None:
+            self.deduplicated += 1
+        else:
+            task = asyncio.ensure_future(self._fetch(text))
+            scope[key] = task
+
+            def _on_done(t, scope=scope, key=key):
+                # Drop failed calls so a retry is possible; outside a turn scope the
+                # cache already covers reuse, so finished tasks are dropped as well.
+                if t.cancelled() or t.exception() is not None or not keep_result:
+                    if scope.get(key) is t:
+                        del scope[key]
+
+            task.add_done_callback(_on_done)
+
+        # Shield so one cancelled caller does not cancel the call shared by the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "deduplicated": self.deduplicated,
+            "fetches": self.fetches,
+            "cache": self.cache.stats(),
+        }
+
+
+# === Shared client instances (one per embedding endpoint) ===
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_embedding_client(endpoint: str, headers: dict) -> EmbeddingClient:
+    with _clients_lock:
+        client = _clients.get(endpoint)
+        if client is None:
+            client = EmbeddingClient(endpoint, headers)
+            _clients[endpoint] = client
+        return client
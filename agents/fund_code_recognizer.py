@@ -0,0 +1,182 @@
+import re
+import threading
+from collections import deque
+from pathlib import Path
+
+from agents.fundfact_query_engine import FUNDFACT_DATA_DIR, load_tables, data_version
+
+# Unicode dashes users paste from documents (‐ ‑ ‒ – — ― −) are matched as "-"
+DASHES = re.compile(r"[\u2010-\u2015\u2212]")
+
+# Share-class suffix, e.g. K-USA-A(A) -> main fund K-USA; AGG-UI-main -> AGG-UI
+CLASS_SUFFIX = re.compile(r"(-[A-Z]+\([A-Z]+\)|\([A-Z]+\)|-MAIN)$")
+
+WORD_CHAR = re.compile(r"[A-Z0-9]")
+
+
+def normalize_for_matching(text: str) -> str:
+    return " ".join(DASHES.sub("-", text).upper().split())
+
+
+def surface_variants(code: str) -> set:
+    """Case/dash variants of a code: K-GIFRMF, KGIFRMF and K GIFRMF."""
+    upper = code.upper()
+    return {upper, upper.replace("-", ""), upper.replace("-", " ")}
+
+
+# === Aho-Corasick automaton ===
+class AhoCorasick:
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]  # node -> [(pattern_length, value)]
+
+    def add(self, pattern: str, value):
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = next_node
+        self.output[node].append((len(pattern), value))
+
+    def build(self):
+        """Compute failure links breadth-first; outputs of the fail target are merged in."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+        return self
+
+    def iter(self, text: str):
+        """Yield (start, end, value) for every pattern occurrence in text."""
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, value in self.output[node]:
+                yield i + 1 - length, i + 1, value
+
+
+# === Fund-code entity recognizer ===
+class FundCodeRecognizer:
+    def __init__(self, data_dir: Path = FUNDFACT_DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self.version = None
+        self.automaton = None
+        self.targets = []  # value -> tuple of fund codes the surface form refers to
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Rebuild the automaton when the fund fact CSVs change."""
+        version = data_version(self.data_dir)
+        if version == self.version:
+            return False
+        with self._lock:
+            if version != self.version:
+                self._build()
+                self.version = version
+        return True
+
+    def _build(self):
+        tables = load_tables(self.data_dir)
+        codes = sorted({fund for table in tables.values() for fund in table.by_fund if fund})
+
+        surfaces = {}  # normalized surface form -> set of codes
+        for code in codes:
+            for variant in surface_variants(code):
+                surfaces.setdefault(variant, set()).add(code)
+
+        # Main fund names shared by their share classes; short or dash-less stems (UI, SSF)
+        # are common words, so they are not used as aliases
+        exact = set(surfaces)
+        for code in codes:
+            stem = CLASS_SUFFIX.sub("", code.upper())
+            if stem != code.upper() and stem not in exact and len(stem) >= 4 and "-" in stem:
+                for variant in surface_variants(stem):
+                    if variant not in exact:
+                        surfaces.setdefault(variant, set()).add(code)
+
+        # Full fund names from the category table (e.g. "K Global Infrastructure Equity RMF")
+        category = tables.get("category")
+        if category is not None:
+            for name, code in zip(category.columns["Group/Investment"], category.columns["fund_name"]):
+                if name and code:
+                    surfaces.setdefault(normalize_for_matching(name), set()).add(code)
+
+        automaton = AhoCorasick()
+        targets = []
+        for surface, surface_codes in surfaces.items():
+            automaton.add(surface, len(targets))
+            targets.append(tuple(sorted(surface_codes)))
+        self.automaton, self.targets = automaton.build(), targets
+
+    def recognize(self, text: str) -> list:
+        """
+        Leftmost-longest fund mentions in text as [{"text", "codes"}]. A mention must not
+        be glued to other letters or digits (KPVDSF does not match inside KPVDSFX).
+        """
+        normalized = normalize_for_matching(text)
+        candidates = []
+        for start, end, value in self.automaton.iter(normalized):
+            before = normalized[start - 1] if start > 0 else " "
+            after = normalized[end] if end < len(normalized) else " "
+            if WORD_CHAR.match(before) or WORD_CHAR.match(after):
+                continue
+            # A dash or class suffix right after means a longer code was written
+            if after in "-(" and end + 1 < len(normalized) and WORD_CHAR.match(normalized[end + 1]):
+                continue
+            candidates.append((start, end, value))
+
+        candidates.sort(key=lambda c: (c[0], -(c[1] - c[0])))
+        matches, covered_until = [], 0
+        for start, end, value in candidates:
+            if start < covered_until:
+                continue
+            matches.append({"text": normalized[start:end], "codes": list(self.targets[value])})
+            covered_until = end
+        return matches
+
+    def fund_codes(self, text: str) -> list:
+        """All fund codes mentioned in text, in order of appearance."""
+        return list(dict.fromkeys(code for match in self.recognize(text) for code in match["codes"]))
+
+    @staticmethod
+    def is_unambiguous(matches) -> bool:
+        """True when at least one fund is named and every mention resolves to a single code."""
+        return bool(matches) and all(len(match["codes"]) == 1 for match in matches)
+
+
+def build_fund_filter(codes, field: str = "content") -> str:
+    """OData filter keeping only documents that mention one of the fund codes."""
+    clauses = []
+    for code in codes:
+        phrase = '"' + code.replace("'", "''").replace('"', '') + '"'
+        clauses.append(f"search.ismatch('{phrase}', '{field}')")
+    return " or ".join(clauses)
+
+
+# === Shared recognizer instance ===
+_shared_recognizer = None
+_shared_recognizer_lock = threading.Lock()
+
+
+def get_fund_code_recognizer() -> FundCodeRecognizer:
+    global _shared_recognizer
+    if _shared_recognizer is None:
+        with _shared_recognizer_lock:
+            if _shared_recognizer is None:
+                _shared_recognizer = FundCodeRecognizer()
+    return _shared_recognizer
@@ -0,0 +1,228 @@
+import os
+import json
+import threading
+from pathlib import Path
+
+from agents.fundfact_query_engine import FUNDFACT_DATA_DIR, STAT_COLUMNS, load_tables, data_version
+
+# === Fund Profile Store Configuration ===
+BASE_DIR = Path(__file__).resolve().parent.parent
+FUND_PROFILES_PATH = Path(os.environ.get("FUND_PROFILES_PATH", BASE_DIR / ".cache" / "fund_profiles.json"))
+FUND_PROFILE_MAX_FUNDS = int(os.environ.get("FUND_PROFILE_MAX_FUNDS", "5"))
+FUND_PROFILE_POLICY_CHARS = int(os.environ.get("FUND_PROFILE_POLICY_CHARS", "400"))
+
+PERIOD_ORDER = ("YTD", "3M", "6M", "1Y", "3Y", "5Y", "10Y")
+
+# Short labels for the rendered profile
+FEE_LABELS = {
+    "managementRate": "mgmt",
+    "totalExpenseRate": "TER",
+    "frontEndFeeRate": "front",
+    "backEndFeeRate": "back",
+}
+STAT_LABELS = {
+    "maximumDrawdown": "maxDD",
+    "recoveringPeriodMonths": "recoverMonths",
+    "fxHedging": "fxHedge",
+    "trackingError": "TE",
+    "sharpeRatio": "sharpe",
+    "alpha": "alpha",
+    "beta": "beta",
+    "portfolioTurnoverRatio": "turnover",
+    "yieldToMaturity": "YTM",
+}
+
+
+# === Build step: one denormalized profile per fund code ===
+def format_number(value) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def returns_by_label(rows) -> dict:
+    return {
+        row["label"]: [row.get("fund_return"), row.get("benchmark_return"), row.get("peer_return")]
+        for row in rows
+    }
+
+
+def build_fund_profiles(data_dir: Path = FUNDFACT_DATA_DIR) -> dict:
+    """Join the seven fund fact tables on fund_name into {fund_code: profile}."""
+    tables = load_tables(data_dir)
+    funds = sorted({fund for table in tables.values() for fund in table.by_fund if fund})
+
+    def first_row(name, fund):
+        rows = tables[name].rows_for(fund) if name in tables else []
+        return rows[0] if rows else {}
+
+    profiles = {}
+    for fund in funds:
+        category = first_row("category", fund)
+        policy = first_row("policy", fund)
+        fees = first_row("fees", fund)
+        stats = first_row("stats", fund)
+        holdings = tables["holdings"].rows_for(fund) if "holdings" in tables else []
+
+        profiles[fund] = {
+            "fund_name": fund,
+            "name": category.get("Group/Investment") or None,
+            "category": {
+                "broad": category.get("Global Broad Category Group") or None,
+                "global": category.get("Global Category") or None,
+                "morningstar": category.get("Morningstar Category") or None,
+                "master_fund": category.get("Master Fund Name") or None,
+                "rating": category.get("Morningstar Rating Overall") or None,
+                "inception": category.get("Inception Date") or None,
+            },
+            "manager": policy.get("fund_manager_name") or None,
+            "policy": policy.get("policy") or None,
+            "fees": {k: v for k, v in fees.items() if k != "fund_name" and v is not None},
+            "stats": {k: stats[k] for k in STAT_COLUMNS if stats.get(k) is not None},
+            "accumulated": returns_by_label(tables["accumulated"].rows_for(fund)) if "accumulated" in tables else {},
+            "yearly": returns_by_label(tables["yearly"].rows_for(fund)) if "yearly" in tables else {},
+            "holdings": [
+                [int(h["rank"]) if h.get("rank") is not None else None, h["holding_name"], h.get("ratio")]
+                for h in sorted(holdings, key=lambda h: h.get("rank") or 0)
+            ],
+        }
+    return profiles
+
+
+# === Compact text rendering (injected as context) ===
+def render_fund_profile(profile: dict, policy_chars: int = FUND_PROFILE_POLICY_CHARS) -> str:
+    """
+    Render a profile as a few dense lines, dropping missing fields. Returns are
+    fund/benchmark/peer in percent, e.g. '1Y 12.4/10.1/9.8'.
+    """
+    lines = []
+    category = profile["category"]
+    header = [profile["fund_name"]]
+    header += [v for v in (profile["name"], category["global"], category["morningstar"]) if v]
+    if category["rating"]:
+        header.append(f"rating {len(category['rating'])}/5")
+    lines.append(" | ".join(header))
+
+    details = []
+    if category["master_fund"]:
+        details.append(f"master fund: {category['master_fund']}")
+    if profile["manager"]:
+        details.append(f"manager: {profile['manager']}")
+    if category["inception"]:
+        details.append(f"inception: {category['inception']}")
+    if details:
+        lines.append("; ".join(details))
+
+    if profile["policy"]:
+        policy = profile["policy"]
+        lines.append("policy: " + (policy if len(policy) <= policy_chars else policy[:policy_chars].rstrip() + "…"))
+
+    # Fees as max/actual pairs
+    fees = []
+    for key, label in FEE_LABELS.items():
+        # Columns look like mutual_fund_managementRate_max / _actual
+        pair = [v for column, v in profile["fees"].items() if column.split("_")[-2] == key]
+        if pair:
+            fees.append(f"{label} {'/'.join(format_number(v) for v in pair)}")
+    if fees:
+        lines.append("fees % max/actual: " + "; ".join(fees))
+
+    def render_returns(returns, order):
+        parts = []
+        for label in order:
+            values = returns.get(label)
+            if values and any(v is not None for v in values):
+                parts.append(f"{label} " + "/".join("-" if v is None else format_number(v) for v in values))
+        return "; ".join(parts)
+
+    accumulated = render_returns(profile["accumulated"], PERIOD_ORDER)
+    if accumulated:
+        lines.append("return % fund/bench/peer: " + accumulated)
+    yearly = render_returns(profile["yearly"], sorted(profile["yearly"]))
+    if yearly:
+        lines.append("yearly % fund/bench/peer: " + yearly)
+
+    if profile["stats"]:
+        lines.append("stats: " + "; ".join(
+            f"{STAT_LABELS.get(k, k)} {format_number(v)}" for k, v in profile["stats"].items()
+        ))
+    if profile["holdings"]:
+        lines.append("top holdings %: " + "; ".join(
+            f"{name} {format_number(ratio)}" for _, name, ratio in profile["holdings"]
+        ))
+    return "\n".join(lines)
+
+
+# === Materialized profile store (rebuilt when the CSVs change) ===
+class FundProfileStore:
+    def __init__(self, data_dir: Path = FUNDFACT_DATA_DIR, path: Path = FUND_PROFILES_PATH):
+        self.data_dir = Path(data_dir)
+        self.path = Path(path)
+        self.version = None
+        self.profiles = {}
+        self.rendered = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Load the stored view if it matches the CSVs, otherwise rebuild and persist it."""
+        version = data_version(self.data_dir)
+        if version == self.version:
+            return False
+
+        with self._lock:
+            if version == self.version:
+                return False
+            store = self._load(version)
+            if store is None:
+                profiles = build_fund_profiles(self.data_dir)
+                store = {
+                    "version": version,
+                    "profiles": profiles,
+                    "rendered": {code: render_fund_profile(p) for code, p in profiles.items()},
+                }
+                self._save(store)
+
+            self.profiles, self.rendered = store["profiles"], store["rendered"]
+            self.version = version
+        return True
+
+    def _load(self, version: str):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                store = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return store if store.get("version") == version else None
+
+    def _save(self, store: dict):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(store, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Failed to write fund profile store: {e}")
+
+    def render(self, codes, max_funds: int = FUND_PROFILE_MAX_FUNDS) -> str:
+        known = [code for code in codes if code in self.rendered]
+        return "\n\n".join(self.rendered[code] for code in known[:max_funds])
+
+
+# === Shared store instance ===
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_fund_profile_store() -> FundProfileStore:
+    global _shared_store
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                _shared_store = FundProfileStore()
+    return _shared_store
+
+
+if __name__ == "__main__":
+    # Build step: python -m agents.fund_profiles
+    store = FundProfileStore()
+    print(f"✅ {len(store.profiles)} fund profiles written to {store.path}")
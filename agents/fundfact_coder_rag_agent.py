@@ -1,14 +1,13 @@
 import os
-import yaml
 import asyncio
 
 from semantic_kernel.agents import AzureAssistantAgent
 from semantic_kernel.connectors.ai.open_ai import AzureOpenAISettings
 
-from agents.save_and_load_azure_assistant_agent import (
-    save_agent_id, load_agent_id,
-    save_file_id, load_file_id
-)
+from agents.save_and_load_azure_assistant_agent import save_agent_id, load_agent_id
+from agents.assistant_file_sync import sync_assistant_files, save_manifest, delete_remote_files
+from agents.http_session_pool import get_openai_http_client
+from agents.resource_registry import get_prompt
 
 # Not needed in real deployment, but helpful for local dev/testing
 from dotenv import load_dotenv
@@ -19,15 +18,6 @@ deployment = "gpt-4.1-mini"
 subscription_key = os.environ.get("AZURE_OPENAI_KEY")
 endpoint = os.environ.get("AZURE_OPENAI_RESOURCE")
 
-# === Load assistant prompt ===
-prompt_filepath = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
-    'agents', 'prompts.yml'
-)
-with open(prompt_filepath, "r", encoding="utf-8") as f:
-    prompts = yaml.safe_load(f)
-system_prompt = prompts["fundfact_coder_rag_agent_prompt"]
-
 
 # === Utility to get full file path for a data file ===
 def get_filepath_for_filename(filename: str) -> str:
@@ -44,11 +34,13 @@ async def get_fundfact_coder_rag_agent(
     force_file_update=False,
     prompt_overide=None
 ):
+    system_prompt = get_prompt("fundfact_coder_rag_agent_prompt")
     client = AzureAssistantAgent.create_client(
         deployment_name=deployment,
         api_key=subscription_key,
         endpoint=endpoint,
         api_version="2024-12-01-preview",
+        http_client=get_openai_http_client(),
     )
 
     assistant_name = "fundfact_coder_rag_agent"
@@ -57,28 +49,15 @@ async def get_fundfact_coder_rag_agent(
     tools = None
     tool_resources = None
 
-    # === Upload CSV files to assistant (if needed) ===
-    file_ids = []
+    # === Sync CSV files to assistant: only changed files are uploaded, concurrently ===
     base_directory = os.path.join(
         os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
         'data', 'fundfact_data'
     )
-    filenames = [f for f in os.listdir(base_directory) if f.endswith('.csv')]
-
-    for filename in filenames:
-        path = get_filepath_for_filename(filename)
-
-        # Reuse uploaded file ID unless forced to update
-        if not force_file_update:
-            cached_file_id = load_file_id(filename)
-            if cached_file_id:
-                file_ids.append(cached_file_id)
-                continue
-
-        with open(path, "rb") as file:
-            uploaded = await client.files.create(file=file, purpose="assistants")
-            file_ids.append(uploaded.id)
-            save_file_id(filename, uploaded.id)
+    sync = await sync_assistant_files(client, base_directory, suffix=".csv", force=force_file_update)
+    file_ids = sync["file_ids"]
+    if sync["uploaded"]:
+        print(f"📤 Uploaded {len(sync['uploaded'])} changed file(s): {', '.join(sync['uploaded'])}")
 
     # Attach files as tool resources if available
     if file_ids:
@@ -95,18 +74,26 @@ async def get_fundfact_coder_rag_agent(
             if force_prompt_update:
                 update_payload["instructions"] = prompt_overide if prompt_overide else system_prompt
 
-            # Update tool resources if files are re-uploaded
-            if force_file_update and tools and tool_resources:
-                update_payload["tools"] = tools
-                update_payload["tool_resources"] = tool_resources
+            # Update tool resources if any file was re-uploaded or removed; with no CSV left the
+            # code interpreter is detached from every upload, so the stale ones can go below
+            if sync["changed"]:
+                if tools and tool_resources:
+                    update_payload["tools"] = tools
+                    update_payload["tool_resources"] = tool_resources
+                else:
+                    update_payload["tool_resources"] = {"code_interpreter": {"file_ids": []}}
 
-            # Apply update if needed
+            # Apply update if needed (one patch for prompt and files)
             if update_payload:
                 definition = await client.beta.assistants.update(
                     assistant_id=cached_id, **update_payload
                 )
                 print(f"🔁 Assistant {assistant_name} updated.")
 
+            # The manifest is saved and old uploads are removed only once the assistant points at the new files
+            save_manifest(sync["manifest"])
+            await delete_remote_files(client, sync["stale_file_ids"])
+
             return AzureAssistantAgent(client=client, definition=definition)
 
         except Exception as e:
@@ -121,5 +108,7 @@ async def get_fundfact_coder_rag_agent(
         tool_resources=tool_resources,
     )
     save_agent_id(assistant_name, definition.id)
+    save_manifest(sync["manifest"])
+    await delete_remote_files(client, sync["stale_file_ids"])
 
     return AzureAssistantAgent(client=client, definition=definition)
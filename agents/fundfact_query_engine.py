@@ -0,0 +1,349 @@
+import os
+import re
+import io
+import csv
+import json
+import threading
+from pathlib import Path
+from typing import Annotated
+
+
+from semantic_kernel import Kernel
+from semantic_kernel.functions import kernel_function
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.agents.chat_completion.chat_completion_agent import ChatCompletionAgent
+from semantic_kernel.connectors.ai import FunctionChoiceBehavior
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureChatPromptExecutionSettings
+
+from agents.holdings_index import HoldingsIndex
+from agents.http_session_pool import create_azure_openai_client
+from agents.resource_registry import get_prompt
+
+# === Azure OpenAI configuration ===
+deployment = "gpt-4.1-mini"
+subscription_key = os.environ.get("AZURE_OPENAI_KEY")
+endpoint = os.environ.get("AZURE_OPENAI_RESOURCE")
+
+# "assistant" keeps the Azure Assistants code-interpreter agent; "local" opts into answering
+# spreadsheet questions with the in-process query engine below
+FUNDFACT_QUERY_ENGINE = os.environ.get("FUNDFACT_QUERY_ENGINE", "assistant")
+
+FUNDFACT_DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "fundfact_data"
+
+# Table name -> CSV file; every table is keyed by fund_name
+TABLE_FILES = {
+    "accumulated": "accumulate_performance.csv",
+    "yearly": "peryear_performance.csv",
+    "holdings": "all_funds_top5_holdings.csv",
+    "policy": "all_policy_and_fund_manager_name.csv",
+    "stats": "all_stat_info.csv",
+    "category": "category.csv",
+    "fees": "fees_numeric_all.csv",
+}
+COLUMN_RENAMES = {"category": {"Fund Code": "fund_name"}}
+
+# Columns that look numeric but are identifiers (e.g. yearly labels like 2021)
+STRING_COLUMNS = {"fund_name", "label"}
+
+STAT_COLUMNS = (
+    "maximumDrawdown", "recoveringPeriodMonths", "fxHedging", "trackingError", "sharpeRatio",
+    "alpha", "beta", "portfolioTurnoverRatio", "yieldToMaturity",
+)
+
+
+# === CSV loading ===
+def read_csv_text(path: Path) -> str:
+    raw = path.read_bytes()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("mac_roman")  # category.csv is a legacy Excel export
+
+
+def parse_number(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+# === Typed columnar table ===
+class Table:
+    def __init__(self, name: str, columns: dict):
+        self.name = name
+        self.columns = columns
+        self.n_rows = len(next(iter(columns.values()))) if columns else 0
+
+        # fund_name -> row indices, the join key shared by every table
+        self.by_fund = {}
+        for i, fund in enumerate(columns.get("fund_name", [])):
+            self.by_fund.setdefault(fund, []).append(i)
+
+    @classmethod
+    def from_csv(cls, name: str, path: Path, renames: dict = None) -> "Table":
+        reader = csv.reader(io.StringIO(read_csv_text(path), newline=""))
+        header = [(renames or {}).get(h.strip(), h.strip()) for h in next(reader)]
+        raw_columns = {h: [] for h in header}
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            for h, cell in zip(header, row + [""] * (len(header) - len(row))):
+                raw_columns[h].append(cell.strip())
+
+        # A column is numeric when every non-empty cell parses as a number; empty cells become None
+        columns = {}
+        for h, values in raw_columns.items():
+            numbers = [parse_number(v) if v else None for v in values]
+            numeric = h not in STRING_COLUMNS and all(n is not None for n, v in zip(numbers, values) if v)
+            columns[h] = numbers if numeric else values
+        return cls(name, columns)
+
+    def row(self, i: int) -> dict:
+        return {h: values[i] for h, values in self.columns.items()}
+
+    def rows_for(self, fund_name: str) -> list:
+        return [self.row(i) for i in self.by_fund.get(fund_name, [])]
+
+
+def load_tables(data_dir: Path = FUNDFACT_DATA_DIR) -> dict:
+    data_dir = Path(data_dir)
+    return {
+        name: Table.from_csv(name, data_dir / filename, COLUMN_RENAMES.get(name))
+        for name, filename in TABLE_FILES.items()
+        if (data_dir / filename).exists()
+    }
+
+
+def data_version(data_dir: Path = FUNDFACT_DATA_DIR) -> str:
+    """Latest modification time of the fund fact CSVs (changes whenever any table is replaced)."""
+    mtimes = [(Path(data_dir) / f).stat().st_mtime_ns for f in TABLE_FILES.values() if (Path(data_dir) / f).exists()]
+    return str(max(mtimes)) if mtimes else ""
+
+
+# === In-process fund fact query engine ===
+class FundFactQueryEngine:
+    def __init__(self, data_dir: Path = FUNDFACT_DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self.tables = load_tables(self.data_dir)
+        self.fund_names = sorted({fund for table in self.tables.values() for fund in table.by_fund if fund})
+        self._fund_lookup = {fund.casefold(): fund for fund in self.fund_names}
+        self.holdings_index = HoldingsIndex(self.data_dir / TABLE_FILES["holdings"])
+
+    def resolve_fund(self, name: str) -> list:
+        """Exact code first, then share classes of a main fund (K-USA -> K-USA-A(A), ...), then substrings."""
+        key = name.strip().casefold()
+        if key in self._fund_lookup:
+            return [self._fund_lookup[key]]
+        prefixed = [f for f in self.fund_names if f.casefold().startswith(key)]
+        return prefixed or [f for f in self.fund_names if key and key in f.casefold()]
+
+    def _resolve_many(self, fund_names) -> dict:
+        return {name: self.resolve_fund(name) for name in fund_names if name.strip()}
+
+    def top_by_return(self, period: str, n: int = 10, metric: str = "fund_return",
+                      ascending: bool = False, beat_benchmark: bool = False) -> list:
+        """Rank funds by return for an accumulated period (YTD, 3M, 1Y, ...) or a calendar year."""
+        period = period.strip().upper()
+        yearly = self.tables["yearly"]
+        if period in ("LATEST", "LAST YEAR"):
+            period = max(yearly.columns["label"])
+        table = yearly if period.isdigit() else self.tables["accumulated"]
+
+        rows = []
+        for i, label in enumerate(table.columns["label"]):
+            if label.upper() != period:
+                continue
+            row = table.row(i)
+            if row.get(metric) is None:
+                continue
+            if beat_benchmark and (row["benchmark_return"] is None or row["fund_return"] <= row["benchmark_return"]):
+                continue
+            rows.append(row)
+        rows.sort(key=lambda r: r[metric], reverse=not ascending)
+        return rows[:n]
+
+    def filter_by_fee(self, fee: str = "totalExpenseRate_actual", max_value: float = None,
+                      min_value: float = None, n: int = 20) -> list:
+        """Funds whose fee column (matched by suffix, e.g. managementRate_actual) lies within the bounds."""
+        fees = self.tables["fees"]
+        column = next((c for c in fees.columns if c.casefold().endswith(fee.strip().casefold())), None)
+        if column is None:
+            return []
+
+        rows = []
+        for i, value in enumerate(fees.columns[column]):
+            if value is None or (max_value is not None and value > max_value) or (min_value is not None and value < min_value):
+                continue
+            rows.append({"fund_name": fees.columns["fund_name"][i], column: value})
+        rows.sort(key=lambda r: r[column])
+        return rows[:n]
+
+    def holdings(self, fund_name: str) -> dict:
+        table = self.tables["holdings"]
+        return {fund: table.rows_for(fund) for fund in self.resolve_fund(fund_name)}
+
+    def funds_holding(self, asset: str, n: int = 20) -> list:
+        """Funds whose top-5 holdings match asset (Thai or English, fuzzy), largest position first."""
+        self.holdings_index.refresh()
+        return self.holdings_index.lookup(asset, n=n)
+
+    def compare_stats(self, fund_names, stats=None) -> dict:
+        table = self.tables["stats"]
+        columns = [s for s in (stats or STAT_COLUMNS) if s in table.columns]
+        result = {}
+        for funds in self._resolve_many(fund_names).values():
+            for fund in funds:
+                for row in table.rows_for(fund):
+                    result[fund] = {c: row[c] for c in columns}
+        return result
+
+    def performance(self, fund_name: str) -> dict:
+        result = {}
+        for fund in self.resolve_fund(fund_name):
+            result[fund] = {
+                "accumulated": self.tables["accumulated"].rows_for(fund),
+                "yearly": self.tables["yearly"].rows_for(fund),
+            }
+        return result
+
+    def fund_info(self, fund_name: str) -> dict:
+        """Policy, fund manager, category and fees of a fund (and its share classes)."""
+        result = {}
+        for fund in self.resolve_fund(fund_name):
+            result[fund] = {
+                name: self.tables[name].rows_for(fund)
+                for name in ("policy", "category", "fees")
+                if name in self.tables
+            }
+        return result
+
+    def search_category(self, text: str, n: int = 30) -> list:
+        """
+        Funds whose category, master fund or name mention text as whole words (e.g. Japan,
+        Technology, Thailand Equity); exclusions such as "Asia ex-Japan" do not count.
+        """
+        table = self.tables["category"]
+        key = " ".join(text.split())
+        if not key:
+            return []
+        pattern = re.compile(rf"(?<![\w])(?<!ex-)(?<!ex )(?:{re.escape(key)})(?![\w])", re.IGNORECASE)
+        rows = []
+        for i in range(table.n_rows):
+            row = table.row(i)
+            if any(isinstance(v, str) and pattern.search(v) for v in row.values()):
+                rows.append(row)
+        return rows[:n]
+
+
+# === Shared engine instance (tables are loaded once per process) ===
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_fundfact_query_engine() -> FundFactQueryEngine:
+    global _shared_engine
+    if _shared_engine is None:
+        with _shared_engine_lock:
+            if _shared_engine is None:
+                _shared_engine = FundFactQueryEngine()
+    return _shared_engine
+
+
+# === Kernel plugin exposing the engine as tools ===
+def to_json(data) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+class FundFactQueryPlugin:
+    def __init__(self, engine: FundFactQueryEngine = None):
+        self.engine = engine or get_fundfact_query_engine()
+
+    @kernel_function(description="Find fund codes matching a (partial) fund name, e.g. K-USA returns all its share classes")
+    def find_funds(self, name: Annotated[str, "Fund code or part of it"]) -> Annotated[str, "Matching fund codes"]:
+        return to_json(self.engine.resolve_fund(name))
+
+    @kernel_function(description="Rank funds by return for a period: YTD, 3M, 6M, 1Y, 3Y, 5Y, 10Y, a year like 2024, or LATEST for the latest year")
+    def top_funds_by_return(
+        self,
+        period: Annotated[str, "Period label or year"],
+        n: Annotated[int, "Number of funds to return"] = 10,
+        ascending: Annotated[bool, "True for the worst performers first"] = False,
+        beat_benchmark: Annotated[bool, "Only funds whose return beat their benchmark"] = False,
+    ) -> Annotated[str, "Ranked fund returns"]:
+        return to_json(self.engine.top_by_return(period, n=n, ascending=ascending, beat_benchmark=beat_benchmark))
+
+    @kernel_function(description="List funds by fee, cheapest first. fee is a fee column suffix such as managementRate_actual, totalExpenseRate_actual, frontEndFeeRate_max, backEndFeeRate_actual")
+    def filter_funds_by_fee(
+        self,
+        fee: Annotated[str, "Fee column suffix"] = "totalExpenseRate_actual",
+        max_value: Annotated[float | None, "Maximum fee in percent"] = None,
+        min_value: Annotated[float | None, "Minimum fee in percent"] = None,
+        n: Annotated[int, "Number of funds to return"] = 20,
+    ) -> Annotated[str, "Funds with their fee"]:
+        return to_json(self.engine.filter_by_fee(fee, max_value=max_value, min_value=min_value, n=n))
+
+    @kernel_function(description="Top 5 holdings of a fund with their portfolio ratio (percent)")
+    def get_fund_holdings(self, fund_name: Annotated[str, "Fund code"]) -> Annotated[str, "Holdings per fund"]:
+        return to_json(self.engine.holdings(fund_name))
+
+    @kernel_function(description="Funds that hold a given asset (stock, bank deposit, master fund, commodity ETF, ...) among their top 5 holdings; accepts Thai or English names")
+    def find_funds_holding(
+        self,
+        asset: Annotated[str, "Asset, company or master fund name"],
+        n: Annotated[int, "Number of rows to return"] = 20,
+    ) -> Annotated[str, "Funds and the asset's ratio"]:
+        return to_json(self.engine.funds_holding(asset, n=n))
+
+    @kernel_function(description="Compare risk statistics (maximumDrawdown, sharpeRatio, alpha, beta, trackingError, ...) across funds")
+    def compare_fund_stats(
+        self,
+        fund_names: Annotated[str, "Comma-separated fund codes"],
+        stats: Annotated[str, "Comma-separated statistic names; empty for all"] = "",
+    ) -> Annotated[str, "Statistics per fund"]:
+        stat_list = [s.strip() for s in stats.split(",") if s.strip()] or None
+        return to_json(self.engine.compare_stats(fund_names.split(","), stat_list))
+
+    @kernel_function(description="Accumulated and calendar-year returns of a fund versus its benchmark and peers")
+    def get_fund_performance(self, fund_name: Annotated[str, "Fund code"]) -> Annotated[str, "Performance per fund"]:
+        return to_json(self.engine.performance(fund_name))
+
+    @kernel_function(description="Investment policy, fund manager, Morningstar category and fees of a fund")
+    def get_fund_info(self, fund_name: Annotated[str, "Fund code"]) -> Annotated[str, "Fund details"]:
+        return to_json(self.engine.fund_info(fund_name))
+
+    @kernel_function(description="Funds whose category, master fund or name mention a theme, country or sector")
+    def search_funds_by_category(
+        self,
+        text: Annotated[str, "Theme, country, sector or category (English)"],
+        n: Annotated[int, "Number of funds to return"] = 30,
+    ) -> Annotated[str, "Matching funds with their category"]:
+        return to_json(self.engine.search_category(text, n=n))
+
+
+# === Create fund fact query agent (function calling over the local engine) ===
+def get_fundfact_query_agent(kernel: Kernel) -> ChatCompletionAgent:
+    if "fundfact_query_agent" not in kernel.services:
+        kernel.add_service(
+            AzureChatCompletion(
+                service_id="fundfact_query_agent",
+                deployment_name=deployment,
+                api_key=subscription_key,
+                endpoint=endpoint,
+                async_client=create_azure_openai_client(subscription_key, endpoint),
+            )
+        )
+
+    settings = AzureChatPromptExecutionSettings(
+        service_id="fundfact_query_agent",
+        temperature=0.1,
+        top_p=1.0,
+        function_choice_behavior=FunctionChoiceBehavior.Auto(),
+    )
+
+    return ChatCompletionAgent(
+        kernel=kernel,
+        arguments=KernelArguments(settings=settings),
+        name="fundfact_query_agent",
+        instructions=get_prompt("fundfact_query_agent_prompt"),
+        plugins=[FundFactQueryPlugin()],
+    )
@@ -0,0 +1,221 @@
+import re
+import csv
+import io
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from pathlib import Path
+
+# === Holdings Index Configuration ===
+HOLDINGS_CSV_PATH = Path(__file__).resolve().parent.parent / "data" / "fundfact_data" / "all_funds_top5_holdings.csv"
+
+# Bound on memoized query tokens (cleared when exceeded)
+MATCH_CACHE_SIZE = 4096
+
+# Similarity (difflib ratio) above which a query token matches a differently spelled index token
+FUZZY_THRESHOLD = 0.8
+
+# Legal-form and filler words that carry no meaning for "which fund holds X" lookups
+STOP_TOKENS = {
+    "บมจ", "บริษัท", "จำกัด", "มหาชน",
+    "the", "inc", "corp", "co", "ltd", "plc", "sa", "nv", "ag", "se", "class", "and", "of", "acc",
+}
+
+TOKEN_SPLIT = re.compile(r"[^\w\u0E00-\u0E7F]+")
+
+# Cross-script aliases, indexed with the same postings as the holding they describe, so an
+# English query finds a Thai holding name and vice versa. Instrument types match whole tokens
+# (หุ้น must not tag หุ้นกู้); issuer names match anywhere in the normalized holding name.
+HOLDING_TYPE_ALIASES = {
+    "หุ้น": ["stock", "share", "equity"],
+    "หุ้นกู้": ["debenture", "corporate bond"],
+    "พันธบัตร": ["bond", "government bond"],
+    "เงินฝาก": ["deposit", "cash"],
+}
+HOLDING_NAME_ALIASES = {
+    "ธนาคารกสิกรไทย": ["kasikornbank", "kasikorn", "kbank"],
+    "ธนาคารกรุงเทพ": ["bangkok bank", "bbl"],
+    "ธนาคารกรุงไทย": ["krungthai bank", "krungthai", "ktb"],
+    "ธนาคารทหารไทย": ["tmbthanachart", "tmb", "ttb"],
+    "ธนาคารไทยพาณิชย์": ["siam commercial bank", "scb"],
+    "ธนาคารอาคารสงเคราะห์": ["government housing bank", "ghb"],
+    "ซิตี้แบงก์": ["citibank"],
+    "ฮ่องกงและเซี่ยงไฮ้": ["hsbc"],
+    "เอสซีบี เอกซ์": ["scb x", "scbx"],
+    "ปตท.": ["ptt"],
+    "ปตท.สำรวจและผลิตปิโตรเลียม": ["pttep"],
+    "ปตท. น้ำมันและการค้าปลีก": ["pttor", "oil and retail"],
+    "พีทีที โกลบอล เคมิคอล": ["ptt global chemical", "pttgc"],
+    "โกลบอล เพาเวอร์ ซินเนอร์ยี่": ["global power synergy", "gpsc"],
+    "กัลฟ์ ดีเวลลอปเมนท์": ["gulf development", "gulf"],
+    "ซีพี ออลล์": ["cp all", "cpall"],
+    "ท่าอากาศยานไทย": ["airports of thailand", "aot"],
+    "การบินกรุงเทพ": ["bangkok airways", "baa"],
+    "กรุงเทพดุสิตเวชการ": ["bangkok dusit medical", "bdms"],
+    "แอดวานซ์ อินโฟร์ เซอร์วิส": ["advanced info service", "advanc", "ais"],
+    "ไทยออยล์": ["thai oil", "thaioil"],
+    "เดลต้า อีเลคโทรนิคส์": ["delta electronics", "delta"],
+    "เซ็นทรัลพัฒนา": ["central pattana", "cpn"],
+    "เซ็นทรัล รีเทล": ["central retail", "crc"],
+    "บีทีเอส กรุ๊ป": ["bts group", "bts"],
+    "คาราบาวกรุ๊ป": ["carabao group", "carabao"],
+    "ทรูคอร์ปอเรชั่น": ["true corporation", "true"],
+    "ทิสโก้": ["tisco"],
+    "เมืองไทย แคปปิตอล": ["muangthai capital", "mtc"],
+    "ศักดิ์สยามลิสซิ่ง": ["saksiam leasing", "saksiam"],
+    "ไมเนอร์ อินเตอร์เนชั่นแนล": ["minor international", "mint"],
+    "แพลน บี มีเดีย": ["plan b media", "planb"],
+    "จัสมิน": ["jasmine"],
+    "jp morgan": ["เจพีมอร์แกน"],
+    "jpmorgan": ["เจพีมอร์แกน"],
+    "ishares": ["ไอแชร์"],
+    "gold": ["ทองคำ"],
+    "nasdaq": ["แนสแด็ก"],
+}
+
+# Optional CSV columns holding another-script name for the same row (indexed like aliases)
+ALIAS_COLUMNS = ("holding_name_en", "holding_name_th", "holding_alias")
+
+
+# === Normalization shared by indexing and lookup ===
+def normalize_holding(text: str) -> str:
+    """NFKC (full-width and Thai compatibility forms), casefold and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(text.split())
+
+
+def tokenize(text: str) -> list:
+    """Split on punctuation and spaces (Thai names are space-separated words in this data)."""
+    return [t for t in TOKEN_SPLIT.split(normalize_holding(text)) if t and t not in STOP_TOKENS]
+
+
+def holding_aliases(name: str) -> list:
+    """Alias strings for a holding name from HOLDING_TYPE_ALIASES and HOLDING_NAME_ALIASES."""
+    normalized = normalize_holding(name)
+    tokens = set(tokenize(name))
+    aliases = [alias for key, values in HOLDING_TYPE_ALIASES.items() if key in tokens for alias in values]
+    aliases += [
+        alias for key, values in HOLDING_NAME_ALIASES.items() if normalize_holding(key) in normalized for alias in values
+    ]
+    return aliases
+
+
+def trigrams(token: str) -> set:
+    return {token[i:i + 3] for i in range(len(token) - 2)} if len(token) >= 3 else {token}
+
+
+# === Inverted index: normalized holding token -> postings ===
+class HoldingsIndex:
+    def __init__(self, path: Path = HOLDINGS_CSV_PATH):
+        self.path = Path(path)
+        self._mtime = None
+        self._lock = threading.Lock()
+
+        self.postings = []        # posting_id -> {"fund_name", "rank", "ratio", "holding_name"}
+        self.token_postings = {}  # token -> set of posting ids
+        self.trigram_tokens = {}  # trigram -> set of tokens (candidate generation for fuzzy matches)
+        self._match_cache = {}    # query token -> set of posting ids
+
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Rebuild the index if the CSV changed since the last build; returns True when rebuilt."""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            self._build()
+            self._mtime = mtime
+        return True
+
+    def _build(self):
+        raw = self.path.read_bytes()
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            text = raw.decode("mac_roman")
+
+        postings, token_postings, trigram_tokens = [], {}, {}
+        for row in csv.DictReader(io.StringIO(text, newline="")):
+            name = (row.get("holding_name") or "").strip()
+            if not name:
+                continue
+            posting_id = len(postings)
+            postings.append({
+                "fund_name": row["fund_name"].strip(),
+                "rank": int(float(row["rank"])) if row.get("rank") else None,
+                "ratio": float(row["ratio"]) if row.get("ratio") else 0.0,
+                "holding_name": name,
+            })
+            names = [name, *(row.get(column) or "" for column in ALIAS_COLUMNS), *holding_aliases(name)]
+            for token in {token for text in names for token in tokenize(text)}:
+                token_postings.setdefault(token, set()).add(posting_id)
+
+        for token in token_postings:
+            for gram in trigrams(token):
+                trigram_tokens.setdefault(gram, set()).add(token)
+
+        # Swap in one step so concurrent lookups never see a half-built index
+        self.postings, self.token_postings, self.trigram_tokens = postings, token_postings, trigram_tokens
+        self._match_cache = {}
+
+    def _match_token(self, token: str, fuzzy: bool) -> set:
+        """Posting ids for one query token: exact token, then containment and fuzzy spelling matches."""
+        cache_key = (token, fuzzy)
+        cached = self._match_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        ids = set(self.token_postings.get(token, ()))
+        if not ids and fuzzy and len(token) >= 3:
+            candidates = set()
+            for gram in trigrams(token):
+                candidates |= self.trigram_tokens.get(gram, set())
+            for candidate in candidates:
+                # Containment covers Thai compounds (กสิกร in ธนาคารกสิกรไทย) and prefixes (tech -> technology)
+                if token in candidate or (len(candidate) >= 4 and candidate in token) \
+                        or SequenceMatcher(None, token, candidate).ratio() >= FUZZY_THRESHOLD:
+                    ids |= self.token_postings[candidate]
+
+        if len(self._match_cache) >= MATCH_CACHE_SIZE:
+            self._match_cache = {}
+        self._match_cache[cache_key] = ids
+        return ids
+
+    def lookup(self, query: str, n: int = 20, fuzzy: bool = True) -> list:
+        """
+        Holdings matching query, largest position first. Holdings matching every query token rank
+        first; if none do, those matching the most tokens (at least half) are returned.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        coverage = {}
+        for token in tokens:
+            for posting_id in self._match_token(token, fuzzy):
+                coverage[posting_id] = coverage.get(posting_id, 0) + 1
+        if not coverage:
+            return []
+
+        best = max(coverage.values())
+        if best * 2 < len(tokens):
+            return []
+
+        postings = self.postings
+        hits = [postings[i] for i, count in coverage.items() if count == best]
+        hits.sort(key=lambda p: p["ratio"], reverse=True)
+        return hits[:n]
+
+    def stats(self) -> dict:
+        return {
+            "postings": len(self.postings),
+            "tokens": len(self.token_postings),
+            "cached_queries": len(self._match_cache),
+        }
@@ -0,0 +1,221 @@
+import os
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+import weakref
+
+import aiohttp
+import httpx
+from openai import AsyncAzureOpenAI
+
+# === Connection Pool Configuration ===
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TOTAL_TIMEOUT = float(os.environ.get("HTTP_TOTAL_TIMEOUT", "30"))
+
+# Same default as Semantic Kernel's AzureChatCompletion
+AZURE_OPENAI_API_VERSION = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-10-21")
+
+# aiohttp sessions are bound to the event loop that created them, so keep one pooled session
+# per running loop. Turns run on a pooled SessionLoop (below) so that loop, and its connections, outlive a turn.
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the keep-alive session for the running loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        _sessions[loop] = session
+    return session
+
+
+# === httpx client for the OpenAI SDK, shared across loops ===
+class LoopLocalAsyncClient(httpx.AsyncClient):
+    """
+    httpx connections are bound to the loop that opened them, and one AsyncClient used from
+    several sessions' loops at once deadlocks. Agents shared by every session send through
+    this client, which keeps one real pooled client per running loop.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client_for_loop(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_LIMIT,
+                    max_keepalive_connections=HTTP_POOL_LIMIT_PER_HOST,
+                    keepalive_expiry=HTTP_KEEPALIVE_TIMEOUT,
+                ),
+                timeout=httpx.Timeout(HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def send(self, request, **kwargs):
+        # The OpenAI SDK passes its own per-request timeout on the request
+        return await self._client_for_loop().send(request, **kwargs)
+
+    async def close_loop_client(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+
+_openai_http_client = LoopLocalAsyncClient()
+
+
+def get_openai_http_client() -> LoopLocalAsyncClient:
+    """The process-wide httpx client for OpenAI SDK clients (closed per loop by close_http_sessions)."""
+    return _openai_http_client
+
+
+def create_azure_openai_client(api_key: str, endpoint: str, api_version: str = AZURE_OPENAI_API_VERSION) -> AsyncAzureOpenAI:
+    """Azure OpenAI client that is safe to share between sessions (each loop gets its own connections)."""
+    return AsyncAzureOpenAI(
+        api_key=api_key,
+        azure_endpoint=endpoint,
+        api_version=api_version,
+        http_client=_openai_http_client,
+    )
+
+
+async def close_http_sessions():
+    """Close the pooled sessions of the running loop (call before the loop shuts down)."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
+    await _openai_http_client.close_loop_client()
+
+
+# === Long-lived loops that chat turns run on ===
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+async def _shutdown_loop():
+    try:
+        await close_http_sessions()
+    finally:
+        asyncio.get_running_loop().stop()
+
+
+def _stop_loop(loop):
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(loop.create_task, _shutdown_loop())
+
+
+class SessionLoop:
+    """
+    An event loop on its own daemon thread that chat turns run on. A fresh asyncio.run() loop
+    per turn would close the pooled sessions each time, so keep-alive and TLS reuse never lasted
+    past one turn; here idle connections are only dropped after HTTP_KEEPALIVE_TIMEOUT. The loop
+    closes its sessions and stops on close() or garbage collection.
+    """
+
+    def __init__(self, name: str = "session-loop"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=_run_loop, args=(self.loop,), name=name, daemon=True)
+        self.thread.start()
+        self._finalizer = weakref.finalize(self, _stop_loop, self.loop)
+
+    def run(self, coro):
+        """
+        Run coro on the session loop and block until it finishes (the asyncio.run() of a turn).
+        The task runs in a copy of the caller's context, so context variables set by the calling
+        thread (e.g. Streamlit's current container) still apply.
+        """
+        done = Future()
+        context = contextvars.copy_context()
+
+        def finish(task):
+            if task.cancelled():
+                done.cancel()
+            elif task.exception() is not None:
+                done.set_exception(task.exception())
+            else:
+                done.set_result(task.result())
+
+        def start():
+            self.loop.create_task(coro, context=context).add_done_callback(finish)
+
+        self.loop.call_soon_threadsafe(start)
+        return done.result()
+
+    def close(self, timeout: float = 5):
+        self._finalizer()
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
+
+
+class SessionLoopPool:
+    """
+    A bounded set of SessionLoops shared by every chat session. A turn checks out a loop for its
+    whole run, so per-thread state attached to the loop's thread (Streamlit's script run context)
+    belongs to that turn; at most size turns run at once and later ones wait for a free loop.
+    Loops are started on demand and reused, so the process never holds more than size threads,
+    loops and connection pools, however many sessions come and go.
+    """
+
+    def __init__(self, size: int, name: str = "turn-loop"):
+        self.size = max(1, size)
+        self.name = name
+        self._loops = []
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Semaphore(self.size)
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a loop for one turn (blocks while all size loops are busy)."""
+        self._available.acquire()
+        try:
+            with self._lock:
+                if self._idle:
+                    turn_loop = self._idle.pop()
+                else:
+                    turn_loop = SessionLoop(name=f"{self.name}-{len(self._loops)}")
+                    self._loops.append(turn_loop)
+            try:
+                yield turn_loop
+            finally:
+                with self._lock:
+                    self._idle.append(turn_loop)
+        finally:
+            self._available.release()
+
+    def run(self, coro):
+        """Run coro on a free loop and block until it finishes."""
+        with self.checkout() as turn_loop:
+            return turn_loop.run(coro)
+
+    def close(self, timeout: float = 5):
+        """Close the pooled sessions of every loop and stop their threads."""
+        with self._lock:
+            loops, self._loops, self._idle = self._loops, [], []
+        for turn_loop in loops:
+            turn_loop.close(timeout)
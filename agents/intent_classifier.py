@@ -0,0 +1,319 @@
+import os
+import io
+import re
+import csv
+import json
+import math
+import time
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# === Local Intent Classifier Configuration ===
+BASE_DIR = Path(__file__).resolve().parent.parent
+FUNDFACT_DATA_DIR = BASE_DIR / "data" / "fundfact_data"
+ROUTER_LOG_PATH = Path(os.environ.get("ROUTER_LOG_PATH", BASE_DIR / ".cache" / "router_decisions.jsonl"))
+LOCAL_ROUTER_THRESHOLD = float(os.environ.get("LOCAL_ROUTER_THRESHOLD", "0.85"))
+LOCAL_ROUTER_MIN_TRAINING = int(os.environ.get("LOCAL_ROUTER_MIN_TRAINING", "50"))
+LOCAL_ROUTER_RETRAIN_EVERY = int(os.environ.get("LOCAL_ROUTER_RETRAIN_EVERY", "100"))
+# Rule confidence of a single keyword hit, as a fraction of the threshold
+SINGLE_SIGNAL_CONFIDENCE = 0.9
+
+# The main router prompt currently answers with THAI only; script detection is mapped onto this set.
+ROUTER_LANGUAGES = tuple(os.environ.get("ROUTER_LANGUAGES", "THAI").split(","))
+
+INTENTS = ("NEWS", "CALLCENTER", "FUNDFACT", "BYPASS")
+
+# Intents the local classifier may decide on its own. BYPASS depends on the chat history
+# (recaps, rephrasing, repeated questions), so it is always left to the LLM router.
+LOCAL_INTENTS = ("NEWS", "CALLCENTER", "FUNDFACT")
+
+# Keyword hints taken from the main router prompt
+INTENT_KEYWORDS = {
+    "NEWS": [
+        "kcma", "capital market assumption", "ktm", "know the market", "monthly standpoint", "standpoint",
+        "economy", "economic", "inflation", "interest rate", "gdp", "fed", "recession", "stock market",
+        "outlook", "news", "เศรษฐกิจ", "เงินเฟ้อ", "ดอกเบี้ย", "ตลาดหุ้น", "ภาวะตลาด", "แนวโน้ม", "ข่าว",
+        "ค่าเงิน", "ภาษีนำเข้า", "น่าลงทุน", "ลงทุนอะไรดี",
+    ],
+    "CALLCENTER": [
+        "form", "register", "registration", "application", "k-my fund", "kmyfund", "rmf for pvd",
+        "tax consent", "open account", "contact", "แบบฟอร์ม", "ฟอร์ม", "สมัคร", "ลงทะเบียน", "เปิดบัญชี",
+        "ยินยอม", "ความยินยอม", "ติดต่อ", "แอป", "เข้าสู่ระบบ", "รหัสผ่าน",
+    ],
+    "FUNDFACT": [
+        "fund fact", "factsheet", "fee", "management fee", "expense ratio", "nav", "holding", "top 5",
+        "fund manager", "sharpe", "drawdown", "dividend", "ค่าธรรมเนียม", "ผลตอบแทนกองทุน", "ผู้จัดการกองทุน",
+        "สัดส่วนการลงทุน", "ถือหุ้น", "ลงทุนใน", "นโยบายการลงทุน", "ปันผล", "ความเสี่ยงกองทุน",
+    ],
+}
+
+# Phrases that point to BYPASS behaviour; the classifier defers to the LLM router for these
+DEFER_KEYWORDS = [
+    "summary", "summarize", "recap", "translate", "rephrase", "again", "previous",
+    "สรุป", "แปล", "อีกครั้ง", "ก่อนหน้า", "ที่แล้ว", "เมื่อกี้", "ภาษาอังกฤษ",
+]
+
+THAI_CHAR = re.compile(r"[\u0E00-\u0E7F]")
+LATIN_CHAR = re.compile(r"[A-Za-z]")
+
+
+def compile_keywords(keywords) -> list:
+    """Latin keywords match on word boundaries; Thai has no spaces, so Thai keywords match as substrings."""
+    return [
+        re.compile(rf"\b{re.escape(k)}\b") if k.isascii() else re.compile(re.escape(k))
+        for k in keywords
+    ]
+
+
+def distinct_matches(patterns, text: str) -> int:
+    """
+    Number of different keywords found in text, counting overlapping matches once: "fee" inside
+    "management fee" is the same phrase, not a second signal. Longer matches win.
+    """
+    spans = sorted(
+        ((m.start(), m.end(), i) for i, pattern in enumerate(patterns) for m in pattern.finditer(text)),
+        key=lambda span: span[0] - span[1],
+    )
+    kept, keywords = [], set()
+    for start, end, i in spans:
+        if all(end <= other_start or start >= other_end for other_start, other_end in kept):
+            kept.append((start, end))
+            keywords.add(i)
+    return len(keywords)
+
+
+INTENT_PATTERNS = {intent: compile_keywords(keywords) for intent, keywords in INTENT_KEYWORDS.items()}
+DEFER_PATTERNS = compile_keywords(DEFER_KEYWORDS)
+
+
+# === Script-based language detection ===
+def detect_language(text: str) -> str:
+    thai = len(THAI_CHAR.findall(text))
+    latin = len(LATIN_CHAR.findall(text))
+    detected = "THAI" if thai >= latin or thai >= 3 else "ENGLISH"
+    return detected if detected in ROUTER_LANGUAGES else ROUTER_LANGUAGES[0]
+
+
+# === Known fund codes (closed vocabulary from the fund fact CSVs) ===
+def load_known_fund_codes(data_dir: Path = FUNDFACT_DATA_DIR) -> set:
+    codes = set()
+    for path in data_dir.glob("*.csv"):
+        raw = path.read_bytes()
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            text = raw.decode("mac_roman")  # category.csv is a legacy Excel export
+        for row in csv.DictReader(io.StringIO(text, newline="")):
+            code = row.get("fund_name") or row.get("Fund Code")
+            if code:
+                codes.add(code.strip())
+    return codes
+
+
+def compile_fund_code_pattern(codes) -> re.Pattern:
+    alternatives = "|".join(re.escape(c.upper()) for c in sorted(codes, key=len, reverse=True))
+    return re.compile(rf"(?<![A-Z0-9\-])(?:{alternatives})(?![A-Z0-9\-])")
+
+
+# === Character n-gram Naive Bayes trained on logged router decisions ===
+class CharNgramNaiveBayes:
+    def __init__(self, n_range=(1, 3), alpha=0.5):
+        self.n_range = n_range
+        self.alpha = alpha
+        self.class_counts = Counter()
+        self.ngram_counts = defaultdict(Counter)
+        self.ngram_totals = Counter()
+        self.vocabulary = set()
+
+    def ngrams(self, text: str):
+        text = f" {' '.join(text.casefold().split())} "
+        for n in range(self.n_range[0], self.n_range[1] + 1):
+            for i in range(len(text) - n + 1):
+                yield text[i:i + n]
+
+    def fit(self, texts, labels):
+        for text, label in zip(texts, labels):
+            self.class_counts[label] += 1
+            for gram in self.ngrams(text):
+                self.ngram_counts[label][gram] += 1
+                self.ngram_totals[label] += 1
+                self.vocabulary.add(gram)
+        return self
+
+    def coverage(self, text: str) -> float:
+        grams = list(self.ngrams(text))
+        return sum(1 for g in grams if g in self.vocabulary) / len(grams) if grams else 0.0
+
+    @property
+    def trained(self) -> bool:
+        return sum(self.class_counts.values()) > 0
+
+    def predict_proba(self, text: str) -> dict:
+        total_docs = sum(self.class_counts.values())
+        vocab_size = len(self.vocabulary) or 1
+        grams = [g for g in self.ngrams(text) if g in self.vocabulary]
+
+        log_scores = {}
+        for label, count in self.class_counts.items():
+            denominator = self.ngram_totals[label] + self.alpha * vocab_size
+            counts = self.ngram_counts[label]
+            score = math.log(count / total_docs)
+            for gram in grams:
+                score += math.log((counts[gram] + self.alpha) / denominator)
+            log_scores[label] = score
+
+        # Softmax in log space
+        top = max(log_scores.values())
+        exp_scores = {label: math.exp(score - top) for label, score in log_scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+
+# === Local Fast-path Intent Classifier ===
+class LocalIntentClassifier:
+    def __init__(self, log_path: Path = ROUTER_LOG_PATH, threshold: float = LOCAL_ROUTER_THRESHOLD):
+        self.log_path = Path(log_path)
+        self.threshold = threshold
+        self.fund_code_pattern = compile_fund_code_pattern(load_known_fund_codes())
+        self.model = None
+        self._logged_since_training = 0
+        self._retraining = None
+        self._lock = threading.Lock()
+
+        self.local_decisions = 0
+        self.llm_fallbacks = 0
+
+        self.retrain()
+
+    def retrain(self):
+        """Fit the n-gram model on logged LLM router decisions (skipped until enough are logged)."""
+        texts, labels = [], []
+        if self.log_path.exists():
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("intent") in INTENTS and record.get("query"):
+                        texts.append(record["query"])
+                        labels.append(record["intent"])
+
+        model = CharNgramNaiveBayes().fit(texts, labels) if len(texts) >= LOCAL_ROUTER_MIN_TRAINING else None
+        with self._lock:
+            self.model = model
+            self._logged_since_training = 0
+
+    def log_decision(self, query: str, intent: str, language: str):
+        """
+        Append an LLM router decision to the training log (blocking file I/O: call it off the
+        event loop). Every LOCAL_ROUTER_RETRAIN_EVERY decisions the model is refit in a background thread.
+        """
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            record = {"query": query, "intent": intent, "language": language, "ts": time.time()}
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Failed to log router decision: {e}")
+            return
+
+        with self._lock:
+            self._logged_since_training += 1
+            if self._logged_since_training < LOCAL_ROUTER_RETRAIN_EVERY:
+                return
+            if self._retraining is not None and self._retraining.is_alive():
+                return
+            self._retraining = threading.Thread(target=self.retrain, name="router-retrain", daemon=True)
+            self._retraining.start()
+
+    def rule_scores(self, query: str) -> dict:
+        lowered = query.casefold()
+        scores = {intent: 0.0 for intent in LOCAL_INTENTS}
+        if self.fund_code_pattern.search(query.upper()):
+            scores["FUNDFACT"] += 3.0
+        for intent, patterns in INTENT_PATTERNS.items():
+            scores[intent] += distinct_matches(patterns, lowered)
+        return scores
+
+    def guess(self, query: str):
+        """
+        Return the most probable (intent, confidence) without applying the threshold.
+        Deferred queries (recaps, translations, ...) return (None, 0.0).
+        """
+        lowered = query.casefold()
+        if not query.strip() or any(pattern.search(lowered) for pattern in DEFER_PATTERNS):
+            return None, 0.0
+
+        scores = self.rule_scores(query)
+        total = sum(scores.values())
+        rule_distribution = {intent: (score / total if total else 1 / len(scores)) for intent, score in scores.items()}
+
+        # A single keyword hit is not decisive on its own: keep it below the threshold so
+        # only a second signal (another rule or the n-gram model) can clear it
+        best_rule = max(rule_distribution, key=rule_distribution.get)
+        rule_confidence = rule_distribution[best_rule] if total >= 1 else 0.0
+        if total >= 1 and scores[best_rule] < 2:
+            rule_confidence = min(rule_confidence, SINGLE_SIGNAL_CONFIDENCE * self.threshold)
+
+        # The n-gram model only counts when it has seen most of the query's n-grams;
+        # otherwise its posterior is overconfident noise
+        model = self.model
+        nb = None
+        if model is not None and model.trained and model.coverage(query) >= 0.5:
+            nb = model.predict_proba(query)
+
+        if nb is None:
+            intent, confidence = best_rule, rule_confidence
+        elif not total:
+            intent = max(nb, key=nb.get)
+            confidence = nb[intent]
+        else:
+            combined = {i: 0.5 * rule_distribution.get(i, 0.0) + 0.5 * nb.get(i, 0.0) for i in INTENTS}
+            intent = max(combined, key=combined.get)
+            confidence = combined[intent]
+            nb_best = max(nb, key=nb.get)
+            if intent == best_rule == nb_best:
+                # Both signals agree: trust the stronger one
+                confidence = max(rule_confidence, nb[nb_best])
+
+        return intent, confidence
+
+    def classify(self, query: str):
+        """
+        Return (intent, language, confidence). intent is None when the query is ambiguous
+        and should go to the LLM router instead.
+        """
+        language = detect_language(query)
+        intent, confidence = self.guess(query)
+
+        if intent not in LOCAL_INTENTS or confidence < self.threshold:
+            self.llm_fallbacks += 1
+            return None, language, confidence
+
+        self.local_decisions += 1
+        return intent, language, confidence
+
+    def stats(self) -> dict:
+        decisions = self.local_decisions + self.llm_fallbacks
+        return {
+            "local_decisions": self.local_decisions,
+            "llm_fallbacks": self.llm_fallbacks,
+            "local_rate": self.local_decisions / decisions if decisions else 0.0,
+            "model_trained": self.model is not None,
+        }
+
+
+# === Shared classifier instance ===
+_shared_classifier = None
+_shared_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> LocalIntentClassifier:
+    global _shared_classifier
+    if _shared_classifier is None:
+        with _shared_classifier_lock:
+            if _shared_classifier is None:
+                _shared_classifier = LocalIntentClassifier()
+    return _shared_classifier
@@ -1,25 +1,18 @@
 import os
-import yaml
 
 from semantic_kernel import Kernel
 from semantic_kernel.functions.kernel_arguments import KernelArguments
 from semantic_kernel.agents.chat_completion.chat_completion_agent import ChatCompletionAgent
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureChatPromptExecutionSettings
 
+from agents.http_session_pool import create_azure_openai_client
+from agents.resource_registry import get_prompt
+
 # === Azure OpenAI Configuration ===
 deployment = "gpt-4.1-nano"
 subscription_key = os.environ.get("AZURE_OPENAI_KEY")
 endpoint = os.environ.get("AZURE_OPENAI_RESOURCE")
 
-# === Load Prompt from YAML ===
-prompt_filepath = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
-    'agents', 'prompts.yml'
-)
-with open(prompt_filepath, "r", encoding="utf-8") as f:
-    prompts = yaml.safe_load(f)
-system_prompt = prompts["keyword_extractor_agent_prompt"]
-
 
 # === Keyword Extractor Agent Constructor ===
 def get_keyword_extractor_agent(kernel: Kernel) -> ChatCompletionAgent:
@@ -31,6 +24,7 @@ def get_keyword_extractor_agent(kernel: Kernel) -> ChatCompletionAgent:
                 deployment_name=deployment,
                 api_key=subscription_key,
                 endpoint=endpoint,
+                async_client=create_azure_openai_client(subscription_key, endpoint),
             )
         )
 
@@ -48,7 +42,7 @@ def get_keyword_extractor_agent(kernel: Kernel) -> ChatCompletionAgent:
         kernel=kernel,
         arguments=KernelArguments(settings=settings),
         name="keyword-extractor-agent",
-        instructions=system_prompt,
+        instructions=get_prompt("keyword_extractor_agent_prompt"),
     )
 
     return agent
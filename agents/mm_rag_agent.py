@@ -1,8 +1,6 @@
 import os
+import math
 import asyncio
-import json
-import requests
-import yaml
 from typing import Annotated
 
 from semantic_kernel import Kernel
@@ -11,12 +9,17 @@ from semantic_kernel.functions.kernel_arguments import KernelArguments
 from semantic_kernel.agents.chat_completion.chat_completion_agent import ChatCompletionAgent
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureChatPromptExecutionSettings
 
-from azure.search.documents import SearchClient
 from azure.search.documents.models import VectorizedQuery
-from azure.core.credentials import AzureKeyCredential
 
+from agents.embedding_client import get_embedding_client
+from agents.search_backend import search_documents
+from agents.context_packer import pack_context
+from agents.rerank import rerank, MMR_FETCH_FACTOR, RERANK_VECTORS, VECTOR_FIELD
+from agents.http_session_pool import create_azure_openai_client
+from agents.resource_registry import get_prompt
 
-# === Azure OpenAI & Cognitive Search Environment Variables ===
+
+# === Azure OpenAI Environment Variables ===
 deployment = "gpt-4o-mini"
 subscription_key = os.environ.get("AZURE_OPENAI_KEY")
 endpoint = os.environ.get("AZURE_OPENAI_RESOURCE")
@@ -25,8 +28,15 @@ headers = {
     "Content-Type": "application/json",
     "Authorization": os.environ.get("AZURE_OPENAI_EMBEDDING_MODEL_RESOURCE_KEY")
 }
-search_endpoint = os.environ.get("COG_SEARCH_ENDPOINT")
-admin_key = os.environ.get("COG_SEARCH_ADMIN_KEY")
+
+# Prompt field -> search document field of the packed context
+context_fields = {
+    "page": "page",
+    "filename": "doc_name",
+    "content": "content",
+    "table": "table",
+    "figure": "figure",
+}
 
 
 # === Multimodal Search Plugin ===
@@ -36,38 +46,28 @@ class SearchPlugin:
         text_index_name="pdf-economic-summary",
         table_index_name="pdf-economic-summary-tables",
         image_index_name="pdf-economic-summary-images",
+        text_token_budget=None,
+        table_token_budget=None,
     ):
-        self.search_client_text = SearchClient(
-            endpoint=search_endpoint,
-            index_name=text_index_name,
-            credential=AzureKeyCredential(admin_key),
-        )
-        self.search_client_table = SearchClient(
-            endpoint=search_endpoint,
-            index_name=table_index_name,
-            credential=AzureKeyCredential(admin_key),
-        )
-        self.search_client_image = SearchClient(
-            endpoint=search_endpoint,
-            index_name=image_index_name,
-            credential=AzureKeyCredential(admin_key),
-        )
+        # Async search clients are created per event loop by agents.search_backend
+        self.text_index_name = text_index_name
+        self.table_index_name = table_index_name
+        self.image_index_name = image_index_name
+        # Context token budgets (None: unlimited); images share the text budget
+        self.token_budgets = {
+            text_index_name: text_token_budget,
+            table_index_name: table_token_budget,
+            image_index_name: text_token_budget,
+        }
         self.embedding_endpoint = embedding_endpoint
         self.headers = headers
+        self.embedding_client = get_embedding_client(embedding_endpoint, headers)
 
     async def get_embedding(self, text: str):
-        def sync_post():
-            response = requests.post(
-                url=self.embedding_endpoint,
-                headers=self.headers,
-                json={"input": text},
-            )
-            response.raise_for_status()
-            return response.json()["data"][0]["embedding"]
+        # Cached and single-flight: identical strings in one turn share a single call
+        return await self.embedding_client.embed(text)
 
-        return await asyncio.to_thread(sync_post)
-
-    async def _search(self, query, client, select, top_k=10, filter=None):
+    async def _search_docs(self, query, index_name, select, top_k=10, filter=None):
         # Get embedding vector asynchronously
         vector = await self.get_embedding(query)
 
@@ -76,8 +76,9 @@ class SearchPlugin:
             vector=vector, k_nearest_neighbors=top_k, fields="contentVector"
         )
 
-        # Perform vector search with optional filtering and selection
-        results = client.search(
+        # Perform non-blocking vector search with optional filtering and selection
+        return await search_documents(
+            index_name,
             search_text=query,
             vector_queries=[vector_query],
             select=select,
@@ -85,22 +86,110 @@ class SearchPlugin:
             filter=filter,
         )
 
-        # Serialize search results to JSON with key fields
-        return json.dumps(
-            [
-                {
-                    "page": doc.get("page", "N/A"),
-                    "filename": doc.get("doc_name", "unknown.txt"),
-                    "content": doc.get("content", ""),
-                    "table": doc.get("table", "N/A"),
-                    "figure": doc.get("figure", "N/A"),
-                }
-                for doc in results
-            ],
-            ensure_ascii=False,
-            indent=2,
+    async def _attach_vectors(self, docs):
+        # Hits without a vector are embedded from their content (cached, so each chunk is embedded once)
+        missing = [doc for doc in docs if not doc.get(VECTOR_FIELD) and doc.get("content")]
+        vectors = await asyncio.gather(*(self.get_embedding(doc["content"]) for doc in missing), return_exceptions=True)
+        for doc, vector in zip(missing, vectors):
+            if isinstance(vector, BaseException):
+                print(f"⚠️ Hit embedding failed, reranking by search score: {vector}")
+            else:
+                doc[VECTOR_FIELD] = vector
+
+    async def _serialize(self, docs, index_name, ordered=False):
+        # Compact, deduplicated JSON within the index's token budget (tokenized off the loop)
+        return await asyncio.to_thread(
+            pack_context, docs, context_fields, self.token_budgets.get(index_name), ordered=ordered
         )
 
+    async def _search(self, query, index_name, select, top_k=10, filter=None):
+        docs = await self._search_docs(query, index_name, select, top_k=top_k, filter=filter)
+        return await self._serialize(docs, index_name)
+
+    async def search_routes(
+        self,
+        query,
+        route_prefixes: dict,
+        text_top_k: dict,
+        table_top_k: int = 5,
+        prefix_field="key_prefix",
+    ) -> dict:
+        """
+        Combined retrieval for several routes: one text query and one table query with an
+        OR'd prefix filter (plus a filtered query per route left short of its quota). The hits of
+        both indexes and all routes are then deduplicated and reranked together by MMR, filling
+        each route's text and table quota.
+        Returns {route: (text_json, table_json)}.
+        """
+        routes = [route for route in text_top_k if route in route_prefixes]
+        if not routes:
+            return {}
+
+        route_filter = " or ".join(f"{prefix_field} eq '{route_prefixes[route]}'" for route in routes)
+        quotas = {("text", route): text_top_k[route] for route in routes}
+        quotas.update({("table", route): table_top_k for route in routes})
+
+        # One route can dominate the ranking of the combined query, so over-fetch as if every
+        # route had the largest quota, then backfill any route still short with its own query;
+        # without MMR there is nothing to choose from the extra candidates
+        fetch_factor = MMR_FETCH_FACTOR if RERANK_VECTORS != "off" else 1
+
+        def fetch(kind):
+            kind_quotas = [quota for (k, _), quota in quotas.items() if k == kind]
+            return math.ceil(len(kind_quotas) * max(kind_quotas) * fetch_factor)
+
+        # Vectors are only selected when configured: they dominate the response size
+        vector_fields = [VECTOR_FIELD] if RERANK_VECTORS == "index" else []
+        indexes = {
+            "text": (self.text_index_name, ["content", "page", "doc_name", prefix_field, *vector_fields]),
+            "table": (self.table_index_name, ["content", "page", "table", "doc_name", prefix_field, *vector_fields]),
+        }
+        text_docs, table_docs, query_vector = await asyncio.gather(
+            self._search_docs(query, *indexes["text"], top_k=fetch("text"), filter=route_filter),
+            self._search_docs(query, *indexes["table"], top_k=fetch("table"), filter=route_filter),
+            self.get_embedding(query),  # cached: the searches above embedded the same query
+        )
+
+        route_by_prefix = {route_prefixes[route]: route for route in routes}
+        candidates = [
+            ((kind, route_by_prefix[doc.get(prefix_field)]), doc)
+            for kind, docs in (("text", text_docs), ("table", table_docs))
+            for doc in docs
+            if doc.get(prefix_field) in route_by_prefix
+        ]
+
+        # A combined query that came back below its fetch size already returned every match
+        truncated = {"text": len(text_docs) >= fetch("text"), "table": len(table_docs) >= fetch("table")}
+        found = {bucket: 0 for bucket in quotas}
+        for bucket, _ in candidates:
+            found[bucket] += 1
+        short = [bucket for bucket, quota in quotas.items() if truncated[bucket[0]] and found[bucket] < quota]
+        if short:
+            backfill = await asyncio.gather(*(
+                self._search_docs(
+                    query,
+                    *indexes[kind],
+                    top_k=math.ceil(quotas[(kind, route)] * fetch_factor),
+                    filter=f"{prefix_field} eq '{route_prefixes[route]}'",
+                )
+                for kind, route in short
+            ))
+            # Hits already in the combined results are collapsed by the reranker
+            candidates += [(bucket, doc) for bucket, docs in zip(short, backfill) for doc in docs]
+
+        if RERANK_VECTORS != "off":
+            await self._attach_vectors([doc for _, doc in candidates])
+        selected = await asyncio.to_thread(rerank, query_vector, candidates, quotas)
+
+        packed = await asyncio.gather(*(
+            asyncio.gather(
+                self._serialize(selected[("text", route)], self.text_index_name, ordered=True),
+                self._serialize(selected[("table", route)], self.table_index_name, ordered=True),
+            )
+            for route in routes
+        ))
+        return {route: tuple(contexts) for route, contexts in zip(routes, packed)}
+
     @kernel_function(description="Search document text content")
     async def search_text_content(
         self,
@@ -110,7 +199,7 @@ class SearchPlugin:
     ) -> Annotated[str, "Search results"]:
         return await self._search(
             query,
-            self.search_client_text,
+            self.text_index_name,
             select=["content", "page", "doc_name"],
             filter=filter,
             top_k=top_k,
@@ -125,7 +214,7 @@ class SearchPlugin:
     ) -> Annotated[str, "Search results"]:
         return await self._search(
             query,
-            self.search_client_table,
+            self.table_index_name,
             select=["content", "page", "table", "doc_name"],
             filter=filter,
             top_k=top_k,
@@ -140,23 +229,13 @@ class SearchPlugin:
     ) -> Annotated[str, "Search results"]:
         return await self._search(
             query,
-            self.search_client_image,
+            self.image_index_name,
             select=["content", "page", "figure", "doc_name"],
             filter=filter,
             top_k=top_k,
         )
 
 
-# === Load system prompts ===
-prompt_filepath = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "agents", "prompts.yml"
-)
-with open(prompt_filepath, "r", encoding="utf-8") as f:
-    prompts = yaml.safe_load(f)
-
-system_prompt = prompts["mm_rag_agent_prompt"]
-
-
 # === Create Multimodal RAG Agent ===
 def get_mm_rag_agent(kernel: Kernel) -> ChatCompletionAgent:
     if "rag_agent" not in kernel.services:
@@ -166,6 +245,7 @@ def get_mm_rag_agent(kernel: Kernel) -> ChatCompletionAgent:
                 deployment_name=deployment,
                 api_key=subscription_key,
                 endpoint=endpoint,
+                async_client=create_azure_openai_client(subscription_key, endpoint),
             )
         )
 
@@ -181,7 +261,7 @@ def get_mm_rag_agent(kernel: Kernel) -> ChatCompletionAgent:
         kernel=kernel,
         arguments=KernelArguments(settings=settings),
         name="searchservice-mm-rag-agent",
-        instructions=system_prompt,
+        instructions=get_prompt("mm_rag_agent_prompt"),
     )
 
 
@@ -190,9 +270,13 @@ def get_mm_search_plugin(
     text_index_name="pdf-economic-summary",
     table_index_name="pdf-economic-summary-tables",
     image_index_name="pdf-economic-summary-images",
+    text_token_budget=None,
+    table_token_budget=None,
 ):
     return SearchPlugin(
         text_index_name=text_index_name,
         table_index_name=table_index_name,
         image_index_name=image_index_name,
+        text_token_budget=text_token_budget,
+        table_token_budget=table_token_budget,
     )
@@ -1,26 +1,17 @@
 import os
-import yaml
 from semantic_kernel.agents import ChatCompletionAgent
 from semantic_kernel.functions.kernel_arguments import KernelArguments
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureChatPromptExecutionSettings
 from semantic_kernel import Kernel
 
+from agents.http_session_pool import create_azure_openai_client
+from agents.resource_registry import get_prompt
+
 # === Azure OpenAI Deployment and Credentials ===
 deployment = "gpt-4.1-mini"
 subscription_key = os.environ.get("AZURE_OPENAI_KEY")
 endpoint = os.environ.get("AZURE_OPENAI_RESOURCE")
 
-# === Load System Prompt from YAML ===
-prompt_filepath = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
-    'agents',
-    'prompts.yml'
-)
-with open(prompt_filepath, "r", encoding="utf-8") as f:
-    prompts = yaml.safe_load(f)
-
-system_prompt = prompts.get("reply_agent_prompt", "")
-
 
 # === Create and Return the Reply Agent ===
 def get_reply_agent(kernel: Kernel) -> ChatCompletionAgent:
@@ -32,6 +23,7 @@ def get_reply_agent(kernel: Kernel) -> ChatCompletionAgent:
                 deployment_name=deployment,
                 api_key=subscription_key,
                 endpoint=endpoint,
+                async_client=create_azure_openai_client(subscription_key, endpoint),
             )
         )
 
@@ -49,6 +41,6 @@ def get_reply_agent(kernel: Kernel) -> ChatCompletionAgent:
         kernel=kernel,
         arguments=KernelArguments(settings=settings),
         name="general_reply",
-        instructions=system_prompt,
+        instructions=get_prompt("reply_agent_prompt", ""),
     )
     return agent
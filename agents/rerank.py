@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+
+# === Local Reranking Configuration ===
+# Maximal-marginal-relevance trade-off: 1.0 ranks by relevance only, lower values favour diversity
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", "0.7"))
+# Candidates fetched per slot, so that reranking has something to choose from (1 disables MMR)
+MMR_FETCH_FACTOR = float(os.environ.get("MMR_FETCH_FACTOR", "2"))
+# Candidates at least this similar to one already selected are dropped as duplicates
+MMR_DUPLICATE_SIMILARITY = float(os.environ.get("MMR_DUPLICATE_SIMILARITY", "0.97"))
+# Where hit vectors come from: "embed" (each hit's content through the cached embedding client),
+# "index" (selected from the index's vector field, re-embedding hits returned without it)
+# or "off" (no MMR: duplicates are collapsed and hits kept in search-score order)
+RERANK_VECTORS = os.environ.get("RERANK_VECTORS", "embed").lower()
+
+VECTOR_FIELD = "contentVector"
+
+
+def document_key(doc: dict) -> tuple:
+    """Identity of a hit across routes and indexes: the same page/table/figure of the same file."""
+    return doc.get("doc_name"), doc.get("page"), doc.get("table") or doc.get("figure")
+
+
+def collapse_duplicates(candidates: list) -> tuple[list, int]:
+    """
+    Keep the best-scoring hit per document_key. candidates are (bucket, doc) pairs; returns
+    the kept pairs, best search score first, and the number of hits collapsed.
+    """
+    ranked = sorted(candidates, key=lambda item: item[1].get("@search.score") or 0.0, reverse=True)
+    kept, seen = [], set()
+    for bucket, doc in ranked:
+        key = document_key(doc)
+        if key in seen:
+            continue
+        seen.add(key)
+        kept.append((bucket, doc))
+    return kept, len(candidates) - len(kept)
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+# === Maximal marginal relevance over all candidates at once ===
+def mmr_select(query_vector, candidates: list, quotas: dict, lambda_: float = MMR_LAMBDA,
+               duplicate_similarity: float = MMR_DUPLICATE_SIMILARITY) -> tuple[dict, int]:
+    """
+    Select hits by MMR until every bucket's quota is filled. candidates are (bucket, doc) pairs
+    whose docs carry VECTOR_FIELD; quotas maps bucket -> max hits. Redundancy is measured against
+    everything selected so far, whatever its bucket, so the same content retrieved for two routes
+    or from both indexes is only used once. Returns ({bucket: [doc, ...] in MMR order}, duplicates).
+    """
+    selected = {bucket: [] for bucket in quotas}
+    if not candidates:
+        return selected, 0
+
+    docs = _unit_rows([doc[VECTOR_FIELD] for _, doc in candidates])
+    relevance = docs @ _unit_rows(query_vector)
+    similarity = docs @ docs.T
+
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)  # to the selected set
+    available = np.ones(len(candidates), dtype=bool)
+    open_slots = {bucket: quota for bucket, quota in quotas.items() if quota > 0}
+    duplicates = 0
+
+    while open_slots and available.any():
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        available[best] = False
+
+        bucket, doc = candidates[best]
+        if max_similarity[best] >= duplicate_similarity:
+            duplicates += 1
+            continue
+        if bucket not in open_slots:
+            continue  # its route/index is already full
+
+        selected[bucket].append(doc)
+        open_slots[bucket] -= 1
+        if not open_slots[bucket]:
+            del open_slots[bucket]
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected, duplicates
+
+
+def rerank(query_vector, candidates: list, quotas: dict) -> dict:
+    """
+    Collapse duplicate hits, then fill each bucket's quota by MMR; falls back to search-score
+    order when some hit came back without its vector. Returns {bucket: [doc, ...]}.
+    """
+    kept, _ = collapse_duplicates(candidates)
+
+    if kept and all(doc.get(VECTOR_FIELD) for _, doc in kept):
+        selected, _ = mmr_select(query_vector, kept, quotas)
+        return selected
+
+    selected = {bucket: [] for bucket in quotas}
+    for bucket, doc in kept:
+        if bucket in selected and len(selected[bucket]) < quotas[bucket]:
+            selected[bucket].append(doc)
+    return selected
@@ -0,0 +1,117 @@
+import threading
+from pathlib import Path
+
+# === Resource Registry Configuration ===
+PROMPTS_PATH = Path(__file__).resolve().parent / "prompts.yml"
+
+# Models tiktoken may not know yet, mapped to their encoding
+MODEL_ENCODINGS = {
+    "gpt-4.1": "o200k_base",
+    "gpt-4.1-mini": "o200k_base",
+    "gpt-4.1-nano": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+}
+
+# Encoders loaded by warmup_resources()
+WARMUP_MODELS = ("gpt-4o-mini", "gpt-4.1")
+
+
+# === Prompts: parsed once, re-parsed when prompts.yml changes ===
+class PromptRegistry:
+    def __init__(self, path: Path = PROMPTS_PATH):
+        self.path = Path(path)
+        self._prompts = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        mtime = self.path.stat().st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            import yaml  # deferred: only needed once the first agent is built
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._prompts = yaml.safe_load(f) or {}
+            self._mtime = mtime
+
+    def get(self, name: str, default=None):
+        self._refresh()
+        if default is None and name not in self._prompts:
+            raise KeyError(f"Prompt '{name}' not found in {self.path.name}")
+        return self._prompts.get(name, default)
+
+    def all(self) -> dict:
+        self._refresh()
+        return dict(self._prompts)
+
+
+# === Tokenizers: loaded on first use (or by a background warmup) ===
+class TokenizerRegistry:
+    def __init__(self):
+        self._encoders = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str):
+        encoder = self._encoders.get(model)
+        if encoder is not None:
+            return encoder
+        with self._lock:
+            encoder = self._encoders.get(model)
+            if encoder is None:
+                import tiktoken  # deferred: loading the BPE ranks is the slow part of the import chain
+                encoding = MODEL_ENCODINGS.get(model)
+                encoder = tiktoken.get_encoding(encoding) if encoding else tiktoken.encoding_for_model(model)
+                self._encoders[model] = encoder
+        return encoder
+
+    def loaded(self) -> list:
+        return sorted(self._encoders)
+
+
+prompt_registry = PromptRegistry()
+tokenizer_registry = TokenizerRegistry()
+
+
+def get_prompt(name: str, default=None) -> str:
+    """System prompt by key in agents/prompts.yml; raises KeyError when missing and no default is given."""
+    return prompt_registry.get(name, default)
+
+
+def get_tokenizer(model: str):
+    return tokenizer_registry.get(model)
+
+
+def count_tokens(text: str, model: str = "gpt-4.1") -> int:
+    """Count tokens in a text string with the tokenizer of the given model."""
+    return len(get_tokenizer(model).encode(text))
+
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+
+def warmup_resources(background: bool = True):
+    """
+    Parse the prompts and load the tokenizers ahead of the first turn, by default off the
+    calling thread. Only the first background call per process starts a thread.
+    """
+    global _warmup_thread
+
+    def warmup():
+        try:
+            prompt_registry.all()
+            for model in WARMUP_MODELS:
+                get_tokenizer(model)
+        except Exception as e:
+            print(f"⚠️ Resource warmup failed: {e}")
+
+    if not background:
+        warmup()
+        return None
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warmup, name="resource-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
@@ -1,25 +1,18 @@
 import os
-import yaml
 
 from semantic_kernel import Kernel
 from semantic_kernel.agents import ChatCompletionAgent
 from semantic_kernel.functions.kernel_arguments import KernelArguments
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureChatPromptExecutionSettings
 
+from agents.http_session_pool import create_azure_openai_client
+from agents.resource_registry import get_prompt
+
 # === Azure OpenAI Configuration ===
 deployment = "gpt-4.1-mini"
 subscription_key = os.environ.get("AZURE_OPENAI_KEY")
 endpoint = os.environ.get("AZURE_OPENAI_RESOURCE")
 
-# === Load all prompts from YAML ===
-prompt_filepath = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
-    "agents",
-    "prompts.yml"
-)
-with open(prompt_filepath, "r", encoding="utf-8") as f:
-    prompts = yaml.safe_load(f)
-
 # === General Router Agent Factory ===
 def get_router_agent(kernel: Kernel, agent_name: str) -> ChatCompletionAgent:
     if "router_service" not in kernel.services:
@@ -29,10 +22,11 @@ def get_router_agent(kernel: Kernel, agent_name: str) -> ChatCompletionAgent:
                 deployment_name=deployment,
                 api_key=subscription_key,
                 endpoint=endpoint,
+                async_client=create_azure_openai_client(subscription_key, endpoint),
             )
         )
 
-    system_prompt = prompts.get(f"{agent_name}_prompt", "")
+    system_prompt = get_prompt(f"{agent_name}_prompt", "")
     settings = AzureChatPromptExecutionSettings(
         service_id="router_service",
         temperature=0.1,
@@ -1,54 +1,149 @@
+import os
 import json
+import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 # === File paths for storing agent and file IDs ===
 AGENT_ID_PATH = Path(__file__).resolve().parent / "azure_assistant_agents_config.json"
 FILE_ID_PATH = Path(__file__).resolve().parent / "azure_assistant_file_ids.json"
 
 
+# === Cross-process lock on a sidecar .lock file ===
+@contextmanager
+def file_lock(lock_path: Path):
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# === JSON registry: cached in memory, reloaded on change, atomic locked writes ===
+class JsonRegistry:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._data = {}
+        self._signature = None  # (mtime_ns, size) of the file the cache was read from
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            # A corrupt registry only costs re-created entries; the next write replaces it
+            print(f"⚠️ Ignoring unreadable registry {self.path.name}: {e}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _refresh(self):
+        """Re-read the file only if another writer (thread or process) replaced it."""
+        signature = self._current_signature()
+        if signature != self._signature:
+            self._data = self._read() if signature is not None else {}
+            self._signature = signature
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            self._refresh()
+            return self._data.get(key, default)
+
+    def all(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return dict(self._data)
+
+    def update(self, values: dict = None, remove=(), replace: bool = False):
+        """
+        Apply several changes in one locked read-modify-write: merge values (or replace the
+        whole mapping) and drop the keys in remove. The file is swapped in atomically.
+        """
+        with self._lock, file_lock(self.lock_path):
+            # Start from the latest file contents, not the cache: another process may have written
+            data = {} if replace else self._read()
+            data.update(values or {})
+            for key in remove:
+                data.pop(key, None)
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self._data = data
+            self._signature = self._current_signature()
+
+    def set(self, key: str, value):
+        self.update({key: value})
+
+
+agent_id_registry = JsonRegistry(AGENT_ID_PATH)
+file_id_registry = JsonRegistry(FILE_ID_PATH)
+
+
 # === Save & Load Azure Assistant Agent IDs ===
 def save_agent_id(name: str, agent_id: str):
     """Save or update the ID of an assistant agent by name."""
-    if AGENT_ID_PATH.exists():
-        with open(AGENT_ID_PATH, "r") as f:
-            data = json.load(f)
-    else:
-        data = {}
-
-    data[name] = agent_id
-
-    with open(AGENT_ID_PATH, "w") as f:
-        json.dump(data, f, indent=2)
+    agent_id_registry.set(name, agent_id)
 
 
 def load_agent_id(name: str) -> str | None:
     """Load a saved assistant agent ID by name."""
-    if AGENT_ID_PATH.exists():
-        with open(AGENT_ID_PATH, "r") as f:
-            data = json.load(f)
-        return data.get(name)
-    return None
+    return agent_id_registry.get(name)
 
 
 # === Save & Load File IDs uploaded to Azure Assistants ===
 def save_file_id(filename: str, file_id: str):
     """Save or update the file ID associated with a given filename."""
-    if FILE_ID_PATH.exists():
-        with open(FILE_ID_PATH, "r", encoding="utf-8") as f:
-            file_ids = json.load(f)
-    else:
-        file_ids = {}
-
-    file_ids[filename] = file_id
-
-    with open(FILE_ID_PATH, "w", encoding="utf-8") as f:
-        json.dump(file_ids, f, indent=2)
+    file_id_registry.set(filename, file_id)
 
 
 def load_file_id(filename: str) -> str | None:
     """Load a saved file ID by filename."""
-    if FILE_ID_PATH.exists():
-        with open(FILE_ID_PATH, "r", encoding="utf-8") as f:
-            file_ids = json.load(f)
-        return file_ids.get(filename)
-    return None
+    return file_id_registry.get(filename)
+
+
+def load_file_ids() -> dict:
+    """Load every saved filename -> file ID mapping."""
+    return file_id_registry.all()
+
+
+def save_file_ids(file_ids: dict):
+    """Replace the saved filename -> file ID mapping (e.g. after a file sync)."""
+    file_id_registry.update(file_ids, replace=True)
@@ -0,0 +1,44 @@
+import os
+import asyncio
+import weakref
+
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
+
+from agents.http_session_pool import get_http_session
+
+# === Azure Cognitive Search Configuration ===
+search_endpoint = os.environ.get("COG_SEARCH_ENDPOINT")
+admin_key = os.environ.get("COG_SEARCH_ADMIN_KEY")
+
+# loop -> {index_name: (session, SearchClient)}; async clients are bound to the loop they run on
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_search_client(index_name: str) -> SearchClient:
+    """Return a non-blocking SearchClient for the running loop, sharing the pooled HTTP session."""
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    session = get_http_session()
+
+    entry = clients.get(index_name)
+    if entry is None or entry[0] is not session:
+        # Do not let the transport own the session: every index shares one keep-alive pool
+        transport = AioHttpTransport(session=session, session_owner=False)
+        client = SearchClient(
+            endpoint=search_endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(admin_key),
+            transport=transport,
+        )
+        entry = (session, client)
+        clients[index_name] = entry
+    return entry[1]
+
+
+async def search_documents(index_name: str, **kwargs) -> list:
+    """Run a search on the event loop without blocking it and collect all result documents."""
+    client = get_search_client(index_name)
+    results = await client.search(**kwargs)
+    return [doc async for doc in results]
@@ -1,8 +1,5 @@
 import os
-import json
-import yaml
 import asyncio
-import requests
 from typing import Annotated
 
 from semantic_kernel import Kernel
@@ -11,9 +8,13 @@ from semantic_kernel.functions.kernel_arguments import KernelArguments
 from semantic_kernel.agents.chat_completion.chat_completion_agent import ChatCompletionAgent
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureChatPromptExecutionSettings
 
-from azure.search.documents import SearchClient
 from azure.search.documents.models import VectorizedQuery
-from azure.core.credentials import AzureKeyCredential
+
+from agents.embedding_client import get_embedding_client
+from agents.search_backend import search_documents
+from agents.context_packer import pack_context
+from agents.http_session_pool import create_azure_openai_client
+from agents.resource_registry import get_prompt
 
 
 # === Azure Environment Configuration ===
@@ -27,51 +28,37 @@ embedding_headers = {
     "Authorization": os.environ.get("AZURE_OPENAI_EMBEDDING_MODEL_RESOURCE_KEY")
 }
 
-search_endpoint = os.environ.get("COG_SEARCH_ENDPOINT")
-admin_key = os.environ.get("COG_SEARCH_ADMIN_KEY")
-
 
 # === Azure Cognitive Search Plugin ===
 class SearchTextPlugin:
-    def __init__(self, text_index_name="callcenterinfo"):
-        self.search_client_text = SearchClient(
-            endpoint=search_endpoint,
-            index_name=text_index_name,
-            credential=AzureKeyCredential(admin_key)
-        )
+    def __init__(self, text_index_name="callcenterinfo", token_budget=None):
+        # Async search client is created per event loop by agents.search_backend
+        self.text_index_name = text_index_name
+        self.token_budget = token_budget  # context tokens per search (None: unlimited)
         self.embedding_endpoint = embedding_endpoint
         self.headers = embedding_headers
+        self.embedding_client = get_embedding_client(embedding_endpoint, embedding_headers)
 
     async def get_embedding(self, text: str):
-        """Call Azure OpenAI embedding model to get a vector for the input text."""
-        def sync_post():
-            response = requests.post(
-                url=self.embedding_endpoint,
-                headers=self.headers,
-                json={"input": text}
-            )
-            response.raise_for_status()
-            return response.json()["data"][0]["embedding"]
-        return await asyncio.to_thread(sync_post)
+        """Get a vector for the input text via the shared cached, single-flight embedding client."""
+        return await self.embedding_client.embed(text)
 
-    async def _search(self, query, client, select, top_k=10, filter=None):
-        """Perform vector-based search on the Azure Cognitive Search index."""
+    async def _search(self, query, index_name, select, top_k=10, filter=None):
+        """Perform non-blocking vector-based search on the Azure Cognitive Search index."""
         vector = await self.get_embedding(query)
         vector_query = VectorizedQuery(vector=vector, k_nearest_neighbors=top_k, fields="contentVector")
-        results = client.search(
+        results = await search_documents(
+            index_name,
             search_text=query,
             vector_queries=[vector_query],
             select=select,
             top=top_k,
             filter=filter,
         )
-        return json.dumps([
-            {
-                "id": doc.get("id", ""),
-                "content": doc.get("content", "")
-            }
-            for doc in results
-        ], ensure_ascii=False, indent=2)
+        # Compact, deduplicated JSON within the token budget (tokenized off the loop)
+        return await asyncio.to_thread(
+            pack_context, results, {"id": "id", "content": "content"}, self.token_budget
+        )
 
     @kernel_function(description="Search document text content")
     async def search_text_content(
@@ -81,16 +68,7 @@ class SearchTextPlugin:
         top_k=10
     ) -> Annotated[str, "Search results"]:
         """Semantic kernel function wrapper to perform content search."""
-        return await self._search(query, self.search_client_text, select=["content", "id"], filter=filter, top_k=top_k)
-
-
-# === Load RAG Prompt from YAML ===
-prompt_filepath = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
-    'agents', 'prompts.yml'
-)
-with open(prompt_filepath, "r", encoding="utf-8") as f:
-    prompts = yaml.safe_load(f)
+        return await self._search(query, self.text_index_name, select=["content", "id"], filter=filter, top_k=top_k)
 
 
 # === Chat Agent Constructor ===
@@ -103,6 +81,7 @@ def get_txt_rag_agent(kernel: Kernel, agent_name: str) -> ChatCompletionAgent:
                 deployment_name=deployment,
                 api_key=subscription_key,
                 endpoint=endpoint,
+                async_client=create_azure_openai_client(subscription_key, endpoint),
             )
         )
 
@@ -116,7 +95,7 @@ def get_txt_rag_agent(kernel: Kernel, agent_name: str) -> ChatCompletionAgent:
     )
 
     # Load agent-specific prompt
-    system_prompt = prompts.get(agent_name + "_prompt", "")
+    system_prompt = get_prompt(agent_name + "_prompt", "")
 
     # Return RAG-enabled agent
     return ChatCompletionAgent(
@@ -128,5 +107,5 @@ def get_txt_rag_agent(kernel: Kernel, agent_name: str) -> ChatCompletionAgent:
 
 
 # === Search Plugin Constructor ===
-def get_txt_search_plugin(text_index_name="callcenterinfo") -> SearchTextPlugin:
-    return SearchTextPlugin(text_index_name=text_index_name)
+def get_txt_search_plugin(text_index_name="callcenterinfo", token_budget=None) -> SearchTextPlugin:
+    return SearchTextPlugin(text_index_name=text_index_name, token_budget=token_budget)
@@ -0,0 +1,580 @@
+"""
+Local stand-ins for the Azure services the pipeline calls, for benchmarking without network
+access: Azure OpenAI chat completions (JSON and streamed, with usage and tool calls),
+embeddings and the subset of the Assistants API the fund fact assistant uses, and Azure AI
+Search document search over a synthetic, deterministic corpus.
+
+Every endpoint sleeps for a sampled latency (lognormal, given as [median, p95] seconds),
+streams completions at a configured token rate and fails a configured share of requests,
+so the numbers behave like the real services without their variance in what is returned.
+
+    fake = FakeAzure(load_profile("my_profile.json"), intents={"query": "NEWS"})
+    base_url = fake.start()   # http://127.0.0.1:<port>, served from a background thread
+    ...
+    fake.stop()
+
+Chat responses are chosen by the system prompt of the request (matched against
+agents/prompts.yml): the main router answers the intent registered for the query, the news
+router a score dict, the keyword extractor the query's words, every other agent filler text.
+"""
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import itertools
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import yaml
+from aiohttp import web
+
+PROMPTS_PATH = Path(__file__).resolve().parent.parent / "agents" / "prompts.yml"
+
+# Latencies are [median, p95] seconds (a single number is constant); token counts likewise
+DEFAULT_PROFILE = {
+    "chat": {
+        # Per deployment, merged over "default"
+        "default": {"ttft": [0.45, 1.2], "tokens_per_second": 70, "completion_tokens": [180, 400], "failure_rate": 0.0},
+        "gpt-4.1-nano": {"ttft": [0.25, 0.6], "tokens_per_second": 150},
+        "gpt-4o-mini": {"ttft": [0.35, 0.9], "tokens_per_second": 90},
+    },
+    "embeddings": {"latency": [0.08, 0.25], "dimensions": 1536, "failure_rate": 0.0},
+    "search": {"latency": [0.12, 0.4], "documents": 200, "words": 120, "duplicate_rate": 0.1, "failure_rate": 0.0},
+    "assistants": {"latency": [0.15, 0.4], "run": [4.0, 10.0], "completion_tokens": [200, 400], "failure_rate": 0.0},
+    # Agents whose first completion calls one of the offered tools (the others answer directly)
+    "tool_agents": ["fundfact_query_agent"],
+    # Status of injected failures (429 and 5xx are retried by the OpenAI and Azure SDKs)
+    "failure_status": 503,
+}
+
+NEWS_ROUTES = ("MONTHLYSTANDPOINT", "KTM", "KCMA")
+
+# Phrase from Semantic Kernel's default summarization instructions (conversation memory summaries)
+SUMMARY_MARKER = "summarization of the entire dialog"
+
+VOCABULARY = (
+    "inflation rates policy growth equity bond yield fund market outlook earnings dividend sector "
+    "portfolio risk return volatility currency baht dollar asset allocation credit spread liquidity "
+    "quarter year forecast central bank tariff demand supply energy technology healthcare emerging "
+    "developed valuation momentum duration hedge exposure benchmark performance"
+).split()
+
+
+def merge_profile(base: dict, override: dict) -> dict:
+    """Recursive dict merge; override wins."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_profile(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_profile(path: str = None, failure_rate: float = None) -> dict:
+    """DEFAULT_PROFILE, overridden by the JSON file at path; failure_rate overrides every service."""
+    profile = DEFAULT_PROFILE
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            profile = merge_profile(profile, json.load(f))
+    if failure_rate is not None:
+        profile = merge_profile(profile, {
+            "chat": {"default": {"failure_rate": failure_rate}},
+            **{service: {"failure_rate": failure_rate} for service in ("embeddings", "search", "assistants")},
+        })
+    return profile
+
+
+def sample(spec, rng: random.Random) -> float:
+    """Draw from a lognormal given as [median, p95], or return a constant."""
+    if not isinstance(spec, (list, tuple)):
+        return float(spec)
+    median, p95 = spec
+    if median <= 0 or p95 <= median:
+        return float(median)
+    sigma = math.log(p95 / median) / 1.645
+    return median * math.exp(sigma * rng.gauss(0.0, 1.0))
+
+
+def _filler(count: int, rng: random.Random) -> list:
+    return [rng.choice(VOCABULARY) for _ in range(max(1, count))]
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _unit_vector(seed_text: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(seed_text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+# === Process-wide counters of what the fakes served ===
+class FakeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = defaultdict(int)  # endpoint (chat per agent) -> requests
+        self.failures = defaultdict(int)
+        self.seconds = defaultdict(float)  # time spent serving, injected latency included
+        self.prompt_tokens = defaultdict(int)
+        self.completion_tokens = defaultdict(int)
+
+    def record(self, name: str, seconds: float, failed: bool = False, prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self._lock:
+            self.calls[name] += 1
+            self.failures[name] += failed
+            self.seconds[name] += seconds
+            self.prompt_tokens[name] += prompt_tokens
+            self.completion_tokens[name] += completion_tokens
+
+    def add_tokens(self, name: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self._lock:
+            self.prompt_tokens[name] += prompt_tokens
+            self.completion_tokens[name] += completion_tokens
+
+    def calls_by_service(self) -> dict:
+        """{"chat" | "embeddings" | "search" | "assistants": requests}"""
+        with self._lock:
+            totals = defaultdict(int)
+            for name, calls in self.calls.items():
+                totals[name.split(":")[0]] += calls
+            return dict(totals)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "failures": self.failures[name],
+                    "mean_seconds": round(self.seconds[name] / calls, 4),
+                    "prompt_tokens": self.prompt_tokens[name],
+                    "completion_tokens": self.completion_tokens[name],
+                }
+                for name, calls in sorted(self.calls.items())
+            }
+
+
+# === The fake services ===
+class FakeAzure:
+    def __init__(self, profile: dict = None, intents: dict = None, latency_scale: float = 1.0, seed: int = 0,
+                 language: str = "THAI"):
+        """
+        intents maps a user query to the intent the fake main router answers (BYPASS otherwise).
+        latency_scale multiplies every injected delay (e.g. 0.1 for a quick smoke run).
+        """
+        self.profile = profile or DEFAULT_PROFILE
+        self.intents = {self._normalize(query): intent for query, intent in (intents or {}).items()}
+        self.latency_scale = latency_scale
+        self.language = language
+        self.rng = random.Random(seed)
+        self.stats = FakeStats()
+
+        with open(PROMPTS_PATH, "r", encoding="utf-8") as f:
+            prompts = yaml.safe_load(f) or {}
+        self._prompts = {str(text).strip(): name.removesuffix("_prompt") for name, text in prompts.items()}
+
+        self._corpora = {}  # index name -> (docs, vectors)
+        self._assistant_runs = {}  # run id -> run state
+        self._assistant_messages = {}  # message id -> message object
+        self._ids = itertools.count(1)
+
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    # === Lifecycle: served from a background thread with its own loop ===
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL."""
+        started = threading.Event()
+        sites = []
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            app = web.Application(client_max_size=64 * 1024 * 1024)
+            app.router.add_route("*", "/{tail:.*}", self._dispatch)
+            self._runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, host, port)
+            self._loop.run_until_complete(site.start())
+            sites.append(site)
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name="fake-azure", daemon=True)
+        self._thread.start()
+        started.wait()
+        bound_port = sites[0]._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}"
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    # === Helpers ===
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text or "").strip().lower()
+
+    async def _sleep(self, seconds: float):
+        if seconds > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+
+    def _fails(self, config: dict) -> bool:
+        return self.rng.random() < config.get("failure_rate", 0.0)
+
+    def _failure(self) -> web.Response:
+        return web.json_response(
+            {"error": {"code": "ServiceUnavailable", "message": "Injected failure (benchmarks/fake_azure.py)"}},
+            status=self.profile.get("failure_status", 503),
+        )
+
+    def _next_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids):06d}"
+
+    async def _dispatch(self, request: web.Request) -> web.StreamResponse:
+        path = request.path
+        match = re.fullmatch(r"/openai/deployments/([^/]+)/chat/completions", path)
+        if match:
+            return await self._chat(request, match.group(1))
+        match = re.fullmatch(r"/openai/deployments/([^/]+)/embeddings", path)
+        if match:
+            return await self._embeddings(request)
+        match = re.fullmatch(r"/indexes\('([^']+)'\)/docs/search\.post\.search", path)
+        if match:
+            return await self._search(request, match.group(1))
+        if path.startswith("/openai/assistants") or path.startswith("/openai/threads"):
+            return await self._assistants(request, path)
+        return web.json_response({"error": {"code": "NotFound", "message": f"No fake for {request.method} {path}"}}, status=404)
+
+    # === Chat completions ===
+    def _agent_of(self, messages: list) -> str:
+        """Agent name of the prompts.yml entry the system prompt is (or, if edited, shares most of its opening with)."""
+        for message in messages:
+            if message.get("role") in ("system", "developer"):
+                text = str(message.get("content") or "").strip()
+                if text in self._prompts:
+                    return self._prompts[text]
+                if SUMMARY_MARKER in text:
+                    return "conversation_summary"
+                prefix, name = max((len(os.path.commonprefix([text, prompt])), name) for prompt, name in self._prompts.items())
+                return name if prefix >= 40 else "other"
+        return "other"
+
+    def _answer(self, agent: str, user_text: str, config: dict) -> str:
+        if agent == "main_router_agent":
+            intent = self.intents.get(self._normalize(user_text), "BYPASS")
+            return f"INTENT: {intent}\nLANGUAGE: {self.language}"
+        if agent == "news_router_agent":
+            scores = {route: self.rng.randint(0, 10) for route in NEWS_ROUTES}
+            scores["MONTHLYSTANDPOINT"] = max(scores["MONTHLYSTANDPOINT"], 7)
+            return json.dumps(scores)
+        if agent == "keyword_extractor_agent":
+            query = user_text.split(":", 1)[-1]
+            return " ".join(re.findall(r"\w+", query.lower())[:8]) or "market"
+        return " ".join(_filler(int(sample(config["completion_tokens"], self.rng)), self.rng))
+
+    @staticmethod
+    def _tool_call(tools: list, user_text: str):
+        """A call of the first tool taking only strings, filled from the query."""
+        for tool in tools:
+            function = tool["function"]
+            parameters = function.get("parameters") or {}
+            properties = parameters.get("properties") or {}
+            required = parameters.get("required") or list(properties)
+            if all(properties.get(name, {}).get("type") == "string" for name in required):
+                codes = re.findall(r"\b[A-Z][A-Z0-9]*(?:-[A-Z0-9]+)+\b", user_text) or re.findall(r"\w+", user_text) or ["K"]
+                return {"name": function["name"], "arguments": json.dumps({name: codes[0] for name in required})}
+        return None
+
+    async def _chat(self, request: web.Request, deployment: str) -> web.StreamResponse:
+        started = time.perf_counter()
+        body = await request.json()
+        config = merge_profile(self.profile["chat"]["default"], self.profile["chat"].get(deployment, {}))
+        messages = body.get("messages") or []
+        agent = self._agent_of(messages)
+        name = f"chat:{agent}"
+        prompt_tokens = sum(_approx_tokens(json.dumps(message.get("content"), ensure_ascii=False)) for message in messages)
+        if body.get("tools"):
+            prompt_tokens += _approx_tokens(json.dumps(body["tools"]))
+
+        await self._sleep(sample(config["ttft"], self.rng))
+        if self._fails(config):
+            self.stats.record(name, time.perf_counter() - started, failed=True)
+            return self._failure()
+
+        user_text = next((str(m.get("content") or "") for m in reversed(messages) if m.get("role") == "user"), "")
+        tool_call = None
+        if agent in self.profile["tool_agents"] and body.get("tools") and not any(m.get("role") == "tool" for m in messages):
+            tool_call = self._tool_call(body["tools"], user_text)
+
+        if tool_call is not None:
+            words = []
+            completion_tokens = _approx_tokens(tool_call["arguments"]) + 5
+        else:
+            words = self._answer(agent, user_text, config).split(" ")
+            completion_tokens = len(words)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        completion_id = self._next_id("chatcmpl")
+        token_seconds = 1.0 / config["tokens_per_second"]
+
+        if not body.get("stream"):
+            await self._sleep(completion_tokens * token_seconds)
+            if tool_call is not None:
+                message = {"role": "assistant", "content": None, "tool_calls": [
+                    {"id": self._next_id("call"), "type": "function", "function": tool_call},
+                ]}
+                finish_reason = "tool_calls"
+            else:
+                message = {"role": "assistant", "content": " ".join(words)}
+                finish_reason = "stop"
+            self.stats.record(name, time.perf_counter() - started, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": deployment,
+                "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        try:
+            await self._stream(response, deployment, completion_id, body, usage, words, tool_call, token_seconds)
+        except ConnectionResetError:
+            # The client stopped reading (e.g. a draft cancelled at the orchestration deadline)
+            self.stats.record(name, time.perf_counter() - started, prompt_tokens=prompt_tokens)
+            return response
+        self.stats.record(name, time.perf_counter() - started, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return response
+
+    async def _stream(self, response, deployment, completion_id, body, usage, words, tool_call, token_seconds):
+        def chunk(choices, **extra):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": deployment, "choices": choices, **extra}
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        if tool_call is not None:
+            await self._sleep(usage["completion_tokens"] * token_seconds)
+            await response.write(chunk([{"index": 0, "delta": {"role": "assistant", "tool_calls": [
+                {"index": 0, "id": self._next_id("call"), "type": "function", "function": tool_call},
+            ]}, "finish_reason": None}]))
+            finish_reason = "tool_calls"
+        else:
+            for i, word in enumerate(words):
+                if i:
+                    await self._sleep(token_seconds)
+                text = word if i == 0 else " " + word
+                delta = {"role": "assistant", "content": text} if i == 0 else {"content": text}
+                await response.write(chunk([{"index": 0, "delta": delta, "finish_reason": None}]))
+            finish_reason = "stop"
+        await response.write(chunk([{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await response.write(chunk([], usage=usage))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+
+    # === Embeddings ===
+    async def _embeddings(self, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        body = await request.json()
+        config = self.profile["embeddings"]
+        await self._sleep(sample(config["latency"], self.rng))
+        if self._fails(config):
+            self.stats.record("embeddings", time.perf_counter() - started, failed=True)
+            return self._failure()
+
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = [
+            {"object": "embedding", "index": i, "embedding": _unit_vector(str(text), config["dimensions"]).tolist()}
+            for i, text in enumerate(inputs)
+        ]
+        tokens = sum(_approx_tokens(str(text)) for text in inputs)
+        self.stats.record("embeddings", time.perf_counter() - started, prompt_tokens=tokens)
+        return web.json_response({
+            "object": "list", "data": data, "model": "text-embedding-3-large",
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    # === Azure AI Search ===
+    def _corpus(self, index_name: str, dimensions: int):
+        """Deterministic documents of one index; some are near-copies of the one before."""
+        corpus = self._corpora.get(index_name)
+        if corpus is not None:
+            return corpus
+
+        config = self.profile["search"]
+        rng = random.Random(index_name)
+        is_pdf = index_name.startswith("pdf-")
+        docs, vectors = [], []
+        for i in range(config["documents"]):
+            prefix = ("monthlystandpoint", "ktm", "kcma")[i % 3]
+            if docs and rng.random() < config["duplicate_rate"]:
+                content = docs[-1]["content"]
+                vector = vectors[-1] + _unit_vector(f"{index_name}:{i}", dimensions) * 0.01
+            else:
+                content = " ".join(_filler(config["words"], rng))
+                vector = _unit_vector(f"{index_name}:{i}", dimensions)
+            doc = {"id": f"{index_name}-{i}", "content": content}
+            if is_pdf:
+                doc.update({"key_prefix": prefix, "doc_name": f"{prefix}_report.pdf", "page": i // 3 + 1})
+                if index_name.endswith("-tables"):
+                    doc["table"] = f"Table {i}"
+                elif index_name.endswith("-images"):
+                    doc["figure"] = f"Figure {i}"
+            docs.append(doc)
+            vectors.append(vector / np.linalg.norm(vector))
+
+        corpus = self._corpora[index_name] = (docs, np.stack(vectors))
+        return corpus
+
+    async def _search(self, request: web.Request, index_name: str) -> web.Response:
+        started = time.perf_counter()
+        body = await request.json()
+        config = self.profile["search"]
+        name = f"search:{index_name}"
+        await self._sleep(sample(config["latency"], self.rng))
+        if self._fails(config):
+            self.stats.record(name, time.perf_counter() - started, failed=True)
+            return self._failure()
+
+        vector_queries = body.get("vectorQueries") or []
+        query_vector = np.asarray(vector_queries[0]["vector"], dtype=np.float32) if vector_queries else None
+        dimensions = len(query_vector) if query_vector is not None else self.profile["embeddings"]["dimensions"]
+        docs, vectors = self._corpus(index_name, dimensions)
+
+        if query_vector is not None:
+            scores = vectors @ (query_vector / (np.linalg.norm(query_vector) or 1.0))
+        else:
+            scores = np.zeros(len(docs), dtype=np.float32)
+        prefixes = set(re.findall(r"key_prefix eq '([^']+)'", body.get("filter") or ""))
+        if prefixes:
+            scores = np.where([doc.get("key_prefix") in prefixes for doc in docs], scores, -np.inf)
+
+        top = body.get("top") or 50
+        select = [field.strip() for field in (body.get("select") or "").split(",") if field.strip()]
+        hits = []
+        for i in np.argsort(-scores)[:top]:
+            if not np.isfinite(scores[i]):
+                break
+            doc = dict(docs[i], contentVector=vectors[i].tolist())
+            hit = {field: doc.get(field) for field in select} if select else doc
+            hit["@search.score"] = float((scores[i] + 1.0) / 2.0)
+            hits.append(hit)
+
+        self.stats.record(name, time.perf_counter() - started)
+        return web.json_response({"value": hits})
+
+    # === Assistants (the calls AzureAssistantAgent.invoke makes) ===
+    def _message(self, thread_id: str, role: str, text: str, run_id: str = None, assistant_id: str = None) -> dict:
+        message = {
+            "id": self._next_id("msg"), "object": "thread.message", "created_at": int(time.time()),
+            "thread_id": thread_id, "role": role, "status": "completed", "assistant_id": assistant_id,
+            "run_id": run_id, "attachments": [], "metadata": {},
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        }
+        self._assistant_messages[message["id"]] = message
+        return message
+
+    def _run(self, run_id: str) -> dict:
+        state = self._assistant_runs[run_id]
+        completed = time.perf_counter() >= state["ready_at"]
+        return {
+            "id": run_id, "object": "thread.run", "created_at": state["created_at"],
+            "assistant_id": state["assistant_id"], "thread_id": state["thread_id"],
+            "status": "completed" if completed else "in_progress", "model": state["model"],
+            "instructions": "", "tools": [], "metadata": {}, "parallel_tool_calls": True,
+            "last_error": None, "incomplete_details": None, "required_action": None,
+            "completed_at": int(time.time()) if completed else None,
+            "usage": state["usage"] if completed else None,
+        }
+
+    async def _assistants(self, request: web.Request, path: str) -> web.Response:
+        started = time.perf_counter()
+        body = await request.json() if request.can_read_body else {}
+        config = self.profile["assistants"]
+        parts = path.strip("/").split("/")[1:]  # drop "openai"
+        name = "assistants:" + "/".join(part if i % 2 == 0 else "{id}" for i, part in enumerate(parts))
+
+        await self._sleep(sample(config["latency"], self.rng))
+        if self._fails(config):
+            self.stats.record(name, time.perf_counter() - started, failed=True)
+            return self._failure()
+        self.stats.record(name, time.perf_counter() - started)
+
+        now = int(time.time())
+        if parts == ["assistants"]:
+            return web.json_response({
+                "id": self._next_id("asst"), "object": "assistant", "created_at": now, "name": body.get("name"),
+                "model": body.get("model"), "instructions": body.get("instructions"), "description": None,
+                "tools": body.get("tools") or [], "tool_resources": body.get("tool_resources"), "metadata": {},
+            })
+        if parts[0] == "assistants":
+            return web.json_response({
+                "id": parts[1], "object": "assistant", "created_at": now, "name": None, "model": "gpt-4.1-mini",
+                "instructions": "", "tools": [], "metadata": {},
+            })
+        if parts == ["threads"]:
+            return web.json_response({"id": self._next_id("thread"), "object": "thread", "created_at": now, "metadata": {}})
+
+        thread_id = parts[1]
+        if len(parts) == 2:
+            if request.method == "DELETE":
+                return web.json_response({"id": thread_id, "object": "thread.deleted", "deleted": True})
+            return web.json_response({"id": thread_id, "object": "thread", "created_at": now, "metadata": {}})
+        if parts[2] == "messages" and len(parts) == 3:
+            content = body.get("content")
+            text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+            return web.json_response(self._message(thread_id, body.get("role", "user"), text))
+        if parts[2] == "messages":
+            return web.json_response(self._assistant_messages[parts[3]])
+        if parts[2] == "runs" and len(parts) == 3:
+            run_id = self._next_id("run")
+            completion_tokens = int(sample(config["completion_tokens"], self.rng))
+            answer = self._message(thread_id, "assistant", " ".join(_filler(completion_tokens, self.rng)),
+                                   run_id=run_id, assistant_id=body.get("assistant_id"))
+            prompt_tokens = _approx_tokens(str(body.get("instructions") or "")) + 500  # + uploaded file previews
+            self._assistant_runs[run_id] = {
+                "created_at": now, "assistant_id": body.get("assistant_id"), "thread_id": thread_id,
+                "model": body.get("model") or "gpt-4.1-mini", "message_id": answer["id"],
+                "ready_at": time.perf_counter() + sample(config["run"], self.rng) * self.latency_scale,
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }
+            self.stats.add_tokens(name, prompt_tokens, completion_tokens)
+            return web.json_response(self._run(run_id))
+        if parts[2] == "runs" and len(parts) == 4:
+            return web.json_response(self._run(parts[3]))
+        if parts[2] == "runs" and parts[4] == "steps":
+            run = self._run(parts[3])
+            state = self._assistant_runs[parts[3]]
+            steps = []
+            if run["status"] == "completed":
+                steps.append({
+                    "id": self._next_id("step"), "object": "thread.run.step", "created_at": state["created_at"],
+                    "completed_at": run["completed_at"], "run_id": parts[3], "thread_id": thread_id,
+                    "assistant_id": state["assistant_id"], "status": "completed", "type": "message_creation",
+                    "step_details": {"type": "message_creation", "message_creation": {"message_id": state["message_id"]}},
+                    "usage": state["usage"], "last_error": None, "metadata": {},
+                })
+            return web.json_response({"object": "list", "data": steps, "has_more": False,
+                                      "first_id": steps[0]["id"] if steps else None,
+                                      "last_id": steps[-1]["id"] if steps else None})
+        return web.json_response({"error": {"code": "NotFound", "message": f"No fake for {request.method} {path}"}}, status=404)
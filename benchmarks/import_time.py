@@ -0,0 +1,87 @@
+"""
+Import-time benchmark for tracking Streamlit cold start.
+
+Each module is imported in a fresh interpreter (so nothing is cached in sys.modules),
+several times, and the median wall time is reported together with the time to the
+first prompt lookup and the first tokenizer load, which are now deferred.
+
+    python benchmarks/import_time.py [--runs 5] [--json] [module ...]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    "agents.resource_registry",
+    "agents.agent_pool",
+    "promptflow_logics.news_agents_logic",
+    "promptflow_logics.callcenter_agents_logic",
+    "promptflow_logics.fundfact_agents_logic",
+    "main_agents_logic",
+]
+
+# Runs in the child interpreter; prints one JSON line of timings in seconds
+PROBE = """
+import json, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from agents.resource_registry import get_prompt, get_tokenizer
+get_prompt("reply_agent_prompt", "")
+prompt = time.perf_counter()
+get_tokenizer("gpt-4.1")
+tokenizer = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "first_prompt": prompt - imported,
+    "first_tokenizer": tokenizer - prompt,
+}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    return {
+        "module": module,
+        **{key: round(statistics.median(s[key] for s in samples), 4) for key in samples[0]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Median import time of the app modules in fresh interpreters")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = [measure(module, args.runs) for module in args.modules]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'module':45} {'import s':>10} {'1st prompt s':>13} {'1st tokenizer s':>16}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['module']:45} failed: {r['error']}")
+        else:
+            print(f"{r['module']:45} {r['import']:>10.3f} {r['first_prompt']:>13.4f} {r['first_tokenizer']:>16.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+End-to-end latency benchmark of get_agent_response, run against the local stand-ins for
+Azure OpenAI and Azure AI Search in benchmarks/fake_azure.py, so it needs no Azure endpoints
+and no network access.
+
+Every query of the queries file (JSON lines with "query" and "intent") is answered through
+the whole pipeline, one chat session per run: as in main.py, the session's queries run on one
+long-lived event loop and each sees the conversation of the queries before it. Per intent the report
+gives p50/p95/p99 of the end-to-end latency, the time to first token and every DAG stage,
+with the mean tokens, LLM calls and service calls per request.
+
+    python benchmarks/pipeline_latency.py [--runs 3] [--concurrency 1] [--queries FILE]
+        [--profile FILE] [--latency-scale 1.0] [--failure-rate RATE] [--seed 0] [--warmup 0]
+        [--fundfact-engine local|assistant] [--answer-cache] [--local-router] [--verbose] [--json]
+
+--profile is a JSON file overriding fake_azure.DEFAULT_PROFILE (latencies, token rates,
+failure rates). The tiktoken encodings are downloaded on first use, so offline they must
+already be cached: in TIKTOKEN_CACHE_DIR, in --tiktoken-cache DIR, or in the vendored
+benchmarks/tiktoken_cache directory, which is used when it exists. To fill it once online:
+
+    TIKTOKEN_CACHE_DIR=benchmarks/tiktoken_cache python -c "import tiktoken; tiktoken.get_encoding('o200k_base')"
+
+A preflight loads every encoding before the benchmark starts and exits with a message if one is missing.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from fake_azure import FakeAzure, load_profile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_QUERIES = os.path.join(REPO_ROOT, "benchmarks", "queries.jsonl")
+VENDORED_TIKTOKEN_CACHE = os.path.join(REPO_ROOT, "benchmarks", "tiktoken_cache")
+PERCENTILES = (50, 95, 99)
+INTENT_ORDER = ("NEWS", "CALLCENTER", "FUNDFACT", "BYPASS")
+
+# Placeholder for the SDKs' https check; the OpenAI clients are pointed at the fake after the build
+OPENAI_ENDPOINT = "https://benchmark.openai.azure.com"
+
+
+def load_queries(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def preflight_tokenizers(cache_dir: str = None):
+    """Load every tiktoken encoding the app uses; exit with a clear message when one is not available."""
+    if cache_dir:
+        os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+    elif "TIKTOKEN_CACHE_DIR" not in os.environ and os.path.isdir(VENDORED_TIKTOKEN_CACHE):
+        os.environ["TIKTOKEN_CACHE_DIR"] = VENDORED_TIKTOKEN_CACHE
+
+    from agents.resource_registry import MODEL_ENCODINGS, get_tokenizer
+    for model in MODEL_ENCODINGS:
+        try:
+            get_tokenizer(model)
+        except Exception as e:
+            cache = os.environ.get("TIKTOKEN_CACHE_DIR", "tiktoken's default cache directory")
+            sys.exit(
+                f"Cannot load the tiktoken encoding for {model} ({MODEL_ENCODINGS[model]}) from {cache}: "
+                f"{type(e).__name__}: {e}\n"
+                "The benchmark runs offline, so the encodings must be cached beforehand. With network access, run\n"
+                "    TIKTOKEN_CACHE_DIR=benchmarks/tiktoken_cache python -c \"import tiktoken; tiktoken.get_encoding('o200k_base')\"\n"
+                "or pass --tiktoken-cache DIR pointing at a directory that already holds them."
+            )
+
+
+def quiet_streamlit():
+    """
+    Bare-mode Streamlit warns about the missing ScriptRunContext on every placeholder. Its loggers
+    are reset to the configured level when the config is first parsed, so parse it before muting.
+    """
+    from streamlit import config
+    config.get_option("logger.level")
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+
+def configure_environment(base_url: str, cache_dir: str, answer_cache: bool, local_router: bool):
+    """Point the app's configuration at the fakes; must run before the app modules are imported."""
+    os.environ.update({
+        "AZURE_OPENAI_RESOURCE": OPENAI_ENDPOINT,
+        "AZURE_OPENAI_KEY": "benchmark",
+        "AZURE_OPENAI_EMBEDDING_MODEL_RESOURCE":
+            f"{base_url}/openai/deployments/text-embedding-3-large/embeddings?api-version=2023-05-15",
+        "AZURE_OPENAI_EMBEDDING_MODEL_RESOURCE_KEY": "benchmark",
+        "COG_SEARCH_ENDPOINT": base_url,
+        "COG_SEARCH_ADMIN_KEY": "benchmark",
+        # The assistant, if benchmarked, is swapped in after the build (no uploads or registry writes)
+        "FUNDFACT_QUERY_ENGINE": "local",
+        # Caches and logs start empty and stay out of the repo's .cache
+        "EMBEDDING_CACHE_PATH": os.path.join(cache_dir, "embeddings.sqlite3"),
+        "ROUTER_LOG_PATH": os.path.join(cache_dir, "router_decisions.jsonl"),
+        "FUND_PROFILES_PATH": os.path.join(cache_dir, "fund_profiles.json"),
+    })
+    if not answer_cache:
+        # Repeated runs ask the same questions; a threshold above any cosine similarity keeps
+        # the lookup (and its embedding) but never serves a stored answer
+        os.environ["ANSWER_CACHE_THRESHOLD"] = "2"
+    if not local_router:
+        # The classifier keeps its keyword rules but does not learn from this benchmark's
+        # routing decisions, so later runs route like the first
+        os.environ["LOCAL_ROUTER_MIN_TRAINING"] = str(10 ** 9)
+
+
+def point_clients_at(agents: dict, base_url: str):
+    """Send every Azure OpenAI client of the agents (kernel services and assistants) to the fake."""
+    openai_base = f"{base_url}/openai/"
+    for agent in agents.values():
+        kernel = getattr(agent, "kernel", None)
+        clients = [getattr(service, "client", None) for service in (kernel.services.values() if kernel else [])]
+        clients.append(getattr(agent, "client", None))
+        for client in clients:
+            if client is not None and hasattr(client, "base_url"):
+                client.base_url = openai_base
+
+
+async def build_assistant_agent(base_url: str):
+    """A code-interpreter assistant created on the fake, without the CSV upload or the saved id."""
+    from semantic_kernel.agents import AzureAssistantAgent
+    from agents.fundfact_coder_rag_agent import deployment
+    from agents.http_session_pool import get_openai_http_client, close_http_sessions
+    from agents.resource_registry import get_prompt
+
+    client = AzureAssistantAgent.create_client(
+        deployment_name=deployment,
+        api_key="benchmark",
+        endpoint=OPENAI_ENDPOINT,
+        api_version="2024-12-01-preview",
+        http_client=get_openai_http_client(),
+    )
+    client.base_url = f"{base_url}/openai/"
+    try:
+        definition = await client.beta.assistants.create(
+            model=deployment,
+            name="FundFactCSVAgent",
+            instructions=get_prompt("fundfact_coder_rag_agent_prompt"),
+        )
+    finally:
+        await close_http_sessions()
+    return AzureAssistantAgent(client=client, definition=definition)
+
+
+# === One chat session: every query in order on the shared turn loops, as in main.py ===
+def run_session(session: int, queries: list, agents: dict, fake: FakeAzure, count_service_calls: bool) -> list:
+    from semantic_kernel.contents.chat_history import ChatHistory
+    from agents.agent_pool import get_turn_loops
+    from main_agents_logic import get_agent_response
+    from promptflow_logics.stream_sink import StreamSink
+
+    chat_history, thread, user_thread = ChatHistory(), None, None
+    records = []
+    for turn, query in enumerate(queries):
+        stage_timings = {}
+        calls_before = fake.stats.calls_by_service() if count_service_calls else None
+        start = time.perf_counter()
+        sink = StreamSink(None, started_at=start)
+        ledger, error = None, None
+        try:
+            _, chat_history, thread, user_thread, ledger, _ = get_turn_loops().run(get_agent_response(
+                query["query"], chat_history, thread, user_thread, agents, sink, stage_timings,
+            ))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+
+        service_calls = None
+        if count_service_calls:
+            calls_after = fake.stats.calls_by_service()
+            service_calls = {name: calls - calls_before.get(name, 0) for name, calls in calls_after.items()}
+        records.append({
+            "session": session,
+            "turn": turn,
+            "intent": query.get("intent", "UNKNOWN"),
+            "query": query["query"],
+            "seconds": round(seconds, 4),
+            "ttft": round(sink.ttft, 4) if sink.ttft is not None else None,
+            "stages": {name: round(timing["duration"], 4) for name, timing in stage_timings.items()},
+            "tokens": ledger.totals() if ledger is not None else None,
+            "service_calls": service_calls,
+            "error": error,
+        })
+    return records
+
+
+# === Aggregation ===
+def distribution(values: list) -> dict:
+    if not values:
+        return None
+    return {
+        **{f"p{p}": round(float(np.percentile(values, p)), 4) for p in PERCENTILES},
+        "mean": round(float(np.mean(values)), 4),
+    }
+
+
+def mean_of(dicts: list) -> dict:
+    keys = sorted({key for d in dicts for key in d})
+    return {key: round(sum(d.get(key, 0) for d in dicts) / len(dicts), 2) for key in keys} if dicts else {}
+
+
+def summarize(records: list) -> dict:
+    """Per intent (in routing order, then "ALL"): latency distributions and per-request means."""
+    intents = sorted({r["intent"] for r in records}, key=lambda i: (INTENT_ORDER + (i,)).index(i))
+    summary = {}
+    for intent in intents + ["ALL"]:
+        group = [r for r in records if intent in ("ALL", r["intent"])]
+        ok = [r for r in group if r["error"] is None]
+        stage_names = list(dict.fromkeys(name for r in ok for name in r["stages"]))
+        summary[intent] = {
+            "requests": len(group),
+            "errors": len(group) - len(ok),
+            "seconds": distribution([r["seconds"] for r in ok]),
+            "ttft": distribution([r["ttft"] for r in ok if r["ttft"] is not None]),
+            "stages": {name: distribution([r["stages"][name] for r in ok if name in r["stages"]]) for name in stage_names},
+            "tokens": mean_of([r["tokens"] for r in ok]),
+            "service_calls": mean_of([r["service_calls"] for r in ok if r["service_calls"] is not None]),
+        }
+    return summary
+
+
+def print_report(summary: dict, fake: FakeAzure, build_seconds: float):
+    def row(label, dist):
+        if dist is None:
+            return
+        print(f"  {label:26} " + " ".join(f"{dist[key]:>9.3f}" for key in [f"p{p}" for p in PERCENTILES] + ["mean"]))
+
+    print(f"Agents built in {build_seconds:.2f}s")
+    for intent, s in summary.items():
+        print(f"\n== {intent}: {s['requests']} requests, {s['errors']} failed ==")
+        print(f"  {'seconds':26} " + " ".join(f"{key:>9}" for key in [f"p{p}" for p in PERCENTILES] + ["mean"]))
+        row("end-to-end", s["seconds"])
+        row("first token", s["ttft"])
+        for name, dist in s["stages"].items():
+            row(f"stage {name}", dist)
+        tokens = s["tokens"]
+        if tokens:
+            print(f"  tokens/request: prompt {tokens['prompt_tokens']:.0f}, completion {tokens['completion_tokens']:.0f}, "
+                  f"cached {tokens['cached_tokens']:.0f}; LLM calls/request {tokens['calls']:.1f}")
+        if s["service_calls"]:
+            print("  service calls/request: " + ", ".join(f"{name} {calls:.1f}" for name, calls in s["service_calls"].items()))
+
+    print(f"\n== Fake services ==\n  {'endpoint':44} {'calls':>7} {'failed':>7} {'mean s':>8}")
+    for name, stats in fake.stats.as_dict().items():
+        print(f"  {name:44} {stats['calls']:>7} {stats['failures']:>7} {stats['mean_seconds']:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline latency against local fake Azure services")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="JSON lines with query and intent")
+    parser.add_argument("--runs", type=int, default=3, help="sessions, each asking every query in order")
+    parser.add_argument("--concurrency", type=int, default=1, help="sessions running at the same time")
+    parser.add_argument("--warmup", type=int, default=0, help="untimed sessions before the measured ones")
+    parser.add_argument("--profile", help="JSON file overriding the fake services' latencies and failure rates")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every injected delay")
+    parser.add_argument("--failure-rate", type=float, help="share of failed requests, for every service")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fundfact-engine", choices=("local", "assistant"), default="local")
+    parser.add_argument("--answer-cache", action="store_true", help="let repeated questions hit the answer cache")
+    parser.add_argument("--local-router", action="store_true", help="let the local intent classifier learn from the routed queries")
+    parser.add_argument("--tiktoken-cache", help="directory with the cached tiktoken encodings (TIKTOKEN_CACHE_DIR)")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own logging")
+    parser.add_argument("--json", action="store_true", help="print the summary and every request as JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    preflight_tokenizers(args.tiktoken_cache)
+    fake = FakeAzure(
+        load_profile(args.profile, args.failure_rate),
+        intents={q["query"]: q["intent"] for q in queries if "intent" in q},
+        latency_scale=args.latency_scale,
+        seed=args.seed,
+    )
+    base_url = fake.start()
+    cache_dir = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    configure_environment(base_url, cache_dir, args.answer_cache, args.local_router)
+    quiet_streamlit()
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        with quiet:
+            from agents.agent_pool import build_agent_pool, agent_pool_metrics
+            agents = build_agent_pool()
+            if args.fundfact_engine == "assistant":
+                agents["fundfact_coder_rag_agent"] = asyncio.run(build_assistant_agent(base_url))
+            point_clients_at(agents, base_url)
+            build_seconds = agent_pool_metrics.as_dict()["cold_start_seconds"]
+
+            for session in range(args.warmup):
+                run_session(-1 - session, queries, agents, fake, count_service_calls=False)
+            fake.stats.reset()
+
+            # Per-request service calls are only attributable when sessions do not overlap
+            count_service_calls = args.concurrency == 1
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                sessions = pool.map(
+                    lambda session: run_session(session, queries, agents, fake, count_service_calls),
+                    range(args.runs),
+                )
+                records = [record for session in sessions for record in session]
+    finally:
+        fake.stop()
+
+    summary = summarize(records)
+    if args.json:
+        print(json.dumps({
+            "runs": args.runs,
+            "concurrency": args.concurrency,
+            "latency_scale": args.latency_scale,
+            "profile": fake.profile,
+            "build_seconds": build_seconds,
+            "intents": summary,
+            "services": fake.stats.as_dict(),
+            "requests": records,
+        }, indent=2, ensure_ascii=False))
+        return
+    print_report(summary, fake, build_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import streamlit as st
-import asyncio
 import time
 
 # For local dev only, not needed in production deployment
@@ -7,31 +6,34 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from main_agents_logic import get_agent_response
-from semantic_kernel import Kernel
+from promptflow_logics.dag_executor import format_timings
 from semantic_kernel.contents.chat_history import ChatHistory
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.agents import ChatHistoryAgentThread
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# Agents imports
-from agents.reply_agent import get_reply_agent
-from agents.router_agent import get_router_agent
-from agents.mm_rag_agent import get_mm_rag_agent, get_mm_search_plugin
-from agents.txt_rag_agent import get_txt_rag_agent, get_txt_search_plugin
-from agents.orchestrator_agent import get_orchestrator_agent
-from agents.keyword_extractor_agent import get_keyword_extractor_agent
-from agents.fundfact_coder_rag_agent import get_fundfact_coder_rag_agent
+# Agents are built once per process and shared by all sessions
+from agents.agent_pool import get_session_agents, get_turn_loops, agent_pool_metrics
+from agents.resource_registry import warmup_resources
+from promptflow_logics.usage_ledger import UsageTotals, STAGE_LABELS
+from promptflow_logics.stream_sink import StreamSink
+
+# Load the tokenizers in the background while the first page renders
+warmup_resources()
 
 # === Streamlit UI setup ===
 st.set_page_config(page_title="WIN-AI Chatbot", page_icon="💬", layout="wide")
 st.title("💬 WIN-AI Chatbot")
 
-# Initialize session state for chat threads and agents
+# Initialize session state for chat threads and agents (thread: the main conversation's ConversationStore)
 if "thread" not in st.session_state:
     st.session_state.thread = None
 if "user_thread" not in st.session_state:
     st.session_state.user_thread = None
 if "initialized" not in st.session_state:
     st.session_state.initialized = False
+if "usage" not in st.session_state:
+    st.session_state.usage = UsageTotals()
 
 # Welcome message shown once at start
 welcome_message = (
@@ -53,42 +55,23 @@ for key in agent_keys:
     if key not in st.session_state:
         st.session_state[key] = None
 
-# Kernel and agents initialization
-def initialize_kernel():
-    return Kernel()
-
-async def initialize_agents():
-    if "shared_kernel" not in st.session_state:
-        st.session_state.shared_kernel = initialize_kernel()
-
-    kernel = st.session_state.shared_kernel
-
-    agents = {
-        "main_router_agent": get_router_agent(kernel, "main_router_agent"),
-        "news_router_agent": get_router_agent(kernel, "news_router_agent"),
-        "fundfact_linguistic_search": get_txt_search_plugin(text_index_name="mutualfunds"),
-        "callcenter_search": get_txt_search_plugin(text_index_name="callcenterinfo"),
-        "pdf_search": get_mm_search_plugin(
-            text_index_name="pdf-economic-summary",
-            table_index_name="pdf-economic-summary-tables",
-            image_index_name="pdf-economic-summary-images",
-        ),
-        "pdf_rag_agent": get_mm_rag_agent(kernel),
-        "callcenter_rag_agent": get_txt_rag_agent(kernel, "callcenter_rag_agent"),
-        "reply_agent": get_reply_agent(kernel),
-        "keyword_extractor_agent": get_keyword_extractor_agent(kernel),
-        "news_orchestrator_agent": get_orchestrator_agent(kernel, "news_orchestrator"),
-        "fundfact_orchestrator_agent": get_orchestrator_agent(kernel, "fundfact_orchestrator"),
-        "fundfact_linguistic_rag_agent": get_txt_rag_agent(kernel, "fundfact_linguistic_rag_agent"),
-        "fundfact_coder_rag_agent": await get_fundfact_coder_rag_agent(),
-    }
-    st.session_state.agents = agents
+# Agents initialization: only the threads and chat history are per session
+def initialize_agents():
+    st.session_state.agents = get_session_agents()
     st.session_state.thread = None
     st.session_state.initialized = True
+    print(f"🧩 Agent pool: {agent_pool_metrics.as_dict()}")
+
+# Turns run on long-lived loops shared by all sessions, so pooled HTTP connections stay warm between turns
+def run_turn(*args):
+    with get_turn_loops().checkout() as turn_loop:
+        # Streamed tokens are rendered from the loop's thread, which needs this script run's context
+        add_script_run_ctx(turn_loop.thread, get_script_run_ctx())
+        return turn_loop.run(get_agent_response(*args))
 
 # Initialize agents synchronously in Streamlit start
 if not st.session_state.initialized:
-    asyncio.run(initialize_agents())
+    initialize_agents()
 
 # Initialize chat history
 if "chat_history" not in st.session_state:
@@ -112,33 +95,18 @@ if user_query:
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
             start_time = time.time()
-            streamed_output_container = st.empty()
-
-            (
-                response,
-                chat_history,
-                thread,
-                user_thread,
-                rag_prompt,
-                rag_completion,
-                orch_prompt,
-                orch_completion,
-                keyword_prompt,
-                keyword_completion,
-                input_tokens_reply,
-                output_tokens_reply,
-                input_tokens_router,
-                output_tokens_router,
-                has_streamed,
-            ) = asyncio.run(
-                get_agent_response(
-                    user_query,
-                    st.session_state.chat_history,
-                    st.session_state.thread,
-                    st.session_state.user_thread,
-                    st.session_state.agents,
-                    streamed_output_container,
-                )
+            # Streamed tokens are re-rendered in batches; the sink also measures time to first token
+            streamed_output_container = StreamSink(st.empty())
+            stage_timings = {}
+
+            response, chat_history, thread, user_thread, ledger, has_streamed = run_turn(
+                user_query,
+                st.session_state.chat_history,
+                st.session_state.thread,
+                st.session_state.user_thread,
+                st.session_state.agents,
+                streamed_output_container,
+                stage_timings,
             )
 
             end_time = time.time()
@@ -153,16 +121,19 @@ if user_query:
             st.session_state.user_thread = user_thread
             st.session_state.chat_history = chat_history
 
-            st.markdown(f"⏱️ *Response generated in {total_time:.2f} seconds*")
-
-            # Display token usage breakdown if available
-            if input_tokens_router is not None and output_tokens_router is not None:
-                st.markdown(f"📊 *Router tokens: {input_tokens_router} prompt + {output_tokens_router} completion = {input_tokens_router + output_tokens_router} total*")
-            if keyword_prompt is not None and keyword_completion is not None:
-                st.markdown(f"📊 *Keyword Extractor tokens: {keyword_prompt} prompt + {keyword_completion} completion = {keyword_prompt + keyword_completion} total*")
-            if rag_prompt is not None and rag_completion is not None:
-                st.markdown(f"📊 *RAG agents tokens: {rag_prompt} prompt + {rag_completion} completion = {rag_prompt + rag_completion} total*")
-            if orch_prompt is not None and orch_completion is not None:
-                st.markdown(f"📊 *Orchestrator tokens: {orch_prompt} prompt + {orch_completion} completion = {orch_prompt + orch_completion} total*")
-            if input_tokens_reply is not None and output_tokens_reply is not None:
-                st.markdown(f"📊 *Reply agent tokens: {input_tokens_reply} prompt + {output_tokens_reply} completion = {input_tokens_reply + output_tokens_reply} total*")
+            first_token = streamed_output_container.ttft
+            first_token_text = f" (first token after {first_token:.2f}s)" if first_token is not None else ""
+            st.markdown(f"⏱️ *Response generated in {total_time:.2f} seconds{first_token_text}*")
+            if stage_timings:
+                st.markdown(f"⏱️ *Stages: {format_timings(stage_timings)}*")
+
+            # Display token usage per stage (API-reported; "~" marks tiktoken estimates)
+            st.session_state.usage.add(ledger)
+            for stage, usage in ledger.by_stage().items():
+                prompt, completion = usage["prompt_tokens"], usage["completion_tokens"]
+                cached = f" ({usage['cached_tokens']} cached)" if usage["cached_tokens"] else ""
+                approx = "~" if usage["estimated_calls"] else ""
+                st.markdown(f"📊 *{STAGE_LABELS.get(stage, stage)} tokens: {approx}{prompt} prompt{cached} + {approx}{completion} completion = {prompt + completion} total*")
+            session_usage = st.session_state.usage.as_dict()
+            session_totals = session_usage["totals"]
+            st.markdown(f"📊 *Session tokens: {session_totals['prompt_tokens']} prompt + {session_totals['completion_tokens']} completion over {session_usage['requests']} request(s)*")
@@ -5,20 +5,27 @@ from promptflow_logics.news_agents_logic import get_news_agent_response
 from promptflow_logics.callcenter_agents_logic import get_callcenter_agent_response
 from promptflow_logics.fundfact_agents_logic import get_fundfact_agent_response
 from semantic_kernel.contents.utils.author_role import AuthorRole
+from agents.embedding_client import start_embedding_scope
+from agents.intent_classifier import get_intent_classifier
+from agents.fund_code_recognizer import get_fund_code_recognizer
+from promptflow_logics.answer_cache import get_answer_cache, ANSWER_CACHE_LOOKUP_TIMEOUT
+from promptflow_logics.usage_ledger import UsageLedger, merge_usage, process_usage
+from promptflow_logics.stream_sink import as_stream_sink
+from promptflow_logics.conversation_memory import memory_view, turn_start_message
+from promptflow_logics.conversation_store import ConversationStore
+from promptflow_logics.speculative_prefetch import SpeculativeTurn, SPECULATION_MIN_CONFIDENCE, speculative_keywords
 import streamlit as st
 
-# === Tokenizer setup ===
-import tiktoken
 
-tokenizer_4o = tiktoken.encoding_for_model("gpt-4o-mini")
-tokenizer_4_1 = tiktoken.get_encoding("o200k_base")  # gpt-4.1
-
-def count_tokens(text: str, tokenizer) -> int:
-    return len(tokenizer.encode(text))
-
-
-async def get_agent_response(user_query: str, chat_history: ChatHistoryAgentThread, main_thread, user_thread, agents, container):
+async def get_agent_response(user_query: str, chat_history: ChatHistoryAgentThread, main_thread, user_thread, agents, container, stage_timings=None):
     has_streamed = False  # Flag for streaming output
+    stage_timings = stage_timings if stage_timings is not None else {}  # per-stage timings of the sub-flow
+    # Main conversation (reply agent history); sub-flow threads are merged into it incrementally
+    conversation = ConversationStore.wrap(main_thread)
+    container = as_stream_sink(container)  # throttled rendering; the caller may pass its own sink to read the TTFT
+
+    # Identical embedding requests within this turn (e.g. per-route text/table searches) share one call
+    start_embedding_scope()
 
     # Unpack agents and tools
     main_router_agent = agents["main_router_agent"]
@@ -37,74 +44,141 @@ async def get_agent_response(user_query: str, chat_history: ChatHistoryAgentThre
     callcenter_search = agents["callcenter_search"]
     fundfact_linguistic_search = agents["fundfact_linguistic_search"]
 
-    # Initialize token counts to None
-    input_tokens_router = output_tokens_router = None
-    rag_prompt_tokens = rag_completion_tokens = None
-    input_tokens_orchestrator = output_tokens_orchestrator = None
-    keyword_input_tokens = keyword_output_tokens = None
-    input_tokens_reply = output_tokens_reply = None
-
-    # === Run main router ===
-    router_user_message = ChatMessageContent(role=AuthorRole.USER, content=user_query)
-
-    async for route in main_router_agent.invoke(messages=[router_user_message], thread=user_thread):
-        route_str = str(route).strip()
-        user_thread = route.thread
-
-    # Parse intent and language from router output
-    intent = None
-    language = None
-    for line in route_str.splitlines():
-        if line.startswith("INTENT:"):
-            intent = line.split("INTENT:")[1].strip()
-        elif line.startswith("LANGUAGE:"):
-            language = line.split("LANGUAGE:")[1].strip()
-
-    # Defaults if parsing fails
-    intent = intent or "BYPASS"
-    language = language or "THAI"
-
-    # Token counts for router
-    input_tokens_router = count_tokens(user_query, tokenizer_4_1)
-    output_tokens_router = count_tokens(route_str, tokenizer_4_1)
-
-    if intent == "NEWS":
+    # Token usage of every LLM call in this request, per stage
+    ledger = UsageLedger()
+
+    # === Route: local fast-path classifier first, LLM main router only for ambiguous queries ===
+    intent_classifier = get_intent_classifier()
+    speculation = SpeculativeTurn()
+    fund_code_recognizer = get_fund_code_recognizer()
+    keyword_searches = {"NEWS": pdf_search, "CALLCENTER": callcenter_search, "FUNDFACT": fundfact_linguistic_search}
+    intent, language, _ = intent_classifier.classify(user_query)
+    # Answers to follow-ups depend on the conversation; only turns that stand alone are cached
+    standalone_turn = user_thread is None or not user_thread._chat_history.messages
+
+    if intent is not None:
+        route_str = f"INTENT: {intent}\nLANGUAGE: {language}"
+
+        # Keep the router thread as if the LLM router had answered, so later routing
+        # and keyword extraction still see this user message
+        if user_thread is None:
+            user_thread = ChatHistoryAgentThread()
+        user_thread._chat_history.add_message(turn_start_message(user_query))
+        user_thread._chat_history.add_assistant_message(route_str)
+    else:
+        # Speculate while the LLM router decides: the raw-query embedding (answer cache) and,
+        # for a likely retrieval intent, keyword extraction plus the keywords' embedding
+        if speculation.enabled:
+            if standalone_turn:
+                speculation.start("query_embedding", pdf_search.get_embedding(user_query))
+            likely_intent, likely_confidence = intent_classifier.guess(user_query)
+            # FUNDFACT queries naming their funds unambiguously never call the keyword extractor
+            names_funds = likely_intent == "FUNDFACT" and fund_code_recognizer.is_unambiguous(
+                fund_code_recognizer.recognize(user_query)
+            )
+            if likely_intent in keyword_searches and likely_confidence >= SPECULATION_MIN_CONFIDENCE and not names_funds:
+                speculation.start("keywords", speculative_keywords(
+                    keyword_extractor_agent, user_query, user_thread, keyword_searches[likely_intent]
+                ))
+
+        router_user_message = turn_start_message(user_query)  # marks the turn for the memory window
+
+        # The router sees the running summary and recent turns; the full exchange stays on user_thread
+        if user_thread is None:
+            user_thread = ChatHistoryAgentThread()
+        router_usage = None
+        with memory_view(user_thread, main_router_agent) as router_thread:
+            async for route in main_router_agent.invoke(messages=[router_user_message], thread=router_thread):
+                route_str = str(route).strip()
+                router_usage = merge_usage(router_usage, route)
+
+        # Parse intent and language from router output
+        for line in route_str.splitlines():
+            if line.startswith("INTENT:"):
+                intent = line.split("INTENT:")[1].strip()
+            elif line.startswith("LANGUAGE:"):
+                language = line.split("LANGUAGE:")[1].strip()
+
+        # Defaults if parsing fails
+        intent = intent or "BYPASS"
+        language = language or "THAI"
+
+        # LLM decisions are the training data for the local classifier (file I/O, off the loop)
+        await asyncio.to_thread(intent_classifier.log_decision, user_query, intent, language)
+
+        await ledger.record("router", router_usage, user_query, route_str, model="gpt-4.1-mini")
+
+    # === Semantic answer cache (keyed by intent, language, named funds and query embedding) ===
+    # The cache is shared by every session, so a turn that follows earlier ones (which the
+    # router, keyword extractor and reply agent all see) neither reads nor writes it
+    answer_cache = get_answer_cache()
+    cache_entities = fund_code_recognizer.fund_codes(user_query)
+    query_vector_task = None
+    cached_answer = None
+    if standalone_turn and answer_cache.is_cacheable(intent):
+        # The embedding runs beside the flow (it is only needed to store the answer); a lookup
+        # waits for it only when an entry could match, and at most ANSWER_CACHE_LOOKUP_TIMEOUT
+        query_vector_task = speculation.claim("query_embedding") or asyncio.ensure_future(
+            pdf_search.get_embedding(user_query)
+        )
+        if answer_cache.may_hit(intent, language, cache_entities):
+            try:
+                query_vector = await asyncio.wait_for(asyncio.shield(query_vector_task), ANSWER_CACHE_LOOKUP_TIMEOUT)
+                cached_answer = answer_cache.lookup(intent, language, query_vector, cache_entities)
+            except asyncio.TimeoutError:
+                print("⚠️ Answer cache lookup skipped: query embedding not ready")
+            except Exception as e:
+                print(f"⚠️ Answer cache lookup failed: {e}")
+
+    # Hand the speculative keywords to the flow that won; cancel everything else
+    keyword_task = None
+    # FUNDFACT queries naming their funds unambiguously skip keyword extraction; leaving the
+    # speculative call unclaimed cancels it below and counts it as wasted, not useful
+    skips_keywords = intent == "FUNDFACT" and fund_code_recognizer.is_unambiguous(
+        fund_code_recognizer.recognize(user_query)
+    )
+    if cached_answer is None and intent in keyword_searches and not skips_keywords:
+        keyword_task = speculation.claim("keywords")
+    await speculation.cancel_unclaimed()
+
+    if cached_answer is not None:
+        # Serve the stored answer immediately, skipping the RAG/orchestrator chain
+        final_response = cached_answer
+        container.markdown(final_response)
+        has_streamed = True
+
+        conversation.add_user_message(user_query)
+        conversation.add_assistant_message(final_response)
+
+    elif intent == "NEWS":
         # Streamlit UI placeholders for feedback
         routing_status = st.empty()
         keyword_status = st.empty()
         rag_status = st.empty()
         orch_status = st.empty()
+        draft_status = st.empty()  # sub-agent answers while they stream (progressive mode)
         status = {
             "router": routing_status,
             "keyword": keyword_status,
             "rag": rag_status,
             "orchestrator": orch_status,
+            "draft": draft_status,
         }
 
         # Run news flow
-        (
-            final_response, thread,
-            sub_input_tokens_router, sub_output_tokens_router,
-            rag_prompt_tokens, rag_completion_tokens,
-            input_tokens_orchestrator, output_tokens_orchestrator,
-            keyword_input_tokens, keyword_output_tokens,
-            has_streamed
-        ) = await get_news_agent_response(
-            user_query, user_thread, main_thread,
+        final_response, thread, has_streamed = await get_news_agent_response(
+            user_query, user_thread, conversation.thread,
             news_router_agent, news_orchestrator_agent,
             pdf_rag_agent, keyword_extractor_agent,
-            pdf_search, language, status, container
+            pdf_search, language, status, container,
+            timings=stage_timings,
+            keyword_task=keyword_task,
+            ledger=ledger,
         )
-        input_tokens_router += sub_input_tokens_router
-        output_tokens_orchestrator += sub_output_tokens_router
         status["orchestrator"].empty()
 
-        # Merge thread histories if needed
-        if main_thread is not None and thread is not main_thread:
-            for msg in thread._chat_history:
-                main_thread._chat_history.add_message(msg)
-        else:
-            main_thread = thread
+        # Append only what the flow's thread gained this turn
+        conversation.merge(thread)
 
     elif intent == "CALLCENTER":
         keyword_status = st.empty()
@@ -112,95 +186,81 @@ async def get_agent_response(user_query: str, chat_history: ChatHistoryAgentThre
         status = {"keyword": keyword_status, "rag": rag_status}
 
         # Run call center flow
-        (
-            final_response, thread,
-            rag_prompt_tokens, rag_completion_tokens,
-            keyword_input_tokens, keyword_output_tokens,
-            has_streamed
-        ) = await get_callcenter_agent_response(
+        final_response, thread, has_streamed = await get_callcenter_agent_response(
             user_query, user_thread,
             callcenter_rag_agent,
             keyword_extractor_agent,
             callcenter_search,
-            language, status, container
+            language, status, container,
+            timings=stage_timings,
+            keyword_task=keyword_task,
+            ledger=ledger,
         )
         status["rag"].empty()
 
-        if main_thread is not None and thread is not main_thread:
-            for msg in thread._chat_history:
-                main_thread._chat_history.add_message(msg)
-        else:
-            main_thread = thread
+        conversation.merge(thread)
 
     elif intent == "FUNDFACT":
         keyword_status = st.empty()
         rag_status = st.empty()
         orch_status = st.empty()
+        draft_status = st.empty()  # sub-agent answers while they stream (progressive mode)
         status = {
             "keyword": keyword_status,
             "rag": rag_status,
             "orchestrator": orch_status,
+            "draft": draft_status,
         }
 
         # Run fund fact flow
-        (
-            final_response, thread,
-            rag_prompt_tokens, rag_completion_tokens,
-            input_tokens_orchestrator, output_tokens_orchestrator,
-            keyword_input_tokens, keyword_output_tokens,
-            has_streamed
-        ) = await get_fundfact_agent_response(
+        final_response, thread, has_streamed = await get_fundfact_agent_response(
             user_query, user_thread,
             keyword_extractor_agent,
             fundfact_linguistic_rag_agent,
             fundfact_linguistic_search,
             fundfact_coder_rag_agent,
             fundfact_orchestrator_agent,
-            language, status, container
+            language, status, container,
+            timings=stage_timings,
+            keyword_task=keyword_task,
+            ledger=ledger,
         )
         status["orchestrator"].empty()
 
-        if main_thread is not None and thread is not main_thread:
-            for msg in thread._chat_history:
-                main_thread._chat_history.add_message(msg)
-        else:
-            main_thread = thread
+        conversation.merge(thread)
 
     else:
         # Fallback to generic reply agent
         reply_user_prompt = f"Since other agents are bypassed, take the chat history and answer {user_query} in {language} accordingly if possible."
         reply_user_message = ChatMessageContent(role=AuthorRole.USER, content=reply_user_prompt)
 
-        input_tokens_reply = count_tokens(reply_user_prompt, tokenizer_4_1)
-
         final_response = ""
-        async for reply in reply_agent.invoke_stream(messages=[reply_user_message], thread=main_thread):
-            final_response += str(reply)
-            container.markdown(final_response)
-            main_thread = reply.thread
-            has_streamed = True
+        reply_usage = None
+        # Only the compacted history (running summary + recent turns) is sent to the reply agent
+        with memory_view(conversation.thread, reply_agent) as reply_thread:
+            async for reply in reply_agent.invoke_stream(messages=[reply_user_message], thread=reply_thread):
+                chunk = str(reply)
+                final_response += chunk
+                container.write(chunk)
+                has_streamed = True
+                reply_usage = merge_usage(reply_usage, reply)
+        container.close()
 
-        output_tokens_reply = count_tokens(final_response, tokenizer_4_1)
+        await ledger.record("reply", reply_usage, reply_user_prompt, final_response, model="gpt-4.1-mini")
+
+    # Remember fresh answers for near-paraphrased questions
+    if cached_answer is None and query_vector_task is not None:
+        try:
+            query_vector = await query_vector_task
+            answer_cache.store(intent, language, user_query, query_vector, final_response, cache_entities)
+        except Exception as e:
+            print(f"⚠️ Answer cache store failed: {e}")
 
     # Add messages to chat history
     chat_history.add_user_message(user_query)
     chat_history.add_assistant_message(final_response)
 
+    process_usage.add(ledger)
+
     # Return all useful info for metrics and state
-    return (
-        final_response,
-        chat_history,
-        main_thread,
-        user_thread,
-        rag_prompt_tokens,
-        rag_completion_tokens,
-        input_tokens_orchestrator,
-        output_tokens_orchestrator,
-        keyword_input_tokens,
-        keyword_output_tokens,
-        input_tokens_reply,
-        output_tokens_reply,
-        input_tokens_router,
-        output_tokens_router,
-        has_streamed
-    )
+    return final_response, chat_history, conversation, user_thread, ledger, has_streamed
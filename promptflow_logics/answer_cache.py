@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# === Semantic Answer Cache Configuration ===
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+# Longest wait for the query embedding before a lookup is skipped and the flow runs anyway
+ANSWER_CACHE_LOOKUP_TIMEOUT = float(os.environ.get("ANSWER_CACHE_LOOKUP_TIMEOUT", "0.3"))
+
+# Time-to-live per intent (seconds); intents not listed here are never cached (e.g. BYPASS,
+# whose answers depend on the conversation rather than on the data).
+ANSWER_CACHE_TTL = {
+    "NEWS": 6 * 3600,
+    "FUNDFACT": 24 * 3600,
+    "CALLCENTER": 7 * 24 * 3600,
+}
+
+FUNDFACT_DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "fundfact_data"
+
+
+# === Data freshness tokens: an entry is dropped as soon as its intent's token changes ===
+def news_data_version() -> str:
+    """
+    NEWS answers mention today's date, so they last until midnight at most; NEWS_DATA_VERSION
+    drops them earlier when Monthly Standpoint is refreshed.
+    """
+    return f"{os.environ.get('NEWS_DATA_VERSION', '')}:{datetime.now():%Y-%m-%d}"
+
+
+def fundfact_data_version() -> str:
+    """Latest modification time of the fund fact CSVs."""
+    mtimes = [p.stat().st_mtime_ns for p in FUNDFACT_DATA_DIR.glob("*.csv")]
+    return str(max(mtimes)) if mtimes else ""
+
+
+def callcenter_data_version() -> str:
+    return os.environ.get("CALLCENTER_DATA_VERSION", "")
+
+
+DATA_VERSION_PROVIDERS = {
+    "NEWS": news_data_version,
+    "FUNDFACT": fundfact_data_version,
+    "CALLCENTER": callcenter_data_version,
+}
+
+
+# === Semantic Answer Cache ===
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ttl=None,
+        version_providers=None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl if ttl is not None else dict(ANSWER_CACHE_TTL)
+        self.version_providers = version_providers if version_providers is not None else dict(DATA_VERSION_PROVIDERS)
+
+        self._entries = OrderedDict()  # entry_id -> entry dict, in LRU order
+        self._buckets = {}             # (intent, language, entities) -> {"ids": [...], "matrix": ndarray | None}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def is_cacheable(self, intent: str) -> bool:
+        return intent in self.ttl
+
+    @staticmethod
+    def _bucket_key(intent: str, language: str, entities) -> tuple:
+        # Paraphrases about different funds embed almost identically, so named entities
+        # (e.g. recognized fund codes) must match exactly
+        return intent, language, tuple(sorted(set(entities or ())))
+
+    def may_hit(self, intent: str, language: str, entities=()) -> bool:
+        """
+        Cheap pre-check before lookup(): False (counted as a miss) means no entry could match,
+        so the query embedding need not be awaited.
+        """
+        if not self.is_cacheable(intent):
+            return False
+        with self._lock:
+            bucket = self._buckets.get(self._bucket_key(intent, language, entities))
+            if bucket and bucket["ids"]:
+                return True
+            self.misses += 1
+            return False
+
+    def _data_version(self, intent: str) -> str:
+        provider = self.version_providers.get(intent)
+        return provider() if provider else ""
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        bucket = self._buckets.get(entry["bucket"])
+        if bucket is not None:
+            bucket["ids"].remove(entry_id)
+            bucket["matrix"] = None
+
+    def _is_stale(self, entry, now, version) -> bool:
+        return now - entry["created_at"] > self.ttl.get(entry["intent"], 0) or entry["data_version"] != version
+
+    def lookup(self, intent: str, language: str, vector, entities=()):
+        """
+        Return the cached answer most similar to vector if above threshold and still fresh.
+        Only answers stored with the same entities are candidates.
+        """
+        if not self.is_cacheable(intent):
+            return None
+
+        query = self._normalize(vector)
+        version = self._data_version(intent)
+        now = time.time()
+
+        with self._lock:
+            bucket = self._buckets.get(self._bucket_key(intent, language, entities))
+            if bucket is None or not bucket["ids"]:
+                self.misses += 1
+                return None
+
+            # Purge entries whose TTL passed or whose source data changed
+            stale = [i for i in bucket["ids"] if self._is_stale(self._entries[i], now, version)]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.expired += len(stale)
+            if not bucket["ids"]:
+                self.misses += 1
+                return None
+
+            if bucket["matrix"] is None:
+                bucket["matrix"] = np.stack([self._entries[i]["vector"] for i in bucket["ids"]])
+
+            similarities = bucket["matrix"] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = bucket["ids"][best]
+            entry = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["answer"]
+
+    def store(self, intent: str, language: str, query: str, vector, answer: str, entities=()):
+        if not self.is_cacheable(intent) or not answer:
+            return
+
+        entry = {
+            "intent": intent,
+            "bucket": self._bucket_key(intent, language, entities),
+            "query": query,
+            "answer": answer,
+            "vector": self._normalize(vector),
+            "data_version": self._data_version(intent),
+            "created_at": time.time(),
+            "hits": 0,
+        }
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            bucket = self._buckets.setdefault(entry["bucket"], {"ids": [], "matrix": None})
+            bucket["ids"].append(entry_id)
+            bucket["matrix"] = None
+
+            # Bounded size: evict least recently used entries
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def invalidate(self, intent: str = None):
+        """Drop every entry (or only those of one intent), e.g. after a document refresh."""
+        with self._lock:
+            for entry_id in [i for i, e in self._entries.items() if intent is None or e["intent"] == intent]:
+                self._remove(entry_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# === Shared cache instance (process-wide, shared by all sessions) ===
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SemanticAnswerCache()
+    return _shared_cache
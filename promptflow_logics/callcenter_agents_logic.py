@@ -1,16 +1,13 @@
-import asyncio
+from functools import partial
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
 
-# === Tokenizer setup ===
-import tiktoken
+from promptflow_logics.conversation_memory import memory_view
+from promptflow_logics.dag_executor import Node, run_dag, status_callback
+from promptflow_logics.speculative_prefetch import await_speculative_keywords
+from promptflow_logics.stream_sink import as_stream_sink
+from promptflow_logics.usage_ledger import UsageLedger, merge_usage
 
-tokenizer_4o = tiktoken.encoding_for_model("gpt-4o-mini")
-tokenizer_4_1 = tiktoken.get_encoding("o200k_base")  # gpt-4.1
-
-def count_tokens(text: str, tokenizer) -> int:
-    """Count tokens in text using given tokenizer."""
-    return len(tokenizer.encode(text))
 
 # === Main call center agent flow ===
 async def get_callcenter_agent_response(
@@ -21,60 +18,73 @@ async def get_callcenter_agent_response(
     txt_search,
     language,
     status,
-    container
+    container,
+    timings=None,
+    keyword_task=None,
+    ledger=None,
 ):
-    # Step 1: Extract keywords from user query
-    if status:
-        status["keyword"].markdown("🔍 Extracting keywords...")
-
-    keyword_prompt = f"Extract keywords from this query: {user_query}"
-    keyword_message = ChatMessageContent(role=AuthorRole.USER, content=keyword_prompt)
-
-    keyword_input_tokens = count_tokens(keyword_prompt, tokenizer_4_1)
-    search_keywords = user_query
-
-    async for response in keyword_extractor_agent.invoke(messages=[keyword_message], thread=user_thread):
-        search_keywords = str(response)
-
-    keyword_output_tokens = count_tokens(search_keywords, tokenizer_4_1)
-
-    # Step 2: Use keywords to retrieve context and query the text RAG agent
-    if status:
-        status["rag"].markdown("📚 Running RAG agents...")
-        status["keyword"].empty()
-
-    context_text = await txt_search.search_text_content(search_keywords, filter=None, top_k=10)
-
-    user_prompt = f"""Use the following JSON context to answer the question in {language}:
-
-        Context text data:
-        {context_text}
-
-        Question: {user_query}
-        """
-
-    rag_prompt_tokens = count_tokens(user_prompt, tokenizer_4o)
-    user_message = ChatMessageContent(role=AuthorRole.USER, content=user_prompt)
-
-    response_text = ""
-    main_thread = None
-    has_streamed = False
-
-    async for response in txt_rag_agent.invoke_stream(messages=[user_message]):
-        response_text += str(response)
-        container.markdown(response_text)
-        main_thread = response.thread
-        has_streamed = True
-
-    rag_completion_tokens = count_tokens(response_text, tokenizer_4o)
-
-    # Return all relevant information for tracking usage and threading
-    return (
-        response_text,
-        main_thread,
-        rag_prompt_tokens,
-        rag_completion_tokens,
-        keyword_input_tokens,
-        keyword_output_tokens,
-        has_streamed,
-    )
+    update_status = partial(status_callback, status)
+    ledger = ledger if ledger is not None else UsageLedger()
+
+    # Stage 1: Extract keywords from user query
+    async def keyword_stage():
+        if keyword_task is not None:
+            # Started speculatively while the main router was deciding
+            keywords = await await_speculative_keywords(keyword_task, user_thread, ledger)
+            if keywords is not None:
+                return keywords
+
+        keyword_prompt = f"Extract keywords from this query: {user_query}"
+        keyword_message = ChatMessageContent(role=AuthorRole.USER, content=keyword_prompt)
+
+        search_keywords = user_query
+        usage = None
+        with memory_view(user_thread, keyword_extractor_agent) as keyword_thread:
+            async for response in keyword_extractor_agent.invoke(messages=[keyword_message], thread=keyword_thread):
+                search_keywords = str(response)
+                usage = merge_usage(usage, response)
+
+        await ledger.record("keywords", usage, keyword_prompt, search_keywords, model="gpt-4.1-nano")
+        return {"keywords": search_keywords}
+
+    # Stage 2: Use keywords to retrieve context and query the text RAG agent
+    async def rag_stage(keywords):
+        context_text = await txt_search.search_text_content(keywords["keywords"], filter=None, top_k=10)
+
+        user_prompt = f"""Use the following JSON context to answer the question in {language}:
+
+            Context text data:
+            {context_text}
+
+            Question: {user_query}
+            """
+
+        user_message = ChatMessageContent(role=AuthorRole.USER, content=user_prompt)
+
+        response_text = ""
+        main_thread = None
+        has_streamed = False
+        usage = None
+        sink = as_stream_sink(container)
+
+        async for response in txt_rag_agent.invoke_stream(messages=[user_message]):
+            chunk = str(response)
+            response_text += chunk
+            sink.write(chunk)
+            main_thread = response.thread
+            has_streamed = True
+            usage = merge_usage(usage, response)
+        sink.close()
+
+        await ledger.record("rag", usage, user_prompt, response_text, model="gpt-4o-mini")
+        return {"response": response_text, "thread": main_thread, "has_streamed": has_streamed}
+
+    results = await run_dag([
+        Node("keywords", keyword_stage, on_start=update_status("keyword", "🔍 Extracting keywords...")),
+        Node("rag", rag_stage, deps=("keywords",),
+             on_start=update_status("rag", "📚 Running RAG agents...", clear=("keyword",))),
+    ], timings=timings)
+
+    # Token usage of every stage is in the ledger
+    rag = results["rag"]
+    return rag["response"], rag["thread"], rag["has_streamed"]
@@ -0,0 +1,288 @@
+import os
+import asyncio
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+from semantic_kernel.agents import ChatHistoryAgentThread
+from semantic_kernel.contents import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.contents.history_reducer.chat_history_summarization_reducer import ChatHistorySummarizationReducer
+from semantic_kernel.contents.history_reducer.chat_history_reducer_utils import SUMMARY_METADATA_KEY
+
+from agents.http_session_pool import close_http_sessions
+from agents.resource_registry import count_tokens
+from promptflow_logics.usage_ledger import usage_of
+
+# === Conversation Memory Configuration ===
+# Most recent turns (a user query and everything that followed it) always sent verbatim
+MEMORY_KEEP_TURNS = int(os.environ.get("MEMORY_KEEP_TURNS", "4"))
+# Older turns are folded into the running summary once at least this many are waiting
+MEMORY_SUMMARY_MIN_TURNS = int(os.environ.get("MEMORY_SUMMARY_MIN_TURNS", "4"))
+# Kernel service that writes the summaries (gpt-4.1-mini)
+MEMORY_SUMMARY_SERVICE = os.environ.get("MEMORY_SUMMARY_SERVICE", "reply_agent")
+
+# Token budget of the history sent to each agent (by agent name), summary included
+MEMORY_TOKEN_BUDGETS = {
+    "general_reply": int(os.environ.get("REPLY_MEMORY_TOKENS", "4000")),
+    "main_router_agent": int(os.environ.get("ROUTER_MEMORY_TOKENS", "1500")),
+    "keyword-extractor-agent": int(os.environ.get("KEYWORD_MEMORY_TOKENS", "800")),
+}
+MEMORY_DEFAULT_TOKEN_BUDGET = int(os.environ.get("MEMORY_DEFAULT_TOKENS", "2000"))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# Metadata flag on the user message that opens a turn. The router thread also gets helper
+# prompts ("Extract keywords from this query: ...") as user messages, which must not count as turns.
+TURN_START_METADATA_KEY = "__turn_start__"
+
+
+# === Process-wide per-turn metrics ===
+class MemoryStats:
+    def __init__(self, samples: int = 500):
+        self._lock = threading.Lock()
+        self.turns = {}  # agent name -> deque of (turn, view tokens, full history tokens)
+        self._samples = samples
+        self.summaries = 0
+        self.summary_failures = 0
+        self.summary_prompt_tokens = 0
+        self.summary_completion_tokens = 0
+
+    def record_view(self, agent_name: str, turn: int, view_tokens: int, full_tokens: int):
+        with self._lock:
+            self.turns.setdefault(agent_name, deque(maxlen=self._samples)).append((turn, view_tokens, full_tokens))
+
+    def record_summary(self, usage=None, failed: bool = False):
+        with self._lock:
+            if failed:
+                self.summary_failures += 1
+                return
+            self.summaries += 1
+            if usage is not None:
+                self.summary_prompt_tokens += usage["prompt_tokens"]
+                self.summary_completion_tokens += usage["completion_tokens"]
+
+    def as_dict(self) -> dict:
+        def mean(values):
+            return round(sum(values) / len(values), 1) if values else None
+
+        with self._lock:
+            agents = {}
+            for name, samples in self.turns.items():
+                turn, view_tokens, full_tokens = samples[-1]
+                agents[name] = {
+                    "views": len(samples),
+                    "last_turn": turn,
+                    "last_view_tokens": view_tokens,
+                    "last_full_tokens": full_tokens,
+                    "mean_view_tokens": mean([s[1] for s in samples]),
+                    "mean_full_tokens": mean([s[2] for s in samples]),
+                    "per_turn": [list(s) for s in samples],
+                }
+            return {
+                "agents": agents,
+                "summaries": self.summaries,
+                "summary_failures": self.summary_failures,
+                "summary_prompt_tokens": self.summary_prompt_tokens,
+                "summary_completion_tokens": self.summary_completion_tokens,
+            }
+
+
+memory_stats = MemoryStats()
+
+
+def turn_start_message(user_query: str) -> ChatMessageContent:
+    """The user message that opens a turn (the user's own query)."""
+    return ChatMessageContent(role=AuthorRole.USER, content=user_query, metadata={TURN_START_METADATA_KEY: True})
+
+
+def _turn_starts(messages) -> list:
+    """Indexes of the tagged turn openers; threads without any tag (one user message per turn) use every user message."""
+    user_messages = [i for i, message in enumerate(messages) if message.role == AuthorRole.USER]
+    tagged = [i for i in user_messages if messages[i].metadata.get(TURN_START_METADATA_KEY)]
+    return tagged or user_messages
+
+
+def _tokens(message) -> int:
+    return count_tokens(str(message.content or ""), "gpt-4.1") + 4  # + role/message framing
+
+
+# === Rolling summary of one thread; the thread itself keeps the full, append-only history ===
+class ConversationMemory:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.summary = ""
+        self.summary_tokens = 0
+        self.covered = 0  # leading thread messages folded into the summary
+        self._message_tokens = []  # per thread message, counted once (threads only grow)
+        self._full_tokens = 0
+        self._summarizing = None
+
+    def _counts(self, messages) -> list:
+        """Token counts of messages by index; only messages added since the last call are encoded."""
+        with self._lock:
+            for message in messages[len(self._message_tokens):]:
+                tokens = _tokens(message)
+                self._message_tokens.append(tokens)
+                self._full_tokens += tokens
+            return self._message_tokens
+
+    def full_tokens(self, messages) -> int:
+        """Tokens of the whole history."""
+        self._counts(messages)
+        with self._lock:
+            return self._full_tokens
+
+    def view(self, messages, budget: int) -> tuple[list, int]:
+        """
+        Summary plus the newest turns that fit the budget: the last MEMORY_KEEP_TURNS turns are
+        preferred, but turns the summary does not cover yet are added while they fit, and older
+        ones are dropped first. The latest turn is always kept. Returns (messages, tokens).
+        """
+        counts = self._counts(messages)
+        with self._lock:
+            summary, summary_tokens, covered = self.summary, self.summary_tokens, self.covered
+
+        view_messages = []
+        used = 0
+        if summary:
+            view_messages.append(ChatMessageContent(
+                role=AuthorRole.SYSTEM, content=SUMMARY_PREFIX + summary, metadata={SUMMARY_METADATA_KEY: True}
+            ))
+            used += summary_tokens
+
+        recent = messages[covered:]
+        recent_counts = counts[covered:len(messages)]
+        starts = _turn_starts(recent) or [0]
+        kept_from = len(recent)
+        for start in reversed(starts):
+            turn_tokens = sum(recent_counts[start:kept_from])
+            if kept_from < len(recent) and used + turn_tokens > budget:
+                break
+            used += turn_tokens
+            kept_from = start
+        if starts[0] > 0 and kept_from == starts[0]:
+            kept_from = 0  # messages before the first user message of the window belong with it
+
+        view_messages.extend(recent[kept_from:])
+        return view_messages, used
+
+    def pending_turns(self, messages) -> int:
+        """Turns older than the verbatim window that the summary does not cover yet."""
+        with self._lock:
+            covered = self.covered
+        return max(0, len(_turn_starts(messages[covered:])) - MEMORY_KEEP_TURNS)
+
+    def schedule_summary(self, messages, service):
+        """Fold the turns before the verbatim window into the summary, in a background thread."""
+        if service is None or self.pending_turns(messages) < MEMORY_SUMMARY_MIN_TURNS:
+            return None
+        with self._lock:
+            if self._summarizing is not None and self._summarizing.is_alive():
+                return None
+            snapshot = list(messages)
+            covered, summary = self.covered, self.summary
+            self._summarizing = threading.Thread(
+                target=self._summarize, args=(snapshot, covered, summary, service), name="memory-summary", daemon=True
+            )
+            self._summarizing.start()
+            return self._summarizing
+
+    def _summarize(self, snapshot, covered, summary, service):
+        recent = snapshot[covered:]
+        keep_from = _turn_starts(recent)[-MEMORY_KEEP_TURNS]
+        history = list(recent)
+        if summary:
+            history.insert(0, ChatMessageContent(
+                role=AuthorRole.ASSISTANT, content=summary, metadata={SUMMARY_METADATA_KEY: True}
+            ))
+        reducer = ChatHistorySummarizationReducer(
+            service=service,
+            target_count=len(recent) - keep_from,
+            messages=history,
+            fail_on_error=False,
+        )
+
+        async def reduce():
+            try:
+                return await reducer.reduce()
+            finally:
+                # This thread's loop is about to close
+                await close_http_sessions()
+
+        try:
+            reduced = asyncio.run(reduce())
+        except Exception as e:
+            print(f"⚠️ Conversation summary failed: {e}")
+            memory_stats.record_summary(failed=True)
+            return
+        if reduced is None:
+            return
+
+        summary_message, remainder = reduced.messages[0], reduced.messages[1:]
+        new_summary = str(summary_message.content).strip()
+        new_summary_tokens = count_tokens(SUMMARY_PREFIX + new_summary, "gpt-4.1") + 4  # counted here, off the loop
+        with self._lock:
+            if self.covered == covered:  # nothing else moved the window meanwhile
+                self.summary, self.summary_tokens = new_summary, new_summary_tokens
+                self.covered = len(snapshot) - len(remainder)
+        memory_stats.record_summary(usage_of(summary_message))
+
+
+_memories = weakref.WeakKeyDictionary()
+_memories_lock = threading.Lock()
+
+
+def memory_for(thread) -> ConversationMemory:
+    with _memories_lock:
+        memory = _memories.get(thread)
+        if memory is None:
+            memory = _memories[thread] = ConversationMemory()
+        return memory
+
+
+def _summary_service(agent):
+    services = getattr(getattr(agent, "kernel", None), "services", None) or {}
+    return services.get(MEMORY_SUMMARY_SERVICE)
+
+
+# === Compacted views handed to the agents ===
+def compact_thread(thread, agent) -> ChatHistoryAgentThread:
+    """
+    Detached thread holding the running summary and the recent turns of thread, within the
+    token budget of agent (by name). Records the view size against the full history.
+    """
+    if thread is None:
+        return ChatHistoryAgentThread()
+
+    messages = thread._chat_history.messages
+    agent_name = getattr(agent, "name", "") or ""
+    budget = MEMORY_TOKEN_BUDGETS.get(agent_name, MEMORY_DEFAULT_TOKEN_BUDGET)
+
+    memory = memory_for(thread)
+    view_messages, view_tokens = memory.view(messages, budget)
+    full_tokens = memory.full_tokens(messages)
+    memory_stats.record_view(agent_name, len(_turn_starts(messages)), view_tokens, full_tokens)
+    return ChatHistoryAgentThread(chat_history=ChatHistory(messages=view_messages))
+
+
+@contextmanager
+def memory_view(thread, agent):
+    """
+    Run an agent on a compacted view of thread: messages the agent adds to the view are
+    copied to thread afterwards, and a summary refresh is started in the background when
+    enough turns have left the verbatim window. With no thread the agent keeps its own.
+    """
+    if thread is None:
+        yield None
+        return
+
+    view = compact_thread(thread, agent)
+    start = len(view._chat_history.messages)
+    yield view
+
+    for message in view._chat_history.messages[start:]:
+        thread._chat_history.add_message(message)
+    memory_for(thread).schedule_summary(thread._chat_history.messages, _summary_service(agent))
@@ -0,0 +1,83 @@
+import json
+import weakref
+
+from semantic_kernel.agents import ChatHistoryAgentThread
+from semantic_kernel.contents import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+# Version of the serialized form written by ConversationStore.to_dict()
+STORE_FORMAT_VERSION = 1
+
+
+def _messages(thread) -> list:
+    # The one place that reaches into the SK thread's history
+    return thread._chat_history.messages
+
+
+# === Append-only log of the main conversation ===
+class ConversationStore:
+    def __init__(self, thread: ChatHistoryAgentThread = None):
+        """
+        Wraps the thread that holds the main conversation (the reply agent's history). Messages
+        are only ever appended; merge() remembers, per source thread, how far it has been read.
+        """
+        self.thread = thread if thread is not None else ChatHistoryAgentThread()
+        self._cursors = weakref.WeakKeyDictionary()  # source thread -> messages already merged
+
+    @classmethod
+    def wrap(cls, thread) -> "ConversationStore":
+        """A store as is, or a new store around a thread (or an empty one for None)."""
+        return thread if isinstance(thread, cls) else cls(thread)
+
+    @property
+    def messages(self) -> list:
+        return list(_messages(self.thread))
+
+    def __len__(self) -> int:
+        return len(_messages(self.thread))
+
+    def append(self, message: ChatMessageContent):
+        self.thread._chat_history.add_message(message)
+
+    def add_user_message(self, content: str):
+        self.append(ChatMessageContent(role=AuthorRole.USER, content=content))
+
+    def add_assistant_message(self, content: str):
+        self.append(ChatMessageContent(role=AuthorRole.ASSISTANT, content=content))
+
+    def merge(self, source) -> int:
+        """Append the messages source gained since its last merge, in O(new). Returns how many."""
+        if source is None or source is self.thread:
+            return 0
+        source_messages = _messages(source)
+        cursor = self._cursors.get(source, 0)
+        new_messages = source_messages[cursor:]
+        for message in new_messages:
+            self.append(message)
+        self._cursors[source] = len(source_messages)
+        return len(new_messages)
+
+    # === Compact serialized form for session persistence ===
+    def to_dict(self) -> dict:
+        """{"v": 1, "messages": [[role, text], ...]}; only the text of each message is kept."""
+        return {
+            "v": STORE_FORMAT_VERSION,
+            "messages": [[message.role.value, str(message.content or "")] for message in _messages(self.thread)],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConversationStore":
+        if data.get("v") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported conversation store format: {data.get('v')}")
+        history = ChatHistory(messages=[
+            ChatMessageContent(role=AuthorRole(role), content=content) for role, content in data["messages"]
+        ])
+        return cls(ChatHistoryAgentThread(chat_history=history))
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: str) -> "ConversationStore":
+        return cls.from_dict(json.loads(text))
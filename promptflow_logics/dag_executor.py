@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+
+# === Pipeline Stage ===
+class Node:
+    def __init__(self, name: str, func, deps=(), on_start=None, on_done=None):
+        """
+        A pipeline stage. func is an async callable receiving the results of its
+        dependencies as keyword arguments (named after the dependency nodes).
+        on_start / on_done are optional sync callbacks, e.g. for Streamlit status updates.
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.on_start = on_start
+        self.on_done = on_done
+
+
+def _topological_order(nodes):
+    by_name = {node.name: node for node in nodes}
+    if len(by_name) != len(nodes):
+        raise ValueError("Duplicate node names in pipeline")
+    for node in nodes:
+        missing = [dep for dep in node.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Node '{node.name}' depends on unknown node(s): {missing}")
+
+    order, visiting, done = [], set(), set()
+
+    def visit(node):
+        if node.name in done:
+            return
+        if node.name in visiting:
+            raise ValueError(f"Cycle detected at node '{node.name}'")
+        visiting.add(node.name)
+        for dep in node.deps:
+            visit(by_name[dep])
+        visiting.discard(node.name)
+        done.add(node.name)
+        order.append(node)
+
+    for node in nodes:
+        visit(node)
+    return order
+
+
+# === Dependency-graph executor ===
+async def run_dag(nodes, timings: dict = None) -> dict:
+    """
+    Run every node as soon as all of its dependencies have finished and return
+    {node_name: result}. Per-node timings (seconds, relative to the pipeline start) are
+    written into timings if given. If any node fails, the remaining nodes are cancelled.
+    """
+    order = _topological_order(list(nodes))
+    timings = timings if timings is not None else {}
+    pipeline_start = time.perf_counter()
+    tasks = {}
+
+    async def run_node(node):
+        inputs = {dep: await tasks[dep] for dep in node.deps}
+        start = time.perf_counter()
+        if node.on_start:
+            node.on_start()
+        try:
+            return await node.func(**inputs)
+        finally:
+            end = time.perf_counter()
+            timings[node.name] = {
+                "start": start - pipeline_start,
+                "end": end - pipeline_start,
+                "duration": end - start,
+            }
+            if node.on_done:
+                node.on_done()
+
+    # Dependencies are created first, so every node can await its inputs' tasks
+    for node in order:
+        tasks[node.name] = asyncio.ensure_future(run_node(node))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    return {name: task.result() for name, task in tasks.items()}
+
+
+def status_callback(status, show=None, text="", clear=()):
+    """Build an on_start/on_done callback that updates the flow's Streamlit status placeholders."""
+    def callback():
+        if not status:
+            return
+        for key in clear:
+            status[key].empty()
+        if show:
+            status[show].markdown(text)
+    return callback
+
+
+def format_timings(timings: dict) -> str:
+    """Compact one-line summary, e.g. 'route 0.82s | keywords 0.61s | ...' in start order."""
+    ordered = sorted(timings.items(), key=lambda item: item[1]["start"])
+    return " | ".join(f"{name} {t['duration']:.2f}s" for name, t in ordered)
@@ -1,40 +1,49 @@
 import asyncio
 import os
 import sys
-from pathlib import Path
+from functools import partial
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.agents import AzureAssistantAgent
 
 # Add the parent directory (work) to the module search path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import tiktoken
-
-# === Tokenizers ===
-tokenizer_4o = tiktoken.encoding_for_model("gpt-4o-mini")
-tokenizer_4_1 = tiktoken.get_encoding("o200k_base")  # gpt-4.1
-
-def count_tokens(text: str, tokenizer) -> int:
-    """Count tokens in the given text using specified tokenizer."""
-    return len(tokenizer.encode(text))
+from promptflow_logics.conversation_memory import memory_view
+from promptflow_logics.dag_executor import Node, run_dag, status_callback
+from promptflow_logics.progressive import DraftBoard, wait_for_deadline, collect_late, cancel_pending, late_section
+from promptflow_logics.speculative_prefetch import await_speculative_keywords
+from promptflow_logics.stream_sink import as_stream_sink
+from agents.fund_profiles import get_fund_profile_store
+from agents.fund_code_recognizer import get_fund_code_recognizer, build_fund_filter
+from agents.save_and_load_azure_assistant_agent import load_file_ids
+from promptflow_logics.usage_ledger import UsageLedger, merge_usage
 
 # === Azure OpenAI environment variables ===
 deployment = "gpt-4o-mini"
 subscription_key = os.environ.get("AZURE_OPENAI_KEY")
 endpoint = os.environ.get("AZURE_OPENAI_RESOURCE")
 
-# === File ID Storage for Assistant Context Awareness ===
-FILE_ID_PATH = Path.cwd() / "agents" / "azure_assistant_file_ids.json"
+# === Linguistic search size (hits); profiles of named funds replace most of the vector context ===
+search_top_k = 50
+profile_search_top_k = 10
+
+# Searchable field of the mutualfunds index that recognized fund codes are matched against
+fund_filter_field = os.environ.get("FUNDFACT_FILTER_FIELD", "content")
 
+# Headings of the two RAG answers in the draft view and in late additions
+answer_labels = {
+    "text": "Answer from text documents",
+    "spreadsheet": "Answer from spreadsheet",
+}
+
+# === File ID Storage for Assistant Context Awareness ===
 def get_uploaded_file_summary() -> str:
     """
     Reads uploaded file IDs and returns a short summary in Markdown format.
     This is helpful for the assistant when it references external files.
     """
-    if not FILE_ID_PATH.exists():
-        return ""
-    with open(FILE_ID_PATH, "r", encoding="utf-8") as f:
-        file_ids = json.load(f)
+    file_ids = load_file_ids()
     if not file_ids:
         return ""
     lines = ["You may refer to the following uploaded files:"]
@@ -43,46 +52,65 @@ def get_uploaded_file_summary() -> str:
     return "\n".join(lines)
 
 # === Helper function to run agent with optional search context ===
-async def run_agent(agent, query, search_keywords=None, search_tool=None):
+async def run_agent(agent, query, search_keywords=None, search_tool=None, profiles="", top_k=50, filter=None, ledger=None,
+                    on_chunk=None):
+    # Pre-joined profiles of the funds named in the query, if any
+    profile_section = f"Fund profiles:\n{profiles}\n\n" if profiles else ""
+
     if search_tool is not None:
         # Search for context data first
-        context_text = await search_tool.search_text_content(search_keywords, filter=None, top_k=50)
+        context_text = await search_tool.search_text_content(search_keywords, filter=filter, top_k=top_k)
 
         user_prompt = f"""Use the following JSON context to answer the question:
 
-        Context text data:
+        {profile_section}Context text data:
         {context_text}
 
         Question: {query}
         """
 
-        input_tokens = count_tokens(user_prompt, tokenizer_4o)
         user_message = ChatMessageContent(role=AuthorRole.USER, content=user_prompt)
 
         response_text = ""
-        async for response in agent.invoke(messages=[user_message]):
-            response_text = str(response)
-
-        output_tokens = count_tokens(response_text, tokenizer_4o)
+        usage = None
+        if on_chunk is None:
+            async for response in agent.invoke(messages=[user_message]):
+                response_text = str(response)
+                usage = merge_usage(usage, response)
+        else:
+            # Progressive mode: stream the answer into the draft view
+            async for response in agent.invoke_stream(messages=[user_message]):
+                chunk = str(response)
+                response_text += chunk
+                on_chunk(chunk)
+                usage = merge_usage(usage, response)
+
+        model = "gpt-4o-mini"
 
     else:
-        # If no search is used, pass query + file reference directly
-        file_id_summary = get_uploaded_file_summary()
-        user_input = f"""Answer the question: {query} given the dictionary of filename : file_id stored with you are {file_id_summary}"""
-        
+        if isinstance(agent, AzureAssistantAgent):
+            # Code interpreter: pass query + file reference directly
+            file_id_summary = get_uploaded_file_summary()
+            user_input = f"""{profile_section}Answer the question: {query} given the dictionary of filename : file_id stored with you are {file_id_summary}"""
+        else:
+            # Local fund fact query engine: the agent calls its table tools in-process
+            user_input = f"{profile_section}{query}"
+
         response_text = ""
-        input_tokens = count_tokens(user_input, tokenizer_4o)
+        usage = None
         async for msg in agent.invoke(user_input):
             if hasattr(msg, "content") and msg.content:
                 response_text += str(msg.content)
+                if on_chunk is not None:
+                    on_chunk(str(msg.content))
+            # Assistant runs report usage per run step
+            usage = merge_usage(usage, msg)
 
-        output_tokens = count_tokens(response_text, tokenizer_4o)
+        user_prompt, model = user_input, "gpt-4.1-mini"
 
-    return {
-        "text": response_text.strip(),
-        "input_tokens": input_tokens,
-        "output_tokens": output_tokens,
-    }
+    if ledger is not None:
+        await ledger.record("rag", usage, user_prompt, response_text, model=model)
+    return {"text": response_text.strip()}
 
 
 # === Main orchestrator flow for fund fact queries ===
@@ -96,84 +124,164 @@ async def get_fundfact_agent_response(
     orchestrator_agent,
     language,
     status,
-    container
+    container,
+    timings=None,
+    keyword_task=None,
+    ledger=None,
 ) -> tuple[str, str]:
-    # Step 1: Extract keywords
-    if status:
-        status["keyword"].markdown("🔍 Extracting keywords...")
-
-    keyword_agent_user_prompt = f"Extract keywords from this query: {user_query}"
-    keyword_agent_message = ChatMessageContent(role=AuthorRole.USER, content=keyword_agent_user_prompt)
-
-    keyword_input_tokens = count_tokens(keyword_agent_user_prompt, tokenizer_4_1)
-    search_keywords = user_query
-
-    async for response in keyword_extractor_agent.invoke(messages=[keyword_agent_message], thread=user_thread):
-        search_keywords = str(response)
-
-    keyword_output_tokens = count_tokens(search_keywords, tokenizer_4_1)
-
-    # Step 2: Run two RAG agents in parallel:
-    # - linguistic rag agent with search context
-    # - coder rag agent without search context
-    fundfact_response_task = run_agent(fundfact_linguistic_rag_agent, user_query, search_keywords, fundfact_linguistic_search)
-    csv_response_task = run_agent(fundfact_coder_rag_agent, user_query)
-
-    if status:
-        status["keyword"].empty()
-        status["rag"].markdown("📚 Running RAG agents...")
-
-    results = await asyncio.gather(fundfact_response_task, csv_response_task)
-    responses = [r["text"] for r in results]
-
-    # Token counts for all RAG agents
-    rag_prompt_tokens = sum(r["input_tokens"] for r in results)
-    rag_completion_tokens = sum(r["output_tokens"] for r in results)
-
-    if status:
-        status["orchestrator"].markdown("🧠 Synthesizing final RAG response...")
-        status["rag"].empty()
-
-    # Step 3: Orchestrator prompt to combine responses
-    orchestrator_prompt = f"""You are the final assistant. Your job is to synthesize and consolidate the following three answers into a single, coherent, complete response for the user:
-
-        Answer from text documents:
-        {responses[0]}
-
-        Answer from spreadsheet:
-        {responses[1]}
-
-        Use the answer from the spreadsheet as the **primary source** of truth, especially when the question asks about which fund invests in a specific stock, country, commodity, or sector.
-        Please write your final response in a clear in {language}, structured way. Make sure no important point is missed.
-        """
-
-    orchestrator_message = ChatMessageContent(role=AuthorRole.USER, content=orchestrator_prompt)
-
-    # Token count for orchestrator input
-    input_tokens_orchestrator = count_tokens(orchestrator_prompt, tokenizer_4_1)
-
-    final_response = ""
-    thread = None
-    has_streamed = False
-
-    async for orchestration in orchestrator_agent.invoke_stream(messages=[orchestrator_message]):
-        final_response += str(orchestration)
-        if container is not None:
-            container.markdown(final_response)
-        thread = orchestration.thread
-        has_streamed = True
-
-    # Token count for orchestrator output
-    output_tokens_orchestrator = count_tokens(final_response, tokenizer_4_1)
-
-    return (
-        final_response,
-        thread,
-        rag_prompt_tokens,
-        rag_completion_tokens,
-        input_tokens_orchestrator,
-        output_tokens_orchestrator,
-        keyword_input_tokens,
-        keyword_output_tokens,
-        has_streamed,
-    )
+    # Stages form a dependency graph: the coder RAG agent never uses the keywords,
+    # so it starts right away, concurrently with keyword extraction.
+    update_status = partial(status_callback, status)
+    ledger = ledger if ledger is not None else UsageLedger()
+    drafts = DraftBoard((status or {}).get("draft"), answer_labels)
+    rag_tasks = {}
+
+    def start_rag(key, agent, *args, **kwargs):
+        # RAG agents run as tasks so the orchestrator can start without the slower one
+        async def run():
+            result = await run_agent(agent, *args, ledger=ledger, on_chunk=drafts.writer(key), **kwargs)
+            drafts.finish(key, result["text"])
+            return result
+
+        rag_tasks[key] = asyncio.create_task(run())
+        return rag_tasks[key]
+
+    # Stage: recognize fund codes and names (closed vocabulary from the CSVs, no LLM call)
+    async def entities_stage():
+        recognizer = get_fund_code_recognizer()
+        recognizer.refresh()
+        matches = recognizer.recognize(user_query)
+        return {
+            "codes": list(dict.fromkeys(code for match in matches for code in match["codes"])),
+            "unambiguous": recognizer.is_unambiguous(matches),
+        }
+
+    # Stage: extract keywords
+    async def keyword_stage(entities):
+        if entities["unambiguous"]:
+            # The named funds already scope the search; skip the keyword LLM call (the caller
+            # normally leaves the speculative one unclaimed; cancel it if it was handed over anyway)
+            if keyword_task is not None:
+                keyword_task.cancel()
+            return {"keywords": user_query}
+
+        if keyword_task is not None:
+            # Started speculatively while the main router was deciding
+            keywords = await await_speculative_keywords(keyword_task, user_thread, ledger)
+            if keywords is not None:
+                return keywords
+
+        keyword_agent_user_prompt = f"Extract keywords from this query: {user_query}"
+        keyword_agent_message = ChatMessageContent(role=AuthorRole.USER, content=keyword_agent_user_prompt)
+
+        search_keywords = user_query
+        usage = None
+        with memory_view(user_thread, keyword_extractor_agent) as keyword_thread:
+            async for response in keyword_extractor_agent.invoke(messages=[keyword_agent_message], thread=keyword_thread):
+                search_keywords = str(response)
+                usage = merge_usage(usage, response)
+
+        await ledger.record("keywords", usage, keyword_agent_user_prompt, search_keywords, model="gpt-4.1-nano")
+        return {"keywords": search_keywords}
+
+    # Stage: look up the materialized profiles of the funds named in the query
+    async def profiles_stage(entities):
+        try:
+            store = get_fund_profile_store()
+            store.refresh()
+            return store.render(entities["codes"])
+        except Exception as e:
+            print(f"⚠️ Fund profile lookup failed: {e}")
+            return ""
+
+    # Stage: linguistic rag agent with search context (narrower search when profiles already ground the answer)
+    async def linguistic_rag_stage(keywords, profiles, entities):
+        top_k = profile_search_top_k if profiles else search_top_k
+        # Only chunks that mention the recognized funds
+        search_filter = build_fund_filter(entities["codes"], fund_filter_field) if entities["codes"] else None
+        return start_rag(
+            "text", fundfact_linguistic_rag_agent, user_query, keywords["keywords"], fundfact_linguistic_search,
+            profiles=profiles, top_k=top_k, filter=search_filter,
+        )
+
+    # Stage: coder rag agent without search context
+    async def csv_rag_stage(profiles):
+        return start_rag("spreadsheet", fundfact_coder_rag_agent, user_query, profiles=profiles)
+
+    # Stage: the spreadsheet answer is the primary source, so it is always awaited; the deadline
+    # only keeps a slow text answer from holding up the orchestrator
+    async def rag_stage(linguistic_rag, csv_rag):
+        responses, late = await wait_for_deadline(
+            {"text": linguistic_rag, "spreadsheet": csv_rag}, required=("spreadsheet",)
+        )
+        return {"responses": responses, "late": late}
+
+    # Stage: orchestrator combines the answers and streams the final response
+    async def orchestrate_stage(rag):
+        responses = {key: result["text"] for key, result in rag["responses"].items()}
+        not_ready = "(not available yet)"
+
+        orchestrator_prompt = f"""You are the final assistant. Your job is to synthesize and consolidate the following three answers into a single, coherent, complete response for the user:
+
+            Answer from text documents:
+            {responses.get("text", not_ready)}
+
+            Answer from spreadsheet:
+            {responses.get("spreadsheet", not_ready)}
+
+            Use the answer from the spreadsheet as the **primary source** of truth, especially when the question asks about which fund invests in a specific stock, country, commodity, or sector.
+            Please write your final response in a clear in {language}, structured way. Make sure no important point is missed.
+            """
+
+        orchestrator_message = ChatMessageContent(role=AuthorRole.USER, content=orchestrator_prompt)
+
+        final_response = ""
+        thread = None
+        has_streamed = False
+        usage = None
+        sink = as_stream_sink(container)  # renders nothing when there is no container
+
+        try:
+            async for orchestration in orchestrator_agent.invoke_stream(messages=[orchestrator_message]):
+                chunk = str(orchestration)
+                final_response += chunk
+                sink.write(chunk)
+                thread = orchestration.thread
+                has_streamed = True
+                usage = merge_usage(usage, orchestration)
+
+            # Answers that missed the deadline are appended as written
+            for key, result in (await collect_late(rag["late"])).items():
+                section = late_section(answer_labels[key], result["text"])
+                final_response += section
+                sink.write(section)
+        except BaseException:
+            cancel_pending(rag["late"])
+            raise
+        sink.close()
+        drafts.clear()
+
+        await ledger.record("orchestrator", usage, orchestrator_prompt, final_response, model="gpt-4.1-mini")
+        return {"response": final_response, "thread": thread, "has_streamed": has_streamed}
+
+    try:
+        results = await run_dag([
+            Node("entities", entities_stage),
+            Node("keywords", keyword_stage, deps=("entities",),
+                 on_start=update_status("keyword", "🔍 Extracting keywords..."), on_done=update_status(clear=("keyword",))),
+            Node("profiles", profiles_stage, deps=("entities",)),
+            Node("csv_rag", csv_rag_stage, deps=("profiles",),
+                 on_start=update_status("rag", "📚 Running RAG agents...")),
+            Node("linguistic_rag", linguistic_rag_stage, deps=("keywords", "profiles", "entities")),
+            Node("rag", rag_stage, deps=("linguistic_rag", "csv_rag")),
+            Node("orchestrate", orchestrate_stage, deps=("rag",),
+                 on_start=update_status("orchestrator", "🧠 Synthesizing final RAG response...", clear=("rag",))),
+        ], timings=timings)
+    except BaseException:
+        # A stage failed before the RAG tasks were awaited
+        cancel_pending(rag_tasks)
+        raise
+
+    # Token usage of every stage is in the ledger
+    orchestration = results["orchestrate"]
+    return orchestration["response"], orchestration["thread"], orchestration["has_streamed"]
@@ -2,31 +2,34 @@ import asyncio
 import ast
 import math
 from datetime import datetime
+from functools import partial
 
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
 
-import tiktoken
+from promptflow_logics.conversation_memory import memory_view
+from promptflow_logics.dag_executor import Node, run_dag, status_callback
+from promptflow_logics.progressive import DraftBoard, wait_for_deadline, collect_late, cancel_pending, late_section
+from promptflow_logics.speculative_prefetch import await_speculative_keywords
+from promptflow_logics.stream_sink import as_stream_sink
+from promptflow_logics.usage_ledger import UsageLedger, merge_usage
 
 # === Constants ===
 today_str = datetime.now().strftime("%B %d, %Y")  # e.g., "July 24, 2025"
 
-# === Tokenizers for counting tokens with different models ===
-tokenizer_4o = tiktoken.encoding_for_model("gpt-4o-mini")
-tokenizer_4_1 = tiktoken.get_encoding("o200k_base")  # gpt-4.1
-
-def count_tokens(text: str, tokenizer) -> int:
-    """Count tokens in a text string given a tokenizer."""
-    return len(tokenizer.encode(text))
-
 
 # === Helper to call one RAG sub-agent with text and table search ===
-async def run_mmrag_agent(agents, search, user_query, search_keywords, filter=None, top_k=10):
-    # Concurrently search text and tables for context
-    context_text, context_table = await asyncio.gather(
-        search.search_text_content(search_keywords, filter=filter, top_k=top_k),
-        search.search_table_content(search_keywords, filter=filter, top_k=5),
-    )
+async def run_mmrag_agent(agents, search, user_query, search_keywords, filter=None, top_k=10, context=None, ledger=None,
+                          on_chunk=None):
+    if context is None:
+        # Concurrently search text and tables for context
+        context_text, context_table = await asyncio.gather(
+            search.search_text_content(search_keywords, filter=filter, top_k=top_k),
+            search.search_table_content(search_keywords, filter=filter, top_k=5),
+        )
+    else:
+        # Context already retrieved by the combined multi-route search
+        context_text, context_table = context
 
     user_prompt = f"""Use the following JSON context to answer the question:
 
@@ -39,15 +42,75 @@ async def run_mmrag_agent(agents, search, user_query, search_keywords, filter=No
         Question: {user_query}
         """
 
-    input_tokens = count_tokens(user_prompt, tokenizer_4o)
     user_message = ChatMessageContent(role=AuthorRole.USER, content=user_prompt)
 
     response_text = ""
-    async for response in agents.invoke(messages=[user_message]):
-        response_text = str(response)
-
-    output_tokens = count_tokens(response_text, tokenizer_4o)
-    return response_text, input_tokens, output_tokens
+    usage = None
+    if on_chunk is None:
+        async for response in agents.invoke(messages=[user_message]):
+            response_text = str(response)
+            usage = merge_usage(usage, response)
+    else:
+        # Progressive mode: stream the answer into the draft view
+        async for response in agents.invoke_stream(messages=[user_message]):
+            chunk = str(response)
+            response_text += chunk
+            on_chunk(chunk)
+            usage = merge_usage(usage, response)
+
+    if ledger is not None:
+        await ledger.record("rag", usage, user_prompt, response_text, model="gpt-4o-mini")
+    return response_text
+
+
+# === Route scoring helpers ===
+# Base top_k per route
+default_top_k = {
+    "MONTHLYSTANDPOINT": 20,
+    "KTM": 15,
+    "KCMA": 35,
+}
+
+route_prefixes = {
+    "MONTHLYSTANDPOINT": "monthlystandpoint",
+    "KTM": "ktm",
+    "KCMA": "kcma",
+}
+route_filters = {route: f"key_prefix eq '{prefix}'" for route, prefix in route_prefixes.items()}
+
+# Headings of the route answers in the draft view and in late additions
+route_labels = {
+    "MONTHLYSTANDPOINT": "Monthly Standpoint",
+    "KTM": "Know the Markets (KTM)",
+    "KCMA": "KAsset Capital Market Assumptions (KCMA)",
+}
+
+
+# Nonlinear bias for route scores
+def biased_score(route, score):
+    if route == "MONTHLYSTANDPOINT":
+        # sqrt boost for MONTHLYSTANDPOINT
+        return min(math.sqrt(score) * math.sqrt(10), 10)
+    elif route == "KTM":
+        # squared penalty for KTM
+        return min((score ** 2) / 10, 10)
+    elif route == "KCMA":
+        # linear bounded score for KCMA
+        return min(score, 10)
+    else:
+        return score
+
+
+def parse_route_scores(route_str: str) -> dict:
+    # Parse router output (expect a dict with scores)
+    try:
+        route_scores = ast.literal_eval(route_str)
+        assert isinstance(route_scores, dict)
+        valid_routes = {"MONTHLYSTANDPOINT", "KCMA", "KTM"}
+        return {k: v for k, v in route_scores.items() if k in valid_routes and isinstance(v, (int, float))}
+    except Exception:
+        # Fallback if parsing fails
+        return {"MONTHLYSTANDPOINT": 10, "KCMA": 0, "KTM": 0}
 
 
 # === Main flow for getting news agent response ===
@@ -62,166 +125,164 @@ async def get_news_agent_response(
     pdf_search,
     language,
     status,
-    container
+    container,
+    combined_retrieval=True,
+    timings=None,
+    keyword_task=None,
+    ledger=None,
 ):
-    # Step 0: Run the router agent to get route scores
-    if status:
-        status["router"].markdown("🔀 Selecting appropriate documents...")
-
-    router_prompt_with_date = f"Today is {today_str}.\n{user_query}"
-    router_user_message = ChatMessageContent(role=AuthorRole.USER, content=router_prompt_with_date)
-    async for route in news_router_agent.invoke(messages=[router_user_message]):
-        route_str = str(route).strip()
-        user_thread = route.thread
-
-    # Token counts for router input and output
-    input_tokens_router = count_tokens(user_query, tokenizer_4_1)
-    output_tokens_router = count_tokens(route_str, tokenizer_4_1)
-
-    # Parse router output (expect a dict with scores)
-    try:
-        route_scores = ast.literal_eval(route_str)
-        assert isinstance(route_scores, dict)
-        valid_routes = {"MONTHLYSTANDPOINT", "KCMA", "KTM"}
-        route_scores = {k: v for k, v in route_scores.items() if k in valid_routes and isinstance(v, (int, float))}
-    except Exception:
-        # Fallback if parsing fails
-        route_scores = {"MONTHLYSTANDPOINT": 10, "KCMA": 0, "KTM": 0}
-
-    # Step 1: Keyword extraction
-    if status:
-        status["keyword"].markdown("🔍 Extracting keywords...")
-        status["router"].empty()
-
-    keyword_agent_user_prompt = f"Extract keywords from this query: {user_query}"
-    keyword_agent_message = ChatMessageContent(role=AuthorRole.USER, content=keyword_agent_user_prompt)
-    keyword_input_tokens = count_tokens(keyword_agent_user_prompt, tokenizer_4_1)
-
-    search_keywords = user_query
-    async for response in keyword_extractor_agent.invoke(messages=[keyword_agent_message], thread=user_thread):
-        search_keywords = str(response)
-
-    keyword_output_tokens = count_tokens(search_keywords, tokenizer_4_1)
-
-    # Step 2: Run RAG agents with score-based adjusted top_k
-    if status:
-        status["rag"].markdown("📚 Running RAG agents...")
-        status["keyword"].empty()
-
-    # Base top_k per route
-    default_top_k = {
-        "MONTHLYSTANDPOINT": 20,
-        "KTM": 15,
-        "KCMA": 35,
-    }
-
-    # Nonlinear bias for route scores
-    def biased_score(route, score):
-        if route == "MONTHLYSTANDPOINT":
-            # sqrt boost for MONTHLYSTANDPOINT
-            return min(math.sqrt(score) * math.sqrt(10), 10)
-        elif route == "KTM":
-            # squared penalty for KTM
-            return min((score ** 2) / 10, 10)
-        elif route == "KCMA":
-            # linear bounded score for KCMA
-            return min(score, 10)
-        else:
-            return score
-
-    # Calculate adjusted top_k for each route
-    adjusted_top_k = {
-        route: max(1, int(default_top_k[route] * (biased_score(route, score) / 10)))
-        for route, score in route_scores.items() if score > 0
-    }
-
-    route_filters = {
-        "MONTHLYSTANDPOINT": "key_prefix eq 'monthlystandpoint'",
-        "KTM": "key_prefix eq 'ktm'",
-        "KCMA": "key_prefix eq 'kcma'",
-    }
-
-    rag_tasks = []
-    active_responses = {}
-    rag_prompt_tokens = 0
-    rag_completion_tokens = 0
-
-    # Launch parallel RAG queries for each active route
-    for route, top_k in adjusted_top_k.items():
-        filter_str = route_filters[route]
-        task = run_mmrag_agent(pdf_rag_agent, pdf_search, user_query, search_keywords, filter=filter_str, top_k=top_k)
-        rag_tasks.append((route, task))
-
-    results = await asyncio.gather(*(task for _, task in rag_tasks))
-
-    for (route, _), (response, prompt_toks, completion_toks) in zip(rag_tasks, results):
-        active_responses[route] = response
-        rag_prompt_tokens += prompt_toks
-        rag_completion_tokens += completion_toks
-
-    # Step 3: Run Orchestrator to combine responses
-    if status:
-        status["orchestrator"].markdown("🧠 Synthesizing final RAG response...")
-        status["rag"].empty()
-
-    orchestrator_sections = []
-
-    if "MONTHLYSTANDPOINT" in active_responses:
-        orchestrator_sections.append(f"""
-        Information from Monthly Standpoint (monthlystandpoint) document (covering news in this month):
-        {active_responses["MONTHLYSTANDPOINT"]}
-        """)
-
-    if "KTM" in active_responses:
-        orchestrator_sections.append(f"""
-        Information from Know the Markets (KTM) document (covering news in this quarter):
-        {active_responses["KTM"]}
-        """)
-
-    if "KCMA" in active_responses:
-        orchestrator_sections.append(f"""
-        Information from KAsset Capital Market Assumptions (KCMA) document (published at the start of the year, covering assumptions for the whole year):
-        {active_responses["KCMA"]}
-        """)
-
-    orchestrator_prompt = f"""
-        Today is {today_str}.
-
-        The information given to you are:
-        {''.join(orchestrator_sections)}
-
-        If the user's question "{user_query}" mentions specific documents, ignore what is not stated.
-        Otherwise, consider all included documents, but prioritize KCMA and Monthly Standpoint over KTM in terms of correctness.
-        Cross-check the facts and use those to answer the original question:
-        {user_query}
-
-        Please write your final response in a clear {language}, structured way. Make sure no important point is missed.
-        """
-
-    orchestrator_message = ChatMessageContent(role=AuthorRole.USER, content=orchestrator_prompt)
-    input_tokens_orchestrator = count_tokens(orchestrator_prompt, tokenizer_4_1)
-
-    final_response = ""
-    container.markdown(final_response)  # clear container before streaming
-
-    async for orchestration in orchestrator_agent.invoke_stream(messages=[orchestrator_message]):
-        final_response += str(orchestration)
-        container.markdown(final_response)
-        main_thread = orchestration.thread
-        has_streamed = True
-
-    output_tokens_orchestrator = count_tokens(final_response, tokenizer_4_1)
-
-    return (
-        final_response,
-        main_thread,
-        input_tokens_router,
-        output_tokens_router,
-        rag_prompt_tokens,
-        rag_completion_tokens,
-        input_tokens_orchestrator,
-        output_tokens_orchestrator,
-        keyword_input_tokens,
-        keyword_output_tokens,
-        has_streamed,
-    )
+    # The stages below form a dependency graph: routing and keyword extraction are
+    # independent and run concurrently; retrieval waits for both.
+    update_status = partial(status_callback, status)
+    ledger = ledger if ledger is not None else UsageLedger()
+    drafts = DraftBoard((status or {}).get("draft"), route_labels)
+
+    # Stage: news router scores each document type
+    async def route_stage():
+        router_prompt_with_date = f"Today is {today_str}.\n{user_query}"
+        router_user_message = ChatMessageContent(role=AuthorRole.USER, content=router_prompt_with_date)
+        route_str = ""
+        usage = None
+        async for route in news_router_agent.invoke(messages=[router_user_message]):
+            route_str = str(route).strip()
+            usage = merge_usage(usage, route)
+
+        await ledger.record("news_router", usage, router_prompt_with_date, route_str, model="gpt-4.1-mini")
+        return {"scores": parse_route_scores(route_str)}
+
+    # Stage: keyword extraction (does not need the route scores)
+    async def keyword_stage():
+        if keyword_task is not None:
+            # Started speculatively while the main router was deciding
+            keywords = await await_speculative_keywords(keyword_task, user_thread, ledger)
+            if keywords is not None:
+                return keywords
+
+        keyword_agent_user_prompt = f"Extract keywords from this query: {user_query}"
+        keyword_agent_message = ChatMessageContent(role=AuthorRole.USER, content=keyword_agent_user_prompt)
+
+        search_keywords = user_query
+        usage = None
+        with memory_view(user_thread, keyword_extractor_agent) as keyword_thread:
+            async for response in keyword_extractor_agent.invoke(messages=[keyword_agent_message], thread=keyword_thread):
+                search_keywords = str(response)
+                usage = merge_usage(usage, response)
+
+        await ledger.record("keywords", usage, keyword_agent_user_prompt, search_keywords, model="gpt-4.1-nano")
+        return {"keywords": search_keywords}
+
+    # Stage: retrieval with score-based adjusted top_k
+    async def retrieve_stage(route, keywords):
+        # Calculate adjusted top_k for each route
+        adjusted_top_k = {
+            r: max(1, int(default_top_k[r] * (biased_score(r, score) / 10)))
+            for r, score in route["scores"].items() if score > 0
+        }
+
+        # Combined mode: one text and one table query for all routes, split locally by quota
+        route_contexts = {}
+        if combined_retrieval and adjusted_top_k:
+            route_contexts = await pdf_search.search_routes(
+                keywords["keywords"], route_prefixes, text_top_k=adjusted_top_k, table_top_k=5
+            )
+        return {"top_k": adjusted_top_k, "contexts": route_contexts}
+
+    # Stage: one RAG sub-agent per active route, in parallel, until all answered or the deadline passed
+    async def rag_stage(retrieve, keywords):
+        async def run_route(r, top_k):
+            response = await run_mmrag_agent(
+                pdf_rag_agent, pdf_search, user_query, keywords["keywords"],
+                filter=route_filters[r], top_k=top_k, context=retrieve["contexts"].get(r), ledger=ledger,
+                on_chunk=drafts.writer(r),
+            )
+            drafts.finish(r, response)
+            return response
+
+        tasks = {r: asyncio.create_task(run_route(r, top_k)) for r, top_k in retrieve["top_k"].items()}
+        responses, late = await wait_for_deadline(tasks)
+        return {"responses": responses, "late": late}
+
+    # Stage: orchestrator combines the route answers and streams the final response
+    async def orchestrate_stage(rag):
+        active_responses = rag["responses"]
+        orchestrator_sections = []
+
+        if "MONTHLYSTANDPOINT" in active_responses:
+            orchestrator_sections.append(f"""
+            Information from Monthly Standpoint (monthlystandpoint) document (covering news in this month):
+            {active_responses["MONTHLYSTANDPOINT"]}
+            """)
+
+        if "KTM" in active_responses:
+            orchestrator_sections.append(f"""
+            Information from Know the Markets (KTM) document (covering news in this quarter):
+            {active_responses["KTM"]}
+            """)
+
+        if "KCMA" in active_responses:
+            orchestrator_sections.append(f"""
+            Information from KAsset Capital Market Assumptions (KCMA) document (published at the start of the year, covering assumptions for the whole year):
+            {active_responses["KCMA"]}
+            """)
+
+        orchestrator_prompt = f"""
+            Today is {today_str}.
+
+            The information given to you are:
+            {''.join(orchestrator_sections)}
+
+            If the user's question "{user_query}" mentions specific documents, ignore what is not stated.
+            Otherwise, consider all included documents, but prioritize KCMA and Monthly Standpoint over KTM in terms of correctness.
+            Cross-check the facts and use those to answer the original question:
+            {user_query}
+
+            Please write your final response in a clear {language}, structured way. Make sure no important point is missed.
+            """
+
+        orchestrator_message = ChatMessageContent(role=AuthorRole.USER, content=orchestrator_prompt)
+
+        final_response = ""
+        thread = main_thread
+        has_streamed = False
+        usage = None
+        sink = as_stream_sink(container)
+        sink.reset()  # clear container before streaming
+
+        try:
+            async for orchestration in orchestrator_agent.invoke_stream(messages=[orchestrator_message]):
+                chunk = str(orchestration)
+                final_response += chunk
+                sink.write(chunk)
+                thread = orchestration.thread
+                has_streamed = True
+                usage = merge_usage(usage, orchestration)
+
+            # Route answers that missed the deadline are appended as written
+            for r, response in (await collect_late(rag["late"])).items():
+                section = late_section(route_labels[r], response)
+                final_response += section
+                sink.write(section)
+        except BaseException:
+            cancel_pending(rag["late"])
+            raise
+        sink.close()
+        drafts.clear()
+
+        await ledger.record("orchestrator", usage, orchestrator_prompt, final_response, model="gpt-4.1-mini")
+        return {"response": final_response, "thread": thread, "has_streamed": has_streamed}
+
+    results = await run_dag([
+        Node("route", route_stage,
+             on_start=update_status("router", "🔀 Selecting appropriate documents..."), on_done=update_status(clear=("router",))),
+        Node("keywords", keyword_stage,
+             on_start=update_status("keyword", "🔍 Extracting keywords..."), on_done=update_status(clear=("keyword",))),
+        Node("retrieve", retrieve_stage, deps=("route", "keywords"),
+             on_start=update_status("rag", "📚 Running RAG agents...")),
+        Node("rag", rag_stage, deps=("retrieve", "keywords"), on_done=update_status(clear=("rag",))),
+        Node("orchestrate", orchestrate_stage, deps=("rag",),
+             on_start=update_status("orchestrator", "🧠 Synthesizing final RAG response...")),
+    ], timings=timings)
+
+    # Token usage of every stage is in the ledger
+    orchestration = results["orchestrate"]
+    return orchestration["response"], orchestration["thread"], orchestration["has_streamed"]
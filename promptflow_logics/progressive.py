@@ -0,0 +1,118 @@
+import os
+import time
+import asyncio
+
+from promptflow_logics.stream_sink import STREAM_FLUSH_INTERVAL
+
+# === Progressive Orchestration Configuration ===
+# Seconds the orchestrator waits for the RAG sub-agents before it starts on the answers that are in;
+# the others are appended to the final response when they arrive. 0 disables progressive mode
+# (sub-agents are not streamed and the orchestrator waits for all of them).
+ORCHESTRATION_DEADLINE = float(os.environ.get("ORCHESTRATION_DEADLINE", "8"))
+
+
+# === Live view of the sub-agent answers while they are generated ===
+class DraftBoard:
+    def __init__(self, container, labels: dict, interval: float = STREAM_FLUSH_INTERVAL):
+        """
+        container is a Streamlit placeholder (None, or ORCHESTRATION_DEADLINE = 0, disables the
+        board); labels maps each sub-agent key to its heading, in display order.
+        """
+        self.container = container if ORCHESTRATION_DEADLINE > 0 else None
+        self.labels = labels
+        self.interval = interval
+        self.drafts = {}
+        self.finished = set()
+        self._last_render = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.container is not None
+
+    def writer(self, key):
+        """on_chunk callback streaming into this key's draft, or None so the sub-agent is not streamed."""
+        if not self.active:
+            return None
+        return lambda chunk: self.write(key, chunk)
+
+    def write(self, key, chunk: str):
+        if not chunk:
+            return
+        self.drafts[key] = self.drafts.get(key, "") + chunk
+        if time.perf_counter() - self._last_render >= self.interval:
+            self.render()
+
+    def finish(self, key, text: str = None):
+        if text is not None:
+            self.drafts[key] = text
+        self.finished.add(key)
+        self.render()
+
+    def render(self):
+        if not self.active:
+            return
+        sections = []
+        for key, label in self.labels.items():
+            if key in self.drafts:
+                mark = "✅" if key in self.finished else "⏳"
+                sections.append(f"**{mark} {label}**\n\n{self.drafts[key]}")
+        if sections:
+            self.container.markdown("_Draft answers (being consolidated):_\n\n" + "\n\n".join(sections))
+        self._last_render = time.perf_counter()
+
+    def clear(self):
+        if self.active:
+            self.container.empty()
+
+
+# === Waiting on the sub-agents with a deadline ===
+async def wait_for_deadline(tasks: dict, deadline: float = ORCHESTRATION_DEADLINE, required=()) -> tuple[dict, dict]:
+    """
+    Wait for all tasks, or until deadline seconds have passed and at least one has finished.
+    The tasks named in required are always awaited: the deadline only cuts the others short.
+    Returns (results of the finished tasks, still pending tasks); a failed task raises as before.
+    """
+    if not tasks:
+        return {}, {}
+    try:
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline if deadline > 0 else None)
+        required_pending = {tasks[key] for key in required if key in tasks} & pending
+        if required_pending:
+            await asyncio.wait(required_pending)
+            done = {task for task in tasks.values() if task.done()}
+            pending = set(tasks.values()) - done
+        elif not done:
+            # Nothing to orchestrate yet: take the first answer that comes in
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finished = {key: task.result() for key, task in tasks.items() if task in done}
+    except BaseException:
+        # Flow cancelled or a sub-agent failed: do not leave the others running
+        cancel_pending(tasks)
+        raise
+
+    return finished, {key: task for key, task in tasks.items() if task in pending}
+
+
+async def collect_late(pending: dict) -> dict:
+    """Results of the tasks that missed the deadline, in the order given; failures are logged and skipped."""
+    results = {}
+    try:
+        for key, task in pending.items():
+            try:
+                results[key] = await task
+            except Exception as e:
+                print(f"⚠️ Late sub-agent answer '{key}' failed: {e}")
+    except BaseException:
+        cancel_pending(pending)
+        raise
+    return results
+
+
+def cancel_pending(pending: dict):
+    for task in pending.values():
+        task.cancel()
+
+
+def late_section(label: str, text: str) -> str:
+    """Markdown appended to the final response for an answer that arrived after the synthesis."""
+    return f"\n\n---\n\n**{label}** _(arrived after the summary above)_:\n\n{text}"
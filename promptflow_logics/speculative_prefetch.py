@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import threading
+
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from promptflow_logics.usage_ledger import merge_usage
+from promptflow_logics.conversation_memory import compact_thread
+
+# === Speculative Prefetch Configuration ===
+# Maximum speculative tasks started per turn while the LLM main router is deciding (0 disables)
+SPECULATION_BUDGET = int(os.environ.get("SPECULATION_BUDGET", "2"))
+# Keyword extraction is only speculated when the local classifier's best guess is a
+# retrieval intent with at least this confidence (it costs an LLM call if wasted)
+SPECULATION_MIN_CONFIDENCE = float(os.environ.get("SPECULATION_MIN_CONFIDENCE", "0.3"))
+
+
+# === Process-wide counters of useful versus wasted speculative work ===
+class SpeculationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.useful = 0
+        self.wasted = 0
+        self.skipped = 0            # not started because the per-turn budget was spent
+        self.head_start_seconds = 0.0  # time useful tasks had already been running when claimed
+        self.wasted_seconds = 0.0      # time wasted tasks ran before being cancelled
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            finished = self.useful + self.wasted
+            return {
+                "launched": self.launched,
+                "useful": self.useful,
+                "wasted": self.wasted,
+                "skipped": self.skipped,
+                "useful_rate": self.useful / finished if finished else 0.0,
+                "head_start_seconds": self.head_start_seconds,
+                "wasted_seconds": self.wasted_seconds,
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+# === Per-turn speculative work ===
+class SpeculativeTurn:
+    def __init__(self, budget: int = SPECULATION_BUDGET, stats: SpeculationStats = speculation_stats):
+        self.budget = budget
+        self.stats = stats
+        self._tasks = {}  # name -> (task, started_at)
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def start(self, name: str, coro):
+        """Schedule coro as speculative task name, unless the turn's budget is spent."""
+        if len(self._tasks) >= self.budget or name in self._tasks:
+            coro.close()
+            self.stats.record(skipped=1)
+            return None
+        task = asyncio.ensure_future(coro)
+        self._tasks[name] = (task, time.perf_counter())
+        self.stats.record(launched=1)
+        return task
+
+    def claim(self, name: str):
+        """Hand over a speculative task to the real pipeline (None if it was never started)."""
+        entry = self._tasks.pop(name, None)
+        if entry is None:
+            return None
+        task, started_at = entry
+        self.stats.record(useful=1, head_start_seconds=time.perf_counter() - started_at)
+        return task
+
+    async def cancel_unclaimed(self):
+        """Cancel the losing branches once the route is known; their work counts as wasted."""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        now = time.perf_counter()
+        for task, started_at in tasks:
+            task.cancel()
+            self.stats.record(wasted=1, wasted_seconds=now - started_at)
+        await asyncio.gather(*(task for task, _ in tasks), return_exceptions=True)
+
+
+# === Speculative keyword extraction ===
+def speculative_keywords(keyword_extractor_agent, user_query: str, user_thread, search=None):
+    """
+    Build the keyword-extraction coroutine on a compacted snapshot of the router thread, so it
+    can run while the main router is still appending to the real thread. When search is given,
+    the keywords are embedded right away, warming the embedding used by the retrieval stage.
+    """
+    snapshot = compact_thread(user_thread, keyword_extractor_agent)
+
+    async def extract():
+        keyword_agent_user_prompt = f"Extract keywords from this query: {user_query}"
+        keyword_agent_message = ChatMessageContent(role=AuthorRole.USER, content=keyword_agent_user_prompt)
+
+        search_keywords = user_query
+        usage = None
+        async for response in keyword_extractor_agent.invoke(messages=[keyword_agent_message], thread=snapshot):
+            search_keywords = str(response)
+            usage = merge_usage(usage, response)
+
+        if search is not None:
+            try:
+                await search.get_embedding(search_keywords)
+            except Exception as e:
+                print(f"⚠️ Speculative keyword embedding failed: {e}")
+
+        return {
+            "keywords": search_keywords,
+            "prompt": keyword_agent_user_prompt,
+            "usage": usage,
+        }
+
+    return extract()
+
+
+async def await_speculative_keywords(keyword_task, user_thread, ledger=None):
+    """
+    Wait for speculatively extracted keywords and record the exchange on the router thread
+    (and its token usage in the ledger), as a regular keyword stage would. Returns None if
+    the speculative call failed.
+    """
+    try:
+        keywords = await keyword_task
+    except Exception as e:
+        print(f"⚠️ Speculative keyword extraction failed, extracting again: {e}")
+        return None
+
+    if user_thread is not None:
+        user_thread._chat_history.add_user_message(keywords["prompt"])
+        user_thread._chat_history.add_assistant_message(keywords["keywords"])
+    if ledger is not None:
+        await ledger.record("keywords", keywords["usage"], keywords["prompt"], keywords["keywords"], model="gpt-4.1-nano")
+    return keywords
@@ -0,0 +1,90 @@
+import os
+import time
+
+# === Stream Rendering Configuration ===
+# A streamed answer is re-rendered at most every STREAM_FLUSH_INTERVAL seconds, or sooner once
+# STREAM_FLUSH_CHARS new characters have arrived (each render re-sends the whole answer)
+STREAM_FLUSH_INTERVAL = float(os.environ.get("STREAM_FLUSH_INTERVAL", "0.05"))
+STREAM_FLUSH_CHARS = int(os.environ.get("STREAM_FLUSH_CHARS", "200"))
+
+
+# === Throttled sink between invoke_stream loops and a Streamlit placeholder ===
+class StreamSink:
+    def __init__(self, container, interval: float = STREAM_FLUSH_INTERVAL, min_chars: int = STREAM_FLUSH_CHARS,
+                 started_at: float = None):
+        """
+        container is any placeholder with .markdown(text) (e.g. st.empty()). started_at is the
+        time.perf_counter() reference for time-to-first-token, by default the sink's creation.
+        """
+        self.container = container
+        self.interval = interval
+        self.min_chars = min_chars
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.first_token_at = None
+        self.flushes = 0
+        self.chunks = 0
+        self._parts = []
+        self._pending_chars = 0
+        self._last_flush = None
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    @property
+    def ttft(self):
+        """Seconds from started_at to the first non-empty chunk (None before it arrives)."""
+        return None if self.first_token_at is None else self.first_token_at - self.started_at
+
+    def reset(self, text: str = ""):
+        """Start a new answer in the same placeholder (and render text right away)."""
+        self._parts = [text] if text else []
+        self._pending_chars = 0
+        if self.container is not None:
+            self.container.markdown(text)
+            self._last_flush = time.perf_counter()
+
+    def markdown(self, text: str):
+        """Placeholder-compatible full replacement, for answers that are not streamed."""
+        if text and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.reset(text)
+
+    def write(self, chunk: str):
+        if not chunk:
+            return  # e.g. the usage-only last chunk of a stream
+        now = time.perf_counter()
+        self.chunks += 1
+        self._parts.append(chunk)
+        self._pending_chars += len(chunk)
+
+        if self.first_token_at is None:
+            # Show the first token at once; throttle from there on
+            self.first_token_at = now
+            self.flush(now)
+        elif self._pending_chars >= self.min_chars or now - self._last_flush >= self.interval:
+            self.flush(now)
+
+    def flush(self, now: float = None):
+        if not self._pending_chars:
+            return
+        if self.container is not None:  # without a placeholder the sink only collects and times
+            self.container.markdown(self.text)
+            self.flushes += 1
+        self._pending_chars = 0
+        self._last_flush = now if now is not None else time.perf_counter()
+
+    def close(self) -> str:
+        """Render whatever is still pending and return the full text."""
+        self.flush()
+        return self.text
+
+    def stats(self) -> dict:
+        return {"ttft": self.ttft, "chunks": self.chunks, "flushes": self.flushes, "chars": len(self.text)}
+
+
+def as_stream_sink(container) -> StreamSink:
+    """Flows accept either a bare placeholder or a sink already created by the caller (which reads its TTFT)."""
+    return container if isinstance(container, StreamSink) else StreamSink(container)
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+from agents.resource_registry import count_tokens
+
+# Display order and labels of the stages recorded by the flows
+STAGE_LABELS = {
+    "router": "Router",
+    "news_router": "News router",
+    "keywords": "Keyword Extractor",
+    "rag": "RAG agents",
+    "orchestrator": "Orchestrator",
+    "reply": "Reply agent",
+}
+
+
+# === Usage reported by the API on a response (chat completion, streaming chunk or assistant run step) ===
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def usage_of(item):
+    """
+    Token usage attached to one yielded agent response, as {"prompt_tokens", "completion_tokens",
+    "cached_tokens", "model"}, or None. Streams report it on their last (content-less) chunk.
+    """
+    message = getattr(item, "message", item)
+    metadata = getattr(message, "metadata", None) or {}
+    usage = metadata.get("usage")
+    if usage is None:
+        return None
+
+    prompt_tokens = _field(usage, "prompt_tokens")
+    completion_tokens = _field(usage, "completion_tokens")
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    details = _field(usage, "prompt_tokens_details")
+    cached_tokens = (_field(details, "cached_tokens") if details is not None else None) or 0
+
+    return {
+        "prompt_tokens": prompt_tokens or 0,
+        "completion_tokens": completion_tokens or 0,
+        "cached_tokens": cached_tokens,
+        "model": getattr(message, "ai_model_id", None),
+    }
+
+
+def merge_usage(total, item):
+    """Fold the usage of one yielded response into a running total (either may be None)."""
+    usage = usage_of(item)
+    if usage is None:
+        return total
+    if total is None:
+        return usage
+    return {
+        "prompt_tokens": total["prompt_tokens"] + usage["prompt_tokens"],
+        "completion_tokens": total["completion_tokens"] + usage["completion_tokens"],
+        "cached_tokens": total["cached_tokens"] + usage["cached_tokens"],
+        "model": total["model"] or usage["model"],
+    }
+
+
+def _empty_totals() -> dict:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "estimated_calls": 0}
+
+
+def _add_to(totals: dict, record: dict):
+    totals["calls"] += 1
+    totals["prompt_tokens"] += record["prompt_tokens"]
+    totals["completion_tokens"] += record["completion_tokens"]
+    totals["cached_tokens"] += record["cached_tokens"]
+    totals["estimated_calls"] += record["estimated"]
+
+
+# === Per-request ledger ===
+class UsageLedger:
+    def __init__(self):
+        self.records = []
+
+    async def record(self, stage: str, usage, prompt: str = "", completion: str = "", model: str = "gpt-4.1"):
+        """
+        Record one LLM call. usage is what merge_usage collected from the responses; only when
+        the API reported nothing are prompt and completion counted with tiktoken, off the loop.
+        """
+        if usage is not None:
+            self.records.append({
+                "stage": stage,
+                "model": usage["model"] or model,
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "cached_tokens": usage["cached_tokens"],
+                "estimated": False,
+            })
+            return
+
+        prompt_tokens, completion_tokens = await asyncio.to_thread(
+            lambda: (count_tokens(prompt, model), count_tokens(completion, model))
+        )
+        self.records.append({
+            "stage": stage,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": 0,
+            "estimated": True,
+        })
+
+    def by_stage(self) -> dict:
+        """{stage: totals} in display order."""
+        order = list(STAGE_LABELS)
+        stages = {}
+        for record in sorted(self.records, key=lambda r: order.index(r["stage"]) if r["stage"] in order else len(order)):
+            _add_to(stages.setdefault(record["stage"], _empty_totals()), record)
+        return stages
+
+    def totals(self) -> dict:
+        totals = _empty_totals()
+        for record in self.records:
+            _add_to(totals, record)
+        return totals
+
+
+# === Aggregates across requests (one per session, one per process) ===
+class UsageTotals:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.stages = {}
+
+    def add(self, ledger: UsageLedger):
+        with self._lock:
+            self.requests += 1
+            for record in ledger.records:
+                _add_to(self.stages.setdefault(record["stage"], _empty_totals()), record)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            totals = _empty_totals()
+            for stage in self.stages.values():
+                for key in totals:
+                    totals[key] += stage[key]
+            return {
+                "requests": self.requests,
+                "totals": totals,
+                "stages": {stage: dict(values) for stage, values in self.stages.items()},
+            }
+
+
+process_usage = UsageTotals()